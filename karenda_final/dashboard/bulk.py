@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.utils import timezone
+
+from reservations.email_utils import build_completion_message
+from reservations.models import Reservation, WorkHistory
+from reservations.outbox import queue_messages
+from reservations.rollups import mark_days_dirty
+from reservations.versioning import bump_version_on_commit
+
+
+# 一括操作: 操作名 → (変更後のステータス, 変更できる元のステータス, 表示名)
+BULK_ACTIONS = {
+    'start': ('in_progress', ('confirmed',), '作業中'),
+    'complete': ('completed', ('confirmed', 'in_progress'), '来店済み'),
+}
+
+# 予約のステータスに合わせる作業履歴のステータス
+WORK_HISTORY_STATUS = {
+    'in_progress': 'in_progress',
+    'completed': 'completed',
+}
+
+
+def _sync_work_histories(reservation_ids, status):
+    """予約に合わせて作業履歴のステータスを更新（なければ作成）し、完了にした作業履歴のIDを返す"""
+    now = timezone.now()
+    newly_completed = []
+    if status == 'completed':
+        newly_completed = list(
+            WorkHistory.objects.filter(reservation_id__in=reservation_ids)
+            .exclude(status='completed')
+            .values_list('pk', flat=True)
+        )
+    WorkHistory.objects.filter(reservation_id__in=reservation_ids).exclude(status=status).update(
+        status=status,
+        updated_at=now,
+    )
+
+    existing = set(WorkHistory.objects.filter(reservation_id__in=reservation_ids).values_list('reservation_id', flat=True))
+    created = WorkHistory.objects.bulk_create(
+        [WorkHistory(reservation_id=pk, status=status) for pk in reservation_ids if pk not in existing],
+        ignore_conflicts=True,
+    )
+    if status == 'completed' and created:
+        newly_completed += list(
+            WorkHistory.objects.filter(
+                reservation_id__in=[w.reservation_id for w in created],
+            ).values_list('pk', flat=True)
+        )
+    return newly_completed
+
+
+def apply_bulk_action(action, reservations):
+    """reservations（QuerySet）のうち変更できる予約のステータスをまとめて変更し、件数を返す
+
+    予約・作業履歴の更新と作業完了メールの登録は1トランザクションで行い、
+    それぞれ行ごとではなく1回の UPDATE / INSERT で処理する。
+    """
+    status, sources, _ = BULK_ACTIONS[action]
+    with transaction.atomic():
+        candidates = list(reservations.filter(status__in=sources).values_list('pk', flat=True))
+        if not candidates:
+            return 0
+        updated = Reservation.objects.filter(pk__in=candidates, status__in=sources).update(status=status)
+        changed = list(Reservation.objects.filter(pk__in=candidates, status=status).values_list('pk', flat=True))
+        mark_days_dirty(Reservation.objects.filter(pk__in=changed).order_by().values_list('date', flat=True).distinct())
+
+        completed = _sync_work_histories(changed, WORK_HISTORY_STATUS[status])
+        if completed:
+            histories = WorkHistory.objects.filter(pk__in=completed).select_related(
+                'reservation__user', 'reservation__service_menu',
+            )
+            # 作業履歴画面から完了にした場合と同じキーなので二重に送信されない
+            queue_messages(
+                (f'completion:{history.pk}', build_completion_message(history)) for history in histories
+            )
+
+    # update() では signal が送られないため、ダッシュボードの集計を手動で無効にする（売上集計は上で登録済み）
+    bump_version_on_commit('reservations')
+    return updated
@@ -0,0 +1,85 @@
+import csv
+import json
+
+from reservations.models import Reservation
+from .filters import filter_reservations
+
+
+# (見出し, values_list で取得するフィールド)
+EXPORT_COLUMNS = [
+    ('予約番号', 'id'),
+    ('来店日', 'date'),
+    ('時間帯', 'time_slot'),
+    ('ステータス', 'status'),
+    ('お名前', 'name'),
+    ('ユーザー', 'user__username'),
+    ('メニュー', 'service_menu__name'),
+    ('来店理由', 'visit_reason'),
+    ('備考', 'note'),
+    ('管理者メモ', 'admin_memo'),
+    ('メーカー名', 'bike_info__manufacturer'),
+    ('モデル名', 'bike_info__model_name'),
+    ('修理・整備箇所の詳細', 'bike_info__details'),
+    ('パーツ持ち込み', 'bike_info__has_parts_brought_in'),
+    ('作業ステータス', 'work_history__status'),
+    ('見積金額', 'work_history__estimated_amount'),
+    ('確定金額', 'work_history__actual_amount'),
+    ('作成日時', 'created_at'),
+]
+
+EXPORT_ORDERING = ('-date', 'time_slot', 'id')
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_rows(filters, chunk_size=CHUNK_SIZE):
+    """検索条件に合う予約を1行ずつ（タプルで）返す
+
+    モデルを生成せず、必要な列だけを chunk_size 件ずつ読み出すため、
+    件数が増えても使用メモリは一定。
+    """
+    reservations = filter_reservations(Reservation.objects.all(), filters)
+    fields = [field for _, field in EXPORT_COLUMNS]
+    return reservations.order_by(*EXPORT_ORDERING).values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+# 表計算ソフトで数式として実行される先頭文字（CSV のみ、先頭に ' を付けて文字列として扱わせる）
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """csv.writer の書き込み内容をそのまま返す（ストリーミング用）"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    # Excel で文字化けしないよう BOM を付ける
+    yield '\ufeff' + writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def jsonl_lines(rows):
+    fields = [field for _, field in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str) + '\n'
+
+
+def export_lines(export_format, filters, chunk_size=CHUNK_SIZE):
+    rows = export_rows(filters, chunk_size=chunk_size)
+    if export_format == 'jsonl':
+        return jsonl_lines(rows)
+    return csv_lines(rows)
@@ -0,0 +1,40 @@
+from datetime import date
+
+from reservations.search import search_reservations
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def reservation_filters(params):
+    """一覧・エクスポート共通の検索条件をクエリパラメータから取得"""
+    return {
+        'status': params.get('status', ''),
+        'date_from': params.get('date_from', ''),
+        'date_to': params.get('date_to', ''),
+        'q': params.get('q', '').strip(),
+    }
+
+
+def filter_reservations(reservations, filters):
+    """検索条件で予約を絞り込む（日付が不正な場合は無視）"""
+    if filters['status']:
+        reservations = reservations.filter(status=filters['status'])
+    
+    date_from = _parse_date(filters['date_from'])
+    if date_from:
+        reservations = reservations.filter(date__gte=date_from)
+    
+    date_to = _parse_date(filters['date_to'])
+    if date_to:
+        reservations = reservations.filter(date__lte=date_to)
+    
+    # キーワード（お名前・備考・管理者メモ・自転車情報の全文検索）
+    if filters.get('q'):
+        reservations = search_reservations(reservations, filters['q'])
+    
+    return reservations
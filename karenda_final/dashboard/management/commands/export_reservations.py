@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from dashboard.exports import CHUNK_SIZE, CONTENT_TYPES, export_lines
+
+
+class Command(BaseCommand):
+    help = '予約を自転車情報・作業履歴と合わせて CSV / JSONL で出力します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--status', default='', help='ステータスで絞り込む')
+        parser.add_argument('--date-from', default='', help='来店日（開始）YYYY-MM-DD')
+        parser.add_argument('--date-to', default='', help='来店日（終了）YYYY-MM-DD')
+        parser.add_argument('--output', '-o', help='出力先ファイル（省略時は標準出力）')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {
+            'status': options['status'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+        }
+        lines = export_lines(options['format'], filters, chunk_size=options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import ExtractMonth
+
+from reservations.models import DailyMenuRollup, Reservation, RollupDirtyDay
+from reservations.versioning import aget_version, get_version
+
+
+COUNTERS_TIMEOUT = 60 * 60
+
+
+def _home_counter_aggregates(today):
+    tomorrow = today + timedelta(days=1)
+    aggregates = {
+        'today': Count('id', filter=Q(date=today, status__in=['confirmed', 'in_progress'])),
+        'upcoming': Count('id', filter=Q(date__gte=tomorrow, status='confirmed')),
+    }
+    for status, _ in Reservation.STATUS_CHOICES:
+        aggregates[f'status_{status}'] = Count('id', filter=Q(status=status))
+    return Reservation.objects.filter(date__gte=today), aggregates
+
+
+def _home_counters(result):
+    return {
+        'today': result['today'],
+        'upcoming': result['upcoming'],
+        'status_summary': [
+            {'status': status, 'label': label, 'count': result[f'status_{status}']}
+            for status, label in Reservation.STATUS_CHOICES
+            if result[f'status_{status}']
+        ],
+    }
+
+
+def _compute_home_counters(today):
+    """ダッシュボードの件数を1回の集計クエリで取得"""
+    queryset, aggregates = _home_counter_aggregates(today)
+    return _home_counters(queryset.aggregate(**aggregates))
+
+
+def home_counters(today):
+    """ダッシュボードの件数（予約の版番号ごとにキャッシュ）
+
+    予約の保存・削除で版番号が進むため、キャッシュを明示的に消さなくても
+    次の表示では新しい件数が集計される。
+    """
+    key = f"dashboard_home:{get_version('reservations')}:{today.isoformat()}"
+    counters = cache.get(key)
+    if counters is None:
+        counters = _compute_home_counters(today)
+        cache.set(key, counters, COUNTERS_TIMEOUT)
+    return counters
+
+
+async def ahome_counters(today):
+    """home_counters の非同期版"""
+    key = f"dashboard_home:{await aget_version('reservations')}:{today.isoformat()}"
+    counters = await cache.aget(key)
+    if counters is None:
+        queryset, aggregates = _home_counter_aggregates(today)
+        counters = _home_counters(await queryset.aaggregate(**aggregates))
+        await cache.aset(key, counters, COUNTERS_TIMEOUT)
+    return counters
+
+
+def _rollup_totals():
+    return {
+        'reservations': Sum('reservation_count'),
+        'completed': Sum('reservation_count', filter=Q(status='completed')),
+        'cancelled': Sum('reservation_count', filter=Q(status='cancelled')),
+        'estimated': Sum('estimated_total'),
+        'actual': Sum('actual_total'),
+        'estimate_count': Sum('estimate_count'),
+        'estimate_error': Sum('estimate_error_total'),
+    }
+
+
+def _report_row(row):
+    """集計値の None を 0 にし、平均見積誤差を付ける"""
+    row = {**row, **{key: row.get(key) or 0 for key in _rollup_totals()}}
+    row['average_error'] = (
+        round(row['estimate_error'] / row['estimate_count']) if row['estimate_count'] else None
+    )
+    return row
+
+
+def revenue_summary(year):
+    """日別メニュー集計（DailyMenuRollup）から年間の月別・メニュー別の予約数と金額を集計
+
+    予約・作業履歴のテーブルは読まないため、件数が増えても集計行数（日数 × メニュー数 × ステータス数）にしか比例しない。
+    集計は refresh_rollups コマンドの実行時点のもの。
+    """
+    rollups = DailyMenuRollup.objects.filter(date__gte=date(year, 1, 1), date__lt=date(year + 1, 1, 1)).order_by()
+
+    by_month = {
+        row.pop('month'): _report_row(row)
+        for row in rollups.annotate(month=ExtractMonth('date')).values('month').annotate(**_rollup_totals())
+    }
+    empty = _report_row({})
+    months = [{'month': month, **by_month.get(month, empty)} for month in range(1, 13)]
+    peak = max(row['actual'] for row in months) or 1
+    for row in months:
+        row['bar_percent'] = round(row['actual'] * 100 / peak)
+
+    menus = [
+        _report_row(row)
+        for row in rollups.values('service_menu_id', 'service_menu__name').annotate(**_rollup_totals())
+        .order_by('-actual', 'service_menu__name')
+    ]
+
+    years = DailyMenuRollup.objects.aggregate(first=Min('date'), last=Max('date'))
+    return {
+        'year': year,
+        'months': months,
+        'menus': menus,
+        'total': _report_row(rollups.aggregate(**_rollup_totals())),
+        'years': list(range(years['first'].year, years['last'].year + 1)) if years['first'] else [year],
+        'pending_days': RollupDirtyDay.objects.count(),
+    }
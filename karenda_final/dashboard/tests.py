@@ -1,3 +1,562 @@
+import csv
+import io
+import json
+import tracemalloc
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from reservations import booking
+from reservations.models import (
+    BikeImage, BikeInfo, EmailOutbox, Reservation, RollupDirtyDay, ServiceMenu, SlotOccupancy, WaitlistEntry,
+    WorkHistory,
+)
+from reservations.querycount import QueryBudgetMixin
+from reservations.rollups import refresh_dirty_days
+
+from . import views
+from .bulk import apply_bulk_action
+from .exports import export_lines
+from .stats import ahome_counters, home_counters
+
+
+def clear_caches():
+    """集計結果と版番号のキャッシュを空にする（reservations.tests と同じ）"""
+    for backend in caches.all():
+        backend.clear()
+
+
+class ReservationListPaginationTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.client.force_login(self.staff)
+        self.url = reverse('dashboard:reservation_list')
+        base = date.today()
+        Reservation.objects.bulk_create([
+            Reservation(
+                name=f'客{i}',
+                date=base + timedelta(days=i % 7),
+                time_slot='AM' if i % 2 else 'PM',
+                status='cancelled' if i % 5 == 0 else 'confirmed',
+            )
+            for i in range(120)
+        ])
+
+    def walk(self, params):
+        seen = []
+        params = dict(params)
+        while True:
+            response = self.client.get(self.url, params)
+            page = response.context['reservations']
+            self.assertLessEqual(len(page), views.RESERVATION_PAGE_SIZE)
+            seen.extend(page)
+            if not page.has_next:
+                return seen
+            params['cursor'] = page.next_cursor
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen = self.walk({})
+        expected = list(Reservation.objects.order_by('-date', 'time_slot', 'id').values_list('id', flat=True))
+        self.assertEqual([r.id for r in seen], expected)
+
+    def test_filters_apply_across_pages(self):
+        seen = self.walk({'status': 'confirmed', 'date_from': str(date.today() + timedelta(days=1))})
+        self.assertEqual(
+            len(seen),
+            Reservation.objects.filter(status='confirmed', date__gte=date.today() + timedelta(days=1)).count(),
+        )
+        self.assertTrue(all(r.status == 'confirmed' for r in seen))
+
+    def test_later_pages_use_same_query_shape(self):
+        first = self.client.get(self.url)
+        cursor = first.context['reservations'].next_cursor
+        with self.assertNumQueries(3):  # セッション・ユーザー・予約一覧
+            response = self.client.get(self.url, {'cursor': cursor})
+        self.assertContains(response, '最初のページへ')
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(len(response.context['reservations']), views.RESERVATION_PAGE_SIZE)
+
+
+class ReservationExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.client.force_login(self.staff)
+        self.menu = ServiceMenu.objects.create(
+            name='メンテナンス', estimated_duration=90, price_estimate=5000, price_display='5,000円～',
+        )
+        self.reservation = Reservation.objects.create(
+            name='山田 太郎', date=date.today(), time_slot='AM', service_menu=self.menu,
+        )
+        BikeInfo.objects.create(
+            reservation=self.reservation, manufacturer='トレック', model_name='Domane', details='ブレーキ, 鳴き',
+        )
+        WorkHistory.objects.create(reservation=self.reservation, estimated_amount=5000, status='in_progress')
+        Reservation.objects.create(name='佐藤 花子', date=date.today(), time_slot='PM', status='cancelled')
+
+    def export(self, **params):
+        response = self.client.get(reverse('dashboard:reservation_export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_joins_bike_and_work_history(self):
+        rows = list(csv.reader(io.StringIO(self.export(status='confirmed').lstrip('\ufeff'))))
+        self.assertEqual(rows[0][0], '予約番号')
+        self.assertEqual(len(rows), 2)
+        self.assertIn('ブレーキ, 鳴き', rows[1])
+        self.assertIn('メンテナンス', rows[1])
+        self.assertIn('in_progress', rows[1])
+
+    def test_csv_escapes_formulas(self):
+        self.reservation.name = '=HYPERLINK("http://example.com")'
+        self.reservation.note = '@SUM(A1)'
+        self.reservation.save()
+        self.reservation.bike_info.details = '-1+1'
+        self.reservation.bike_info.save()
+
+        row = list(csv.reader(io.StringIO(self.export(status='confirmed').lstrip('\ufeff'))))[1]
+        self.assertIn('\'=HYPERLINK("http://example.com")', row)
+        self.assertIn("'@SUM(A1)", row)
+        self.assertIn("'-1+1", row)
+        self.assertIn('5000', row)
+        # JSON Lines はそのまま
+        record = json.loads(self.export(format='jsonl', status='confirmed'))
+        self.assertEqual(record['note'], '@SUM(A1)')
+
+    def test_jsonl(self):
+        lines = self.export(format='jsonl').splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['bike_info__manufacturer'], 'トレック')
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command('export_reservations', format='jsonl', status='cancelled', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['name'], '佐藤 花子')
+
+
+class ExportMemoryTests(TestCase):
+    """大量データを出力してもピークメモリが件数に比例しないこと"""
+
+    ROWS = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        base = date(2020, 1, 1)
+        Reservation.objects.bulk_create(
+            [
+                Reservation(name=f'客{i}', date=base + timedelta(days=i // 4), time_slot='AM', note='備考' * 20)
+                for i in range(cls.ROWS)
+            ],
+            batch_size=2000,
+        )
+        BikeInfo.objects.bulk_create(
+            [
+                BikeInfo(reservation_id=pk, manufacturer='メーカー', model_name='モデル', details='詳細' * 50)
+                for pk in Reservation.objects.values_list('pk', flat=True)
+            ],
+            batch_size=2000,
+        )
+
+    def peak_memory(self, filters):
+        tracemalloc.start()
+        try:
+            count = sum(1 for _ in export_lines('csv', filters, chunk_size=500))
+            return count, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_peak_memory_is_constant(self):
+        small_filters = {'status': '', 'date_from': '', 'date_to': str(date(2020, 1, 1) + timedelta(days=499))}
+        all_filters = {'status': '', 'date_from': '', 'date_to': ''}
+        small_count, small_peak = self.peak_memory(small_filters)
+        full_count, full_peak = self.peak_memory(all_filters)
+
+        self.assertEqual(small_count, 2000 + 1)
+        self.assertEqual(full_count, self.ROWS + 1)
+        # 件数は10倍でも、ピークメモリはほぼ変わらない
+        self.assertLess(full_peak, small_peak * 2)
+
+
+class DashboardHomeCountersTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.client.force_login(self.staff)
+        self.url = reverse('dashboard:home')
+        today = date.today()
+        Reservation.objects.create(name='本日', date=today, time_slot='AM')
+        Reservation.objects.create(name='作業中', date=today, time_slot='PM', status='in_progress')
+        Reservation.objects.create(name='明日', date=today + timedelta(days=1), time_slot='AM')
+        Reservation.objects.create(name='取消', date=today + timedelta(days=2), time_slot='AM', status='cancelled')
+        Reservation.objects.create(name='過去', date=today - timedelta(days=1), time_slot='AM')
+
+    def test_counts_are_computed_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            counters = home_counters(date.today())
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(counters['today'], 2)
+        self.assertEqual(counters['upcoming'], 1)
+        self.assertEqual(
+            {item['status']: item['count'] for item in counters['status_summary']},
+            {'confirmed': 2, 'in_progress': 1, 'cancelled': 1},
+        )
+
+    def test_repeat_loads_are_served_from_cache(self):
+        home_counters(date.today())
+        with self.assertNumQueries(0):
+            home_counters(date.today())
+
+    def test_reservation_changes_invalidate_cache(self):
+        self.assertEqual(home_counters(date.today())['upcoming'], 1)
+        Reservation.objects.create(name='追加', date=date.today() + timedelta(days=3), time_slot='PM')
+        self.assertEqual(home_counters(date.today())['upcoming'], 2)
+
+        reservation = Reservation.objects.get(name='明日')
+        booking.cancel_reservation(reservation)
+        self.assertEqual(home_counters(date.today())['upcoming'], 1)
+
+    def test_home_page_shows_counts(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['today_count'], 2)
+        self.assertContains(response, 'キャンセル')
+
+    async def test_async_counters_share_cache_with_sync_counters(self):
+        counters = await ahome_counters(date.today())
+        self.assertEqual(counters, await sync_to_async(home_counters)(date.today()))
+        await Reservation.objects.acreate(name='追加', date=date.today() + timedelta(days=3), time_slot='PM')
+        self.assertEqual((await ahome_counters(date.today()))['upcoming'], 2)
+
+    async def test_home_page_over_asgi_requires_staff(self):
+        customer = await sync_to_async(User.objects.create_user)('taro', 'taro@example.com', 'pass12345')
+        await self.async_client.aforce_login(customer)
+        response = await self.async_client.get(self.url)
+        self.assertRedirects(response, f"{reverse('login')}?next={self.url}", fetch_redirect_response=False)
+
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(self.url)
+        self.assertContains(response, '本日')
+
+
+class BulkStatusTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pass12345')
+        self.client.force_login(self.staff)
+        self.url = reverse('dashboard:reservation_bulk_action')
+        today = date.today()
+        self.confirmed = [
+            Reservation.objects.create(user=self.customer, name=f'確定{i}', date=today + timedelta(days=i), time_slot='AM')
+            for i in range(3)
+        ]
+        self.in_progress = Reservation.objects.create(
+            user=self.customer, name='作業中', date=today, time_slot='PM', status='in_progress',
+        )
+        WorkHistory.objects.create(reservation=self.in_progress, status='in_progress')
+        self.cancelled = Reservation.objects.create(
+            user=self.customer, name='取消', date=today, time_slot='AM', status='cancelled',
+        )
+
+    def test_status_is_changed_with_one_update(self):
+        ids = [r.pk for r in self.confirmed] + [self.cancelled.pk]
+        with CaptureQueriesContext(connection) as ctx:
+            count = apply_bulk_action('start', Reservation.objects.filter(pk__in=ids))
+        self.assertEqual(count, 3)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "reservations_reservation"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            set(Reservation.objects.filter(pk__in=ids).values_list('status', flat=True)),
+            {'in_progress', 'cancelled'},
+        )
+        self.assertEqual(
+            set(WorkHistory.objects.filter(reservation_id__in=ids).values_list('status', flat=True)),
+            {'in_progress'},
+        )
+        self.assertFalse(WorkHistory.objects.filter(reservation=self.cancelled).exists())
+
+    def test_complete_updates_work_history_and_queues_mail_once(self):
+        targets = Reservation.objects.filter(pk__in=[self.confirmed[0].pk, self.in_progress.pk])
+        self.assertEqual(apply_bulk_action('complete', targets), 2)
+        self.assertEqual(
+            list(WorkHistory.objects.filter(reservation__in=targets).values_list('status', flat=True)),
+            ['completed', 'completed'],
+        )
+        keys = set(EmailOutbox.objects.values_list('idempotency_key', flat=True))
+        self.assertEqual(
+            keys,
+            {f'completion:{pk}' for pk in WorkHistory.objects.filter(reservation__in=targets).values_list('pk', flat=True)},
+        )
+
+        # 完了済みの予約は対象外になり、メールも再登録されない
+        self.assertEqual(apply_bulk_action('complete', targets), 0)
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+    def test_view_today_scope_and_counters(self):
+        self.assertEqual(home_counters(date.today())['status_summary'][0]['count'], 3)
+        response = self.client.post(self.url, {
+            'action': 'start', 'scope': 'today', 'next': reverse('dashboard:home'),
+        })
+        self.assertRedirects(response, reverse('dashboard:home'))
+        self.confirmed[0].refresh_from_db()
+        self.confirmed[1].refresh_from_db()
+        self.assertEqual(self.confirmed[0].status, 'in_progress')
+        self.assertEqual(self.confirmed[1].status, 'confirmed')
+
+        counts = {item['status']: item['count'] for item in home_counters(date.today())['status_summary']}
+        self.assertEqual(counts['confirmed'], 2)
+        self.assertEqual(counts['in_progress'], 2)
+
+    def test_view_selected_scope(self):
+        response = self.client.post(self.url, {
+            'action': 'complete',
+            'scope': 'selected',
+            'reservation_ids': [self.confirmed[1].pk, self.confirmed[2].pk],
+        }, follow=True)
+        self.assertContains(response, '2件の予約')
+        self.assertEqual(Reservation.objects.filter(status='completed').count(), 2)
+
+    def test_view_rejects_get_and_customers(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.client.force_login(self.customer)
+        self.client.post(self.url, {'action': 'start', 'scope': 'today'})
+        self.assertFalse(Reservation.objects.filter(status='in_progress').exclude(pk=self.in_progress.pk).exists())
+
+
+class StaffStatusUpdateTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pass12345')
+        self.waiter = User.objects.create_user('waiter', 'waiter@example.com', 'pass12345')
+        self.client.force_login(self.staff)
+        self.day = date.today() + timedelta(days=3)
+        self.reservation = booking.book_reservation(
+            Reservation(user=self.customer, name='山田 太郎', date=self.day, time_slot='AM'),
+        )
+        self.url = reverse('dashboard:reservation_detail', args=[self.reservation.pk])
+
+    def test_staff_cancellation_promotes_waiter(self):
+        entry = booking.join_waitlist(WaitlistEntry(user=self.waiter, name='佐藤', date=self.day, time_slot='AM'))
+        response = self.client.post(self.url, {'status': 'cancelled'})
+        self.assertRedirects(response, self.url)
+
+        self.reservation.refresh_from_db()
+        entry.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'cancelled')
+        self.assertEqual(entry.status, 'promoted')
+        self.assertEqual(entry.reservation.user, self.waiter)
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time_slot='AM').booked_count, 1)
+
+    def test_other_statuses_are_saved(self):
+        self.client.post(self.url, {'status': 'in_progress'})
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'in_progress')
+
+    def test_reinstating_claims_free_slot(self):
+        booking.cancel_reservation(self.reservation)
+        response = self.client.post(self.url, {'status': 'confirmed'})
+        self.assertRedirects(response, self.url)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'confirmed')
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time_slot='AM').booked_count, 1)
+
+    def test_reinstating_into_full_slot_is_refused(self):
+        booking.cancel_reservation(self.reservation)
+        booking.book_reservation(Reservation(user=self.waiter, name='佐藤', date=self.day, time_slot='AM'))
+        response = self.client.post(self.url, {'status': 'confirmed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('満席', str(response.context['form'].errors['status']))
+
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'cancelled')
+        occupancy = SlotOccupancy.objects.get(date=self.day, time_slot='AM')
+        self.assertEqual((occupancy.booked_count, occupancy.capacity), (1, 1))
+
+
+class RevenueReportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.client.force_login(self.staff)
+        self.url = reverse('dashboard:revenue_report')
+        self.menu = ServiceMenu.objects.create(
+            name='オーバーホール', estimated_duration=120, price_estimate=20000, price_display='20,000円～',
+        )
+        for day, estimated, actual in [(date(2025, 3, 10), 20000, 22000), (date(2025, 3, 20), 18000, 17000)]:
+            reservation = Reservation.objects.create(
+                name='完了', date=day, time_slot='AM', status='completed', service_menu=self.menu,
+            )
+            WorkHistory.objects.create(
+                reservation=reservation, status='completed', estimated_amount=estimated, actual_amount=actual,
+            )
+        Reservation.objects.create(name='取消', date=date(2025, 7, 1), time_slot='PM', status='cancelled')
+        refresh_dirty_days()
+
+    def test_report_reads_rollups_only(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'year': 2025})
+        self.assertFalse([q for q in ctx.captured_queries if 'reservations_reservation' in q['sql']])
+
+        self.assertEqual(response.context['total']['reservations'], 3)
+        self.assertEqual(response.context['total']['actual'], 39000)
+        self.assertEqual(response.context['total']['average_error'], 1500)
+        march = response.context['months'][2]
+        self.assertEqual((march['completed'], march['actual'], march['bar_percent']), (2, 39000, 100))
+        self.assertEqual(response.context['months'][6]['cancelled'], 1)
+        self.assertEqual(
+            [(row['service_menu__name'], row['actual']) for row in response.context['menus']],
+            [('オーバーホール', 39000), (None, 0)],
+        )
+        self.assertContains(response, '39,000円')
+
+    def test_report_shows_pending_days_until_refresh(self):
+        Reservation.objects.create(name='追加', date=date(2025, 4, 1), time_slot='AM')
+        response = self.client.get(self.url, {'year': 2025})
+        self.assertEqual(response.context['pending_days'], 1)
+        self.assertEqual(response.context['total']['reservations'], 3)
+
+        refresh_dirty_days()
+        response = self.client.get(self.url, {'year': 2025})
+        self.assertEqual(response.context['total']['reservations'], 4)
+
+    def test_bulk_action_marks_days(self):
+        reservation = Reservation.objects.create(name='確定', date=date(2025, 5, 1), time_slot='AM')
+        RollupDirtyDay.objects.all().delete()
+        apply_bulk_action('start', Reservation.objects.filter(pk=reservation.pk))
+        self.assertEqual(list(RollupDirtyDay.objects.values_list('date', flat=True)), [date(2025, 5, 1)])
+
+
+class DashboardQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        clear_caches()
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.client.force_login(self.staff)
+        menu = ServiceMenu.objects.create(
+            name='メンテナンス', estimated_duration=90, price_estimate=5000, price_display='5,000円～',
+        )
+        users = [User.objects.create_user(f'user{i}') for i in range(5)]
+        today = date.today()
+        Reservation.objects.bulk_create([
+            Reservation(
+                user=users[i % 5], name=f'客{i}', date=today + timedelta(days=i % 4), time_slot='AM',
+                service_menu=menu,
+            )
+            for i in range(40)
+        ])
+        self.reservation = Reservation.objects.filter(date=today).first()
+        bike_info = BikeInfo.objects.create(
+            reservation=self.reservation, manufacturer='トレック', model_name='Domane', details='ブレーキ調整',
+        )
+        BikeImage.objects.bulk_create([BikeImage(bike_info=bike_info, image=f'bike_images/{i}.jpg') for i in range(4)])
+        WorkHistory.objects.create(reservation=self.reservation)
+
+    def test_home(self):
+        with self.assertQueryBudget(5):  # セッション・ユーザー・本日・今後・集計
+            self.client.get(reverse('dashboard:home'))
+
+    def test_reservation_list(self):
+        with self.assertQueryBudget(3):
+            self.client.get(reverse('dashboard:reservation_list'))
+
+    def test_reservation_detail(self):
+        # セッション・ユーザー・予約（自転車情報・作業履歴）・画像
+        with self.assertQueryBudget(4):
+            self.client.get(reverse('dashboard:reservation_detail', args=[self.reservation.pk]))
+
+
+class ReservationSearchTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.client.force_login(self.staff)
+        self.url = reverse('dashboard:reservation_list')
+        today = date.today()
+        self.yamada = Reservation.objects.create(name='山田 太郎', date=today, time_slot='AM', note='午前中に伺います')
+        self.sato = Reservation.objects.create(
+            name='佐藤 花子', date=today, time_slot='PM', admin_memo='常連のお客様', status='completed',
+        )
+        self.suzuki = Reservation.objects.create(name='鈴木 一郎', date=today + timedelta(days=1), time_slot='AM')
+        BikeInfo.objects.create(
+            reservation=self.yamada, manufacturer='トレック', model_name='Domane', details='ブレーキの効きが悪い',
+        )
+        BikeInfo.objects.create(
+            reservation=self.suzuki, manufacturer='Specialized', model_name='Allez', details='ブレーキ鳴きと変速不良',
+        )
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        return [r.pk for r in response.context['reservations']]
+
+    def test_matches_every_indexed_column(self):
+        self.assertEqual(self.search(q='トレック'), [self.yamada.pk])
+        self.assertEqual(self.search(q='domane'), [self.yamada.pk])
+        self.assertEqual(self.search(q='常連のお'), [self.sato.pk])
+        self.assertEqual(self.search(q='午前中'), [self.yamada.pk])
+        self.assertEqual(sorted(self.search(q='ブレーキ')), sorted([self.yamada.pk, self.suzuki.pk]))
+
+    def test_short_terms_and_multiple_terms(self):
+        self.assertEqual(self.search(q='佐藤'), [self.sato.pk])
+        self.assertEqual(self.search(q='ブレーキ 変速'), [self.suzuki.pk])
+        self.assertEqual(self.search(q='ブレーキ 山田'), [self.yamada.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.sato.admin_memo = 'タイヤ交換済み'
+        self.sato.save()
+        self.assertEqual(self.search(q='タイヤ交換'), [self.sato.pk])
+        self.assertEqual(self.search(q='常連のお'), [])
+
+        self.yamada.bike_info.delete()
+        self.assertEqual(self.search(q='トレック'), [])
+        self.suzuki.delete()
+        self.assertEqual(self.search(q='ブレーキ'), [])
+
+    def test_combines_with_filters_and_export(self):
+        self.assertEqual(self.search(q='ブレーキ', date_from=str(date.today() + timedelta(days=1))), [self.suzuki.pk])
+        self.assertEqual(self.search(q='お客様', status='confirmed'), [])
+
+        response = self.client.get(reverse('dashboard:reservation_export'), {'format': 'jsonl', 'q': 'トレック'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.yamada.pk])
+
+    def test_results_are_ranked(self):
+        # 語が何度も出てくる予約が最も関連が高い
+        takahashi = Reservation.objects.create(
+            name='高橋 次郎', date=date.today(), time_slot='PM', note='ブレーキ交換・ブレーキ調整・ブレーキワイヤー',
+        )
+        results = self.search(q='ブレーキ')
+        self.assertEqual(results[0], takahashi.pk)
+        self.assertEqual(sorted(results[1:]), sorted([self.yamada.pk, self.suzuki.pk]))
+
+    def test_filtered_results_are_paginated(self):
+        size = views.RESERVATION_PAGE_SIZE
+        Reservation.objects.bulk_create([
+            Reservation(name=f'整備 {i}', note='ブレーキ点検', date=date.today(), time_slot='AM',
+                        status='completed' if i % 2 else 'confirmed')
+            for i in range(size * 2 + 10)
+        ])
+        expected = set(
+            Reservation.objects.filter(status='completed', note='ブレーキ点検').values_list('pk', flat=True)
+        )
+        self.assertGreater(len(expected), size)
 
-# Create your tests here.
+        rows = []
+        params = {'q': 'ブレーキ', 'status': 'completed'}
+        while True:
+            response = self.client.get(self.url, params)
+            rows += list(response.context['reservations'])
+            if not response.context['next_query']:
+                break
+            params['cursor'] = response.context['reservations'].next_cursor
+        seen = [r.pk for r in rows]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(set(seen), expected)
+        ranks = [r.search_rank for r in rows]
+        self.assertEqual(ranks, sorted(ranks))
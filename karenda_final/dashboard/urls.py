@@ -6,6 +6,9 @@ app_name = 'dashboard'
 urlpatterns = [
     path('', views.dashboard_home, name='home'),
     path('reservations/', views.reservation_list, name='reservation_list'),
+    path('reservations/export/', views.reservation_export, name='reservation_export'),
+    path('reservations/bulk/', views.reservation_bulk_action, name='reservation_bulk_action'),
+    path('reports/revenue/', views.revenue_report, name='revenue_report'),
     path('reservations/<int:pk>/', views.reservation_detail, name='reservation_detail'),
     path('reservations/<int:pk>/work-history/', views.work_history_edit, name='work_history_edit'),
     path('menus/', views.service_menu_list, name='service_menu_list'),
@@ -1,14 +1,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.http import StreamingHttpResponse
+from django.db import transaction
 from django.utils import timezone
 from datetime import date, timedelta
 from reservations.models import (
     Reservation, ServiceMenu, BikeInfo, TimeSlot, 
     Holiday, BusinessDay, WorkHistory
 )
-from reservations.forms import ServiceMenuForm, ReservationForm
+from reservations import booking
+from reservations.forms import ServiceMenuForm, ReservationStatusForm
+from reservations.email_utils import build_completion_message
+from reservations.outbox import queue_message
+from reservations.decorators import async_login_required, async_user_passes_test
+from reservations.occupancy import OCCUPYING_STATUSES
+from reservations.pagination import keyset_page
+from reservations.search import rank_reservations
+from .bulk import BULK_ACTIONS, apply_bulk_action
+from .exports import CONTENT_TYPES, export_lines
+from .filters import filter_reservations, reservation_filters
+from .stats import ahome_counters, revenue_summary
 
 
 def is_staff(user):
@@ -16,9 +31,9 @@ def is_staff(user):
     return user.is_staff or user.is_superuser
 
 
-@login_required
-@user_passes_test(is_staff)
-def dashboard_home(request):
+@async_login_required
+@async_user_passes_test(is_staff)
+async def dashboard_home(request):
     """管理者ダッシュボード - ホーム"""
     today = date.today()
     
@@ -34,67 +49,158 @@ def dashboard_home(request):
         status='confirmed'
     ).select_related('service_menu', 'user')[:10]
     
-    # ステータス別集計
-    status_summary = Reservation.objects.filter(
-        date__gte=today
-    ).values('status').annotate(count=Count('id'))
+    # 件数・ステータス別集計（キャッシュ）
+    counters = await ahome_counters(today)
     
     context = {
-        'today_reservations': today_reservations,
-        'upcoming_reservations': upcoming_reservations,
-        'status_summary': status_summary,
+        'today_reservations': [r async for r in today_reservations],
+        'upcoming_reservations': [r async for r in upcoming_reservations],
+        'today_count': counters['today'],
+        'upcoming_count': counters['upcoming'],
+        'status_summary': counters['status_summary'],
         'today': today,
     }
     return render(request, 'dashboard/home.html', context)
 
 
+# 予約一覧の1ページの件数と並び順（最後の id で並び順を一意にする）
+RESERVATION_PAGE_SIZE = 50
+RESERVATION_LIST_ORDERING = ('-date', 'time_slot', 'id')
+# キーワード検索時は関連度順（同じ関連度なら新しい順）
+SEARCH_RESULT_ORDERING = ('search_rank', '-id')
+
+
 @login_required
 @user_passes_test(is_staff)
 def reservation_list(request):
-    """予約一覧"""
-    status = request.GET.get('status', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
+    """予約一覧（カーソル方式のページ送り）"""
+    filters = reservation_filters(request.GET)
     
-    reservations = Reservation.objects.select_related('service_menu', 'user')
-    
-    if status:
-        reservations = reservations.filter(status=status)
-    
-    if date_from:
-        reservations = reservations.filter(date__gte=date_from)
+    # 一覧に表示する列だけを取得
+    reservations = Reservation.objects.select_related('service_menu').only(
+        'id', 'date', 'time_slot', 'name', 'status', 'service_menu__name',
+    )
+    if filters['q']:
+        # キーワード検索は絞り込み条件と同じクエリで関連度を計算し、関連度順にページ送りする
+        reservations = rank_reservations(filter_reservations(reservations, {**filters, 'q': ''}), filters['q'])
+        ordering = SEARCH_RESULT_ORDERING
+    else:
+        reservations = filter_reservations(reservations, filters)
+        ordering = RESERVATION_LIST_ORDERING
+    page = keyset_page(
+        reservations,
+        ordering,
+        cursor=request.GET.get('cursor'),
+        page_size=RESERVATION_PAGE_SIZE,
+    )
     
-    if date_to:
-        reservations = reservations.filter(date__lte=date_to)
+    next_query = None
+    if page.has_next:
+        query = request.GET.copy()
+        query['cursor'] = page.next_cursor
+        next_query = query.urlencode()
     
-    reservations = reservations.order_by('-date', 'time_slot')
+    first_query = request.GET.copy()
+    first_query.pop('cursor', None)
     
     context = {
-        'reservations': reservations,
+        'reservations': page,
+        'is_first_page': not request.GET.get('cursor'),
+        'next_query': next_query,
+        'first_query': first_query.urlencode(),
         'status_choices': Reservation.STATUS_CHOICES,
-        'current_status': status,
-        'current_date_from': date_from,
-        'current_date_to': date_to,
+        'current_status': filters['status'],
+        'current_date_from': filters['date_from'],
+        'current_date_to': filters['date_to'],
+        'current_q': filters['q'],
+        'bulk_actions': [(action, label) for action, (_, _, label) in BULK_ACTIONS.items()],
     }
     return render(request, 'dashboard/reservation_list.html', context)
 
 
+@login_required
+@user_passes_test(is_staff)
+@require_POST
+def reservation_bulk_action(request):
+    """予約ステータスの一括変更（選択した予約、または本日の予約）"""
+    action = request.POST.get('action')
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse('dashboard:reservation_list')
+    if action not in BULK_ACTIONS:
+        messages.error(request, '操作を選択してください。')
+        return redirect(next_url)
+    
+    if request.POST.get('scope') == 'today':
+        reservations = Reservation.objects.filter(date=date.today())
+    else:
+        ids = [pk for pk in request.POST.getlist('reservation_ids') if pk.isdigit()]
+        if not ids:
+            messages.error(request, '予約を選択してください。')
+            return redirect(next_url)
+        reservations = Reservation.objects.filter(pk__in=ids)
+    
+    count = apply_bulk_action(action, reservations)
+    label = BULK_ACTIONS[action][2]
+    if count:
+        messages.success(request, f'{count}件の予約を「{label}」にしました。')
+    else:
+        messages.info(request, f'「{label}」に変更できる予約はありませんでした。')
+    return redirect(next_url)
+
+
+@login_required
+@user_passes_test(is_staff)
+def reservation_export(request):
+    """予約エクスポート（CSV / JSONL をストリーミングで返す）"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in CONTENT_TYPES:
+        export_format = 'csv'
+    
+    filters = reservation_filters(request.GET)
+    response = StreamingHttpResponse(
+        export_lines(export_format, filters),
+        content_type=CONTENT_TYPES[export_format],
+    )
+    filename = f'reservations_{date.today():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 @user_passes_test(is_staff)
 def reservation_detail(request, pk):
     """予約詳細・編集"""
-    reservation = get_object_or_404(Reservation, pk=pk)
+    reservation = get_object_or_404(
+        Reservation.objects.select_related('service_menu', 'bike_info', 'work_history')
+        .prefetch_related('bike_info__images'),
+        pk=pk,
+    )
     bike_info = getattr(reservation, 'bike_info', None)
     work_history = getattr(reservation, 'work_history', None)
     
     if request.method == 'POST':
-        form = ReservationForm(request.POST, instance=reservation)
+        previous_status = reservation.status
+        form = ReservationStatusForm(request.POST, instance=reservation)
         if form.is_valid():
-            form.save()
-            messages.success(request, '予約を更新しました。')
-            return redirect('dashboard:reservation_detail', pk=pk)
+            status = form.cleaned_data['status']
+            try:
+                if previous_status == 'confirmed' and status == 'cancelled':
+                    # 利用者のキャンセルと同じく、空いた枠をキャンセル待ちに繰り上げる
+                    booking.cancel_reservation(reservation)
+                elif previous_status not in OCCUPYING_STATUSES and status in OCCUPYING_STATUSES:
+                    # キャンセル済みの予約を戻す場合は、新規予約と同じく空きを確認して枠を確保する
+                    booking.reinstate_reservation(reservation, status)
+                else:
+                    form.save()
+            except booking.SlotUnavailable:
+                reservation.status = previous_status
+                form.add_error('status', 'その日付・時間帯は満席のため、予約を戻せません。')
+            else:
+                messages.success(request, '予約を更新しました。')
+                return redirect('dashboard:reservation_detail', pk=pk)
     else:
-        form = ReservationForm(instance=reservation)
+        form = ReservationStatusForm(instance=reservation)
     
     context = {
         'reservation': reservation,
@@ -111,6 +217,7 @@ def work_history_edit(request, pk):
     """作業履歴・見積もり編集"""
     reservation = get_object_or_404(Reservation, pk=pk)
     work_history, created = WorkHistory.objects.get_or_create(reservation=reservation)
+    previous_status = work_history.status
     
     if request.method == 'POST':
         estimated_amount = request.POST.get('estimated_amount')
@@ -128,9 +235,20 @@ def work_history_edit(request, pk):
         if status:
             work_history.status = status
         if completion_photo:
+            # 古いサムネイル等を消し、新しい写真は process_images コマンドで処理する
+            work_history.completion_thumbnail.delete(save=False)
+            work_history.completion_webp.delete(save=False)
             work_history.completion_photo = completion_photo
+            work_history.completion_photo_processed_at = None
         
-        work_history.save()
+        with transaction.atomic():
+            work_history.save()
+            # 完了にしたときだけ作業完了メールを送信待ちに登録
+            if work_history.status == 'completed' and previous_status != 'completed':
+                queue_message(
+                    f'completion:{work_history.pk}',
+                    build_completion_message(work_history),
+                )
         messages.success(request, '作業履歴を更新しました。')
         return redirect('dashboard:reservation_detail', pk=pk)
     
@@ -142,6 +260,15 @@ def work_history_edit(request, pk):
     return render(request, 'dashboard/work_history_edit.html', context)
 
 
+@login_required
+@user_passes_test(is_staff)
+def revenue_report(request):
+    """売上・稼働レポート（年単位、日別メニュー集計から表示）"""
+    year = request.GET.get('year', '')
+    year = int(year) if year.isdigit() and 2000 <= int(year) <= 2100 else date.today().year
+    return render(request, 'dashboard/revenue_report.html', revenue_summary(year))
+
+
 @login_required
 @user_passes_test(is_staff)
 def service_menu_list(request):
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'reservations.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,14 +77,46 @@ WSGI_APPLICATION = 'reservation_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# WAL・busy_timeout などの PRAGMA と BEGIN IMMEDIATE を設定する SQLite バックエンド
+# （reservation_project/sqlite_backend/base.py。PRAGMA は OPTIONS の 'pragmas' で上書きできる）
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'reservation_project.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # 接続をリクエストごとに作り直さず再利用する（再利用前に切断されていないか確認する）
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        # 同時予約のテストで本番と同じファイルロックの挙動にするため、テストもファイルDBを使う
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# 'default' は営業日カレンダー・管理画面の集計などの計算結果（プロセスごとの LocMemCache）。
+# 'versions' はデータの版番号（reservations/versioning.py）専用で、同じサーバーの全ワーカーから
+# 見えるようファイルに保存する。どのワーカーでの変更も、全ワーカーの次のリクエストで読み直される。
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'renv',
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'versions',
+    },
+}
+
+# メニュー・時間枠の設定をプロセス内に保持する最大秒数（reservations/config_cache.py）
+# 版番号の変更で読み直すため通常は不要だが、版番号を進めない更新（update() など）への保険
+CONFIG_CACHE_MAX_AGE = 30
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -124,6 +157,33 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# リクエストごとのクエリ数（X-Query-Count ヘッダーと reservations.queries ログ）
+# QUERY_COUNT_ENABLED を指定しない場合は DEBUG のときだけ記録する
+# 同じ形のクエリがこの回数以上実行されたら N+1 の疑いとして警告する
+QUERY_COUNT_REPEAT_THRESHOLD = 3
+
+# 予約・キャンセル・会員登録の送信回数の制限（reservations.ratelimit）
+# 種別 → (連続して受け付ける回数, 使い切った回数が全て回復するまでの秒数)。指定しない種別は既定値を使う
+# 回数は CACHES に保存するため、複数プロセスで制限を共有するには共有のキャッシュを設定する
+RATE_LIMIT_ENABLED = True
+RATE_LIMITS = {}
+# 未ログインの利用者は IP アドレスごとに数える。リバースプロキシ（nginx など）の内側で動かす場合は
+# プロキシが設定するヘッダーを指定する（未指定なら REMOTE_ADDR。プロキシの内側では全員が同じアドレスになる）
+# X-Forwarded-For の場合は、右から RATE_LIMIT_TRUSTED_PROXIES 番目（信頼できるプロキシの数）を接続元とする
+RATE_LIMIT_IP_HEADER = None  # 例: 'HTTP_X_FORWARDED_FOR'
+RATE_LIMIT_TRUSTED_PROXIES = 1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'reservations.queries': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,84 @@
+import os
+
+from django.db.backends.sqlite3 import base, creation
+
+
+# 接続ごとに設定する PRAGMA（OPTIONS の 'pragmas' で上書きできる）
+DEFAULT_PRAGMAS = {
+    # 読み込みが書き込みを待たず、コミットもジャーナルの書き戻しより速い
+    'journal_mode': 'WAL',
+    # ロック中は失敗せずにミリ秒単位で待つ
+    'busy_timeout': 15000,
+    # WAL では NORMAL でもデータベースは壊れない（電源断で直前のコミットが失われることはある）
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,
+    # 負の値は KiB 単位
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
+}
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+# WAL モードで作られる付随ファイル
+SIDECAR_SUFFIXES = ('-wal', '-shm')
+
+
+def remove_sidecars(database_name):
+    for suffix in SIDECAR_SUFFIXES:
+        try:
+            os.remove(f'{database_name}{suffix}')
+        except FileNotFoundError:
+            pass
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """テスト用データベースの作成・削除時に WAL の付随ファイルも削除する
+
+    古い -wal ファイルが残っていると、作り直したデータベースに適用されてしまうため。
+    """
+
+    def _create_test_db(self, verbosity, autoclobber, keepdb=False):
+        test_database_name = self._get_test_db_name()
+        if not keepdb and not self.is_in_memory_db(test_database_name):
+            remove_sidecars(test_database_name)
+        return super()._create_test_db(verbosity, autoclobber, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        super()._destroy_test_db(test_database_name, verbosity)
+        if test_database_name and not self.is_in_memory_db(test_database_name):
+            remove_sidecars(test_database_name)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """接続時に PRAGMA を設定し、トランザクションの開始モードを選べる SQLite バックエンド
+
+    OPTIONS:
+        pragmas: DEFAULT_PRAGMAS を上書きする PRAGMA（値が None のものは設定しない）
+        transaction_mode: atomic() の開始時に使う BEGIN のモード（既定は IMMEDIATE）
+
+    DEFERRED で始めたトランザクションが読み込みの後に書き込むと、他の接続が書き込み中の場合は
+    busy_timeout を待たずに "database is locked" になる。IMMEDIATE なら開始時に書き込みロックを待つ。
+    """
+
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        options = self.settings_dict['OPTIONS']
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.transaction_mode = options.get('transaction_mode', 'IMMEDIATE').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(f'transaction_mode must be one of {", ".join(TRANSACTION_MODES)}')
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            if value is not None:
+                conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
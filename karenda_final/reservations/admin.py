@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Reservation
+from django.utils import timezone
+from .models import BusinessDay, EmailOutbox, Holiday, Reservation, WaitlistEntry
+from .search import search_reservations
 
 
 @admin.register(Reservation)
@@ -27,6 +29,10 @@ class ReservationAdmin(admin.ModelAdmin):
 
     ordering = ('date', 'time_slot')
 
+    def get_search_results(self, request, queryset, search_term):
+        # LIKE '%…%' の全件走査ではなく全文検索テーブルを使う
+        return search_reservations(queryset, search_term), False
+
     fieldsets = (
         ('予約情報', {
             'fields': (
@@ -48,4 +54,42 @@ class ReservationAdmin(admin.ModelAdmin):
         return bool(obj.admin_memo)
 
     has_admin_memo.short_description = '管理メモ'
-    has_admin_memo.boolean = True
\ No newline at end of file
+    has_admin_memo.boolean = True
+
+
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'name', 'is_permanent', 'day_of_week')
+    list_filter = ('is_permanent',)
+
+
+@admin.register(BusinessDay)
+class BusinessDayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'is_open', 'note')
+    list_filter = ('is_open',)
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('date', 'time_slot', 'name', 'service_menu', 'status', 'created_at', 'promoted_at')
+    list_filter = ('status', 'time_slot')
+    raw_id_fields = ('user', 'reservation')
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('idempotency_key', 'to', 'subject')
+    readonly_fields = ('idempotency_key', 'created_at', 'sent_at', 'last_error')
+    actions = ['retry']
+
+    @admin.action(description='選択したメールを再送する')
+    def retry(self, request, queryset):
+        queryset.exclude(status='sent').update(
+            status='pending',
+            attempts=0,
+            next_attempt_at=timezone.now(),
+            claim_token='',
+            locked_until=None,
+        )
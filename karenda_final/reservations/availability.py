@@ -0,0 +1,121 @@
+import calendar
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+
+from .business_calendar import closed_days
+from .config_cache import active_time_slots
+from .models import Reservation, SlotOccupancy
+from .occupancy import booking_window_days, slot_capacities, slot_code, slot_minutes
+
+
+# 1回のリクエストで取得できる最大日数
+MAX_RANGE_DAYS = 93
+
+
+def month_range(year, month):
+    """指定月の初日と末日"""
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, 1), date(year, month, last_day)
+
+
+def parse_range(params):
+    """クエリ（month=YYYY-MM または start/end=YYYY-MM-DD）から期間を取得"""
+    if params.get('month'):
+        year, month = (int(part) for part in params['month'].split('-'))
+        return month_range(year, month)
+
+    start = date.fromisoformat(params.get('start', ''))
+    end = date.fromisoformat(params.get('end', ''))
+    if end < start:
+        raise ValueError('end must not be before start')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError('range too long')
+    return start, end
+
+
+def slot_times():
+    """有効な TimeSlot を午前・午後に振り分けた表示用の時間帯"""
+    times = {code: [] for code, _ in Reservation.TIME_CHOICES}
+    for slot in active_time_slots():
+        times[slot_code(slot.start_time)].append({
+            'start': slot.start_time.strftime('%H:%M'),
+            'end': slot.end_time.strftime('%H:%M'),
+        })
+    return times
+
+
+def _occupancy_rows(start, end):
+    return SlotOccupancy.objects.filter(date__range=(start, end))
+
+
+def _calendar_and_config(start, end):
+    """休業日・受付可能数・時間帯表示（いずれもプロセス内にキャッシュされ、未取得のときだけDBを読む）"""
+    return closed_days(start, end), slot_capacities(), slot_times(), slot_minutes()
+
+
+def _free_minutes(slots, minutes):
+    """時間帯ごとに、そこから空きが続く間に作業できる時間（分）を設定（None は制限なし）
+
+    メニューの想定作業時間がこの値以下の時間帯だけ開始時刻として選べる。
+    """
+    reach = 0
+    for code in reversed(list(slots)):
+        if slots[code]['available'] == 0:
+            reach = 0
+        elif minutes[code] is None or reach is None:
+            reach = None
+        else:
+            reach = minutes[code] + reach
+        slots[code]['free_minutes'] = reach
+
+
+def _availability(start, end, today, occupancy_rows, closed, capacities, times, minutes):
+    today = today or date.today()
+    window_end = today + timedelta(days=booking_window_days())
+    codes = [code for code, _ in Reservation.TIME_CHOICES]
+    occupancy = {(row.date, row.time_slot): row for row in occupancy_rows}
+
+    days = {}
+    day = start
+    while day <= end:
+        is_open = day not in closed
+        slots = {}
+        for code in codes:
+            row = occupancy.get((day, code))
+            capacity = row.capacity if row else capacities[code]
+            booked = row.booked_count if row else 0
+            slots[code] = {
+                'capacity': capacity,
+                'booked': booked,
+                'available': max(capacity - booked, 0) if is_open else 0,
+            }
+        _free_minutes(slots, minutes)
+        days[day.isoformat()] = {
+            'open': is_open,
+            'bookable': is_open and today <= day <= window_end,
+            'slots': slots,
+        }
+        day += timedelta(days=1)
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'time_slots': {
+            code: {'label': label, 'times': times[code], 'minutes': minutes[code]}
+            for code, label in Reservation.TIME_CHOICES
+        },
+        'days': days,
+    }
+
+
+def build_availability(start, end, today=None):
+    """期間内の日別・時間帯別の空き状況"""
+    return _availability(start, end, today, _occupancy_rows(start, end), *_calendar_and_config(start, end))
+
+
+async def abuild_availability(start, end, today=None):
+    """build_availability の非同期版（占有状況は非同期 ORM で取得）"""
+    rows = [row async for row in _occupancy_rows(start, end)]
+    config = await sync_to_async(_calendar_and_config)(start, end)
+    return _availability(start, end, today, rows, *config)
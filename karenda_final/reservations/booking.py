@@ -0,0 +1,235 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .email_utils import build_confirmation_message, build_waitlist_promotion_message
+from .models import BikeImage, Reservation, ReservationSubmission, SlotOccupancy, WaitlistEntry
+from .occupancy import OCCUPYING_STATUSES, covered_slots, is_slot_available, menu_span, slot_capacities
+from .outbox import queue_message
+from .rollups import mark_days_dirty
+from .versioning import bump_version_on_commit
+
+
+# キャンセル1件につき、解放された時間帯ごとに確認するキャンセル待ちの最大件数
+PROMOTION_PROBES = 5
+
+# 予約フォームの冪等キーを保持する時間（この間の再送信には最初の予約を返す）
+SUBMISSION_KEY_TTL = timedelta(days=1)
+
+
+class SlotUnavailable(Exception):
+    """指定した日付・時間帯に空きがない"""
+
+
+class SlotAvailable(Exception):
+    """空きがあるためキャンセル待ちに登録できない"""
+
+
+class DuplicateSubmission(Exception):
+    """同じ冪等キーのフォームですでに予約されている"""
+
+    def __init__(self, reservation_id):
+        super().__init__(f'already submitted as reservation {reservation_id}')
+        self.reservation_id = reservation_id
+
+
+def claim_slot(date_value, time_slot, capacity):
+    """枠の受付可能数を1つ確保する（満席なら SlotUnavailable）
+
+    条件付き UPDATE で予約数を増やすため、同時に申し込みがあっても
+    受付可能数を超えて確保されることはない。
+    """
+    # 占有状況の行がなければ作成（書き込みから始めてトランザクションのロックを先に取る）
+    SlotOccupancy.objects.bulk_create(
+        [SlotOccupancy(date=date_value, time_slot=time_slot, capacity=capacity)],
+        ignore_conflicts=True,
+    )
+    claimed = SlotOccupancy.objects.filter(
+        date=date_value,
+        time_slot=time_slot,
+        booked_count__lt=F('capacity'),
+    ).update(booked_count=F('booked_count') + 1)
+    if not claimed:
+        raise SlotUnavailable(f'{date_value} {time_slot} is fully booked')
+
+
+def release_slot(date_value, time_slot):
+    """確保済みの枠を1つ解放する"""
+    SlotOccupancy.objects.filter(
+        date=date_value,
+        time_slot=time_slot,
+        booked_count__gt=0,
+    ).update(booked_count=F('booked_count') - 1)
+
+
+def claim_slots(reservation):
+    """予約のメニューに必要な時間帯の枠をすべて確保する（呼び出し元のトランザクション内で使う）
+
+    メニューの想定作業時間が1つの時間帯に収まらない場合は、続く時間帯の枠も順に確保する
+    （どれかが満席なら SlotUnavailable。確保済みの枠はトランザクションごと取り消される）。
+    """
+    menu = reservation.service_menu if reservation.service_menu_id else None
+    span = menu_span(menu, reservation.time_slot)
+    if span is None:
+        raise SlotUnavailable(f'{reservation.date} {reservation.time_slot} is too short for the menu')
+    reservation.slot_span = span
+    capacities = slot_capacities()
+    for time_slot in covered_slots(reservation.time_slot, span):
+        claim_slot(reservation.date, time_slot, capacities[time_slot])
+
+
+def find_submission(user, key):
+    """有効期間内に同じ冪等キーの予約フォームで作成した予約の ID（なければ None）"""
+    if not key:
+        return None
+    return (
+        ReservationSubmission.objects
+        .filter(user=user, key=key, created_at__gte=timezone.now() - SUBMISSION_KEY_TTL)
+        .values_list('reservation_id', flat=True)
+        .first()
+    )
+
+
+def _record_submission(reservation, key):
+    # 期限切れのキーは記録のついでに削除し、表を小さく保つ
+    ReservationSubmission.objects.filter(created_at__lt=timezone.now() - SUBMISSION_KEY_TTL).delete()
+    ReservationSubmission.objects.create(user=reservation.user, key=key, reservation=reservation)
+
+
+def book_reservation(reservation, bike_info=None, images=(), submission_key=''):
+    """枠を確保して予約・自転車情報・画像を1トランザクションで保存する
+
+    submission_key を指定すると、同じキーの予約がすでにあれば何も保存せずに DuplicateSubmission を送出する。
+    キーは画像より先に記録するため、同時に再送信されても画像を保存するのは一方だけになる。
+    """
+    try:
+        with transaction.atomic():
+            claim_slots(reservation)
+            reservation.save()
+            if submission_key:
+                _record_submission(reservation, submission_key)
+
+            if bike_info is not None:
+                bike_info.reservation = reservation
+                bike_info.save()
+                # 画像はそのまま保存し、縮小などの処理は process_images コマンドで行う
+                BikeImage.objects.bulk_create([BikeImage(bike_info=bike_info, image=f) for f in images])
+
+            queue_message(f'confirmation:{reservation.pk}', build_confirmation_message(reservation))
+    except (IntegrityError, SlotUnavailable):
+        # 同時に再送信された場合、最初の送信が確保した枠で満席になるか、キーの一意制約で失敗する
+        original = find_submission(reservation.user, submission_key)
+        if original is None:
+            raise
+        reservation.pk = None
+        raise DuplicateSubmission(original)
+    return reservation
+
+
+def join_waitlist(entry):
+    """満席の日付・時間帯のキャンセル待ちに登録する
+
+    空きがあれば SlotAvailable、メニューの作業がその時間帯から終わらなければ SlotUnavailable を送出する。
+    """
+    menu = entry.service_menu if entry.service_menu_id else None
+    span = menu_span(menu, entry.time_slot)
+    if span is None:
+        raise SlotUnavailable(f'{entry.date} {entry.time_slot} is too short for the menu')
+    if is_slot_available(entry.date, entry.time_slot, span):
+        raise SlotAvailable(f'{entry.date} {entry.time_slot} has a free slot')
+    entry.save()
+    return entry
+
+
+def _promote_first(date_value, time_slot):
+    """time_slot のキャンセル待ちを登録順に確認し、最初に枠を確保できた1件を予約に繰り上げる（なければ None）"""
+    while True:
+        waiters = (
+            WaitlistEntry.objects.filter(date=date_value, time_slot=time_slot, status='waiting')
+            .select_related('user', 'service_menu')
+            .order_by('created_at', 'id')[:PROMOTION_PROBES]
+        )
+        withdrawn = False
+        for entry in waiters:
+            if menu_span(entry.service_menu, time_slot) is None:
+                # 登録後のメニュー・時間枠の変更で作業が終わらなくなった登録は、繰り上げられないため取り下げる
+                entry.status = 'withdrawn'
+                entry.save(update_fields=['status'])
+                withdrawn = True
+                continue
+            reservation = Reservation(
+                user=entry.user,
+                name=entry.name,
+                date=entry.date,
+                time_slot=entry.time_slot,
+                service_menu=entry.service_menu,
+                note='キャンセル待ちからの繰り上げ',
+            )
+            try:
+                with transaction.atomic():
+                    claim_slots(reservation)
+                    reservation.save()
+            except SlotUnavailable:
+                continue
+            entry.status = 'promoted'
+            entry.reservation = reservation
+            entry.promoted_at = timezone.now()
+            entry.save(update_fields=['status', 'reservation', 'promoted_at'])
+            queue_message(f'waitlist:{entry.pk}', build_waitlist_promotion_message(reservation))
+            return reservation
+        # 取り下げた分だけ先頭が空いたので読み直す（取り下げは1件につき1回だけなので、繰り返しは増えない）
+        if not withdrawn:
+            return None
+
+
+def promote_waiters(date_value, time_slots):
+    """解放された時間帯ごとにキャンセル待ちを登録順に確認し、最初に枠を確保できた1件を予約に繰り上げる
+
+    時間帯ごとに待ち順のインデックスの先頭 PROMOTION_PROBES 件だけを読むため、
+    キャンセル待ちが何件あっても1回のキャンセルで読む件数は変わらない。
+    続く時間帯が満席で確保できなかった登録は、そのまま次の機会を待つ。
+    メニューの作業がその時間帯から終わらなくなった登録は取り下げ、先頭に残り続けないようにする。
+    """
+    promoted = []
+    for time_slot in time_slots:
+        reservation = _promote_first(date_value, time_slot)
+        if reservation is not None:
+            promoted.append(reservation)
+    return promoted
+
+
+def cancel_reservation(reservation):
+    """確定済みの予約をキャンセルして枠を解放する（キャンセルできたら True）
+
+    解放した枠はキャンセル待ちの先頭に同じトランザクション内で繰り上げ、通知メールを送信待ちに登録する。
+    """
+    with transaction.atomic():
+        cancelled = Reservation.objects.filter(
+            pk=reservation.pk,
+            status='confirmed',
+        ).update(status='cancelled')
+        if not cancelled:
+            return False
+        released = covered_slots(reservation.time_slot, reservation.slot_span)
+        for time_slot in released:
+            release_slot(reservation.date, time_slot)
+        promote_waiters(reservation.date, released)
+        mark_days_dirty([reservation.date])
+    reservation.status = 'cancelled'
+    bump_version_on_commit('availability', 'reservations')
+    return True
+
+
+def reinstate_reservation(reservation, status):
+    """キャンセル済みの予約を枠を占有するステータスに戻す（満席なら SlotUnavailable で何も変更しない）
+
+    新規予約と同じく枠を確保してから保存するため、受付可能数を超えて戻すことはない。
+    """
+    if status not in OCCUPYING_STATUSES:
+        raise ValueError(f'{status} does not occupy a slot')
+    with transaction.atomic():
+        claim_slots(reservation)
+        reservation.status = status
+        reservation.save()
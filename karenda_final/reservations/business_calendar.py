@@ -0,0 +1,80 @@
+import calendar
+from datetime import date, timedelta
+
+from django.core.cache import cache
+
+from .models import BusinessDay, Holiday
+from .versioning import get_version
+
+
+# 年ごとの営業日フラグ {year: (version, bytes)}（1: 営業, 0: 休業）
+_compiled = {}
+
+
+def build_year(year):
+    """定休日・臨時休業日・営業日設定から1年分の営業日フラグを作成"""
+    start = date(year, 1, 1)
+    end = date(year, 12, 31)
+    days = 366 if calendar.isleap(year) else 365
+    flags = bytearray(b'\x01') * days
+
+    weekly = set(
+        Holiday.objects.filter(is_permanent=True, day_of_week__isnull=False)
+        .values_list('day_of_week', flat=True)
+    )
+    if weekly:
+        for offset in range(days):
+            if (start.weekday() + offset) % 7 in weekly:
+                flags[offset] = 0
+
+    for day in Holiday.objects.filter(is_permanent=False, date__range=(start, end)).values_list('date', flat=True):
+        flags[(day - start).days] = 0
+
+    # 営業日設定は休日より優先
+    for day, is_open in BusinessDay.objects.filter(date__range=(start, end)).values_list('date', 'is_open'):
+        flags[(day - start).days] = 1 if is_open else 0
+
+    return bytes(flags)
+
+
+def year_flags(year):
+    """1年分の営業日フラグ（プロセス内 → Django キャッシュ → DB の順に参照）"""
+    version = get_version('calendar')
+    compiled = _compiled.get(year)
+    if compiled is not None and compiled[0] == version:
+        return compiled[1]
+
+    cache_key = f'open_days:{year}:{version}'
+    flags = cache.get(cache_key)
+    if flags is None:
+        flags = build_year(year)
+        cache.set(cache_key, flags, timeout=None)
+    _compiled[year] = (version, flags)
+    return flags
+
+
+def is_open(day):
+    """指定日が営業日か"""
+    return bool(year_flags(day.year)[(day - date(day.year, 1, 1)).days])
+
+
+def iter_days(start, end):
+    """期間内の (日付, 営業日か) を順に返す"""
+    for year in range(start.year, end.year + 1):
+        flags = year_flags(year)
+        base = date(year, 1, 1)
+        first = (max(start, base) - base).days
+        last = (min(end, date(year, 12, 31)) - base).days
+        for offset in range(first, last + 1):
+            yield base + timedelta(days=offset), flags[offset] == 1
+
+
+def open_days(start, days):
+    """start から days 日間のうち営業日のリスト"""
+    end = start + timedelta(days=days - 1)
+    return [day for day, is_open_day in iter_days(start, end) if is_open_day]
+
+
+def closed_days(start, end):
+    """期間内の休業日の集合"""
+    return {day for day, is_open_day in iter_days(start, end) if not is_open_day}
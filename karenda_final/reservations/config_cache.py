@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import ServiceMenu, TimeSlot
+from .versioning import get_version
+
+
+# プロセス内に保持する設定の最大件数（古く使われていないものから捨てる）
+MAX_ENTRIES = 16
+
+# 版番号が変わらなくても読み直すまでの秒数（CONFIG_CACHE_MAX_AGE で変更。版番号を進めない更新への保険）
+DEFAULT_MAX_AGE = 30
+
+# キー → (版番号, 読み込んだ時刻, 値)
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def _max_age():
+    return getattr(settings, 'CONFIG_CACHE_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def cached_config(key, loader):
+    """メニュー・時間枠などの設定を 'config' の版番号ごとにプロセス内へ保持する
+
+    版番号は全ワーカーで共有するキャッシュ（CACHES の 'versions'）にあるため、どのワーカーで保存しても
+    全ワーカーの次のリクエストで読み直される。版番号を進めない更新（QuerySet.update() など）に備え、
+    CONFIG_CACHE_MAX_AGE 秒を過ぎた値も読み直す。
+    返す値は全リクエストで共有するので変更しないこと。
+    """
+    version = get_version('config')
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == version and now - entry[1] < _max_age():
+            _entries.move_to_end(key)
+            return entry[2]
+
+    value = loader()
+    with _lock:
+        _entries[key] = (version, now, value)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return value
+
+
+def service_menus():
+    """全メニュー（名前順）"""
+    return cached_config('service_menus', lambda: tuple(ServiceMenu.objects.order_by('name')))
+
+
+def active_time_slots():
+    """有効な時間枠（開始時刻順）"""
+    return cached_config(
+        'active_time_slots',
+        lambda: tuple(TimeSlot.objects.filter(is_active=True).order_by('start_time')),
+    )
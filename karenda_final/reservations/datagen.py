@@ -0,0 +1,240 @@
+import random
+import uuid
+from copy import deepcopy
+from datetime import date, timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from .models import BikeImage, BikeInfo, Reservation, ServiceMenu, WorkHistory
+from .occupancy import TIME_CODES, menu_span, rebuild_occupancy
+from .rollups import mark_days_dirty
+from .versioning import bump_version_on_commit
+
+
+SAMPLE_IMAGE_NAME = 'bike_images/generated/sample.jpg'
+
+MANUFACTURERS = ['トレック', 'スペシャライズド', 'ジャイアント', 'キャノンデール', 'ブリヂストン', 'パナソニック']
+MODEL_NAMES = ['Domane', 'Allez', 'Escape', 'CAAD', 'Anchor', 'Jetter']
+DETAILS = ['ブレーキの効きが悪い', '変速がずれる', 'チェーンから異音がする', 'ホイールが振れている', '定期点検']
+
+DEFAULT_MENUS = [
+    ('ホイール組み', 120, 8000, '8,000円～'),
+    ('フレーム塗装', 240, 15000, '15,000円～'),
+    ('メンテナンス', 90, 5000, '5,000円～'),
+    ('フィッティング', 60, 3000, '3,000円～'),
+]
+
+
+def use_database(name, config):
+    """このプロセスの default 接続を name のファイルと config の設定に切り替える（計測用の一時データベース）"""
+    connections.close_all()
+    connections.settings['default'].update(deepcopy(config), NAME=name)
+    del connections['default']
+
+
+def _batches(total, batch_size):
+    for start in range(0, total, batch_size):
+        yield start, min(batch_size, total - start)
+
+
+def _sample_image():
+    """生成データの画像が参照する小さな画像を1枚だけ保存"""
+    if not default_storage.exists(SAMPLE_IMAGE_NAME):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), (120, 120, 120)).save(buffer, format='JPEG')
+        default_storage.save(SAMPLE_IMAGE_NAME, ContentFile(buffer.getvalue()))
+    return SAMPLE_IMAGE_NAME
+
+
+def _menu_ids():
+    ids = list(ServiceMenu.objects.filter(is_active=True).values_list('pk', flat=True))
+    if ids:
+        return ids
+    ServiceMenu.objects.bulk_create([
+        ServiceMenu(name=name, estimated_duration=duration, price_estimate=price, price_display=display)
+        for name, duration, price, display in DEFAULT_MENUS
+    ], ignore_conflicts=True)
+    return list(ServiceMenu.objects.values_list('pk', flat=True))
+
+
+def _column_defaults(model, now):
+    """主キー以外の各フィールドの既定値（DB 用に変換済み）"""
+    values = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            value = now
+        else:
+            value = field.get_default()
+        values[field.attname] = field.get_db_prep_save(value, connection)
+    return values
+
+
+def _insert(model, rows, now):
+    """rows（フィールド名 → DB 用の値）をモデルを生成せずに INSERT し、割り当てた ID を返す
+
+    bulk_create はフィールドごとの変換処理が大半を占めるため、既定値は1回だけ変換し、
+    ID も自前で連番を振って executemany で書き込む。他の書き込みと同時に実行しないこと。
+    """
+    if not rows:
+        return range(0)
+    defaults = _column_defaults(model, now)
+    meta = model._meta
+    columns = [meta.pk.column] + [meta.get_field(name).column for name in defaults]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    first = (model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0) + 1
+    params = [
+        (first + i,) + tuple(row.get(name, default) for name, default in defaults.items())
+        for i, row in enumerate(rows)
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return range(first, first + len(rows))
+
+
+def _reset_sequences(*models):
+    """ID を自前で振ったテーブルの連番を合わせる（PostgreSQL など）"""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def create_users(count, batch_size=5000):
+    """利用者を count 人作成して ID のリストを返す（ログイン不可のパスワード）"""
+    password = make_password(None)
+    prefix = f'gen_{uuid.uuid4().hex[:8]}'
+    now = timezone.now()
+    ids = []
+    for start, size in _batches(count, batch_size):
+        with transaction.atomic():
+            ids.extend(_insert(User, [
+                {'username': f'{prefix}_{i}', 'email': f'{prefix}_{i}@example.com', 'password': password}
+                for i in range(start, start + size)
+            ], now))
+    _reset_sequences(User)
+    return ids
+
+
+def _menu_spans(menu_ids):
+    """(メニューID, 時間帯) → 占有する時間帯の数（当日中に終わらない組み合わせも1つの時間帯として作る）"""
+    return {
+        (menu.pk, code): menu_span(menu, code) or 1
+        for menu in ServiceMenu.objects.filter(pk__in=menu_ids)
+        for code in TIME_CODES
+    }
+
+
+def _reservation_row(rng, user_id, menu_ids, spans, dates, today_offset):
+    offset = rng.randint(-today_offset, today_offset)
+    if offset < 0:
+        status = rng.choices(['completed', 'cancelled'], weights=[85, 15])[0]
+    elif offset == 0:
+        status = rng.choice(['confirmed', 'in_progress'])
+    else:
+        status = rng.choices(['confirmed', 'cancelled'], weights=[85, 15])[0]
+    menu_id = rng.choice(menu_ids)
+    time_slot = rng.choice(TIME_CODES)
+    return {
+        'user_id': user_id,
+        'name': f'利用者{user_id}',
+        'date': dates[offset],
+        'time_slot': time_slot,
+        'slot_span': spans[menu_id, time_slot],
+        'status': status,
+        'service_menu_id': menu_id,
+        'visit_reason': rng.choice(['pickup', 'repair', 'consultation']),
+    }
+
+
+def _work_history_row(rng, reservation_id, status):
+    estimated = rng.randrange(3000, 30000, 500)
+    return {
+        'reservation_id': reservation_id,
+        'status': 'completed' if status == 'completed' else 'in_progress',
+        'estimated_amount': estimated,
+        # 完了した作業だけ確定金額を入れる（見積からのずれを散らす）
+        'actual_amount': estimated + rng.randrange(-2000, 5001, 500) if status == 'completed' else None,
+    }
+
+
+def create_reservations(
+    count,
+    user_ids,
+    bike_info_ratio=0.7,
+    images_per_bike=1,
+    work_history_ratio=0.5,
+    days=730,
+    batch_size=5000,
+    seed=None,
+):
+    """予約と自転車情報・画像・作業履歴を batch_size 件ずつまとめて作成
+
+    予約日は今日を中心に days 日の範囲に散らす。枠の受付可能数は考慮しないため、
+    作成後に占有状況を数え直し、範囲内の日を売上集計の対象にする。作成した件数を種類ごとに返す。
+    """
+    rng = random.Random(seed)
+    menu_ids = _menu_ids()
+    spans = _menu_spans(menu_ids)
+    image_name = _sample_image() if images_per_bike else None
+    today = date.today()
+    now = timezone.now()
+    half = days // 2
+    dates = {
+        offset: connection.ops.adapt_datefield_value(today + timedelta(days=offset))
+        for offset in range(-half, half + 1)
+    }
+    processed_at = connection.ops.adapt_datetimefield_value(now)
+    counts = {'reservations': 0, 'bike_info': 0, 'bike_images': 0, 'work_history': 0}
+
+    for _, size in _batches(count, batch_size):
+        with transaction.atomic():
+            rows = [_reservation_row(rng, rng.choice(user_ids), menu_ids, spans, dates, half) for _ in range(size)]
+            reservation_ids = _insert(Reservation, rows, now)
+
+            bike_info_ids = _insert(BikeInfo, [
+                {
+                    'reservation_id': pk,
+                    'manufacturer': rng.choice(MANUFACTURERS),
+                    'model_name': rng.choice(MODEL_NAMES),
+                    'details': rng.choice(DETAILS),
+                }
+                for pk in reservation_ids if rng.random() < bike_info_ratio
+            ], now)
+            # 同じ画像を参照し、画像処理の対象にはしない
+            image_ids = _insert(BikeImage, [
+                {'bike_info_id': pk, 'image': image_name, 'width': 64, 'height': 48, 'processed_at': processed_at}
+                for pk in bike_info_ids for _ in range(images_per_bike)
+            ], now)
+            history_ids = _insert(WorkHistory, [
+                _work_history_row(rng, pk, row['status'])
+                for pk, row in zip(reservation_ids, rows)
+                if row['status'] in ('completed', 'in_progress') and rng.random() < work_history_ratio
+            ], now)
+        counts['reservations'] += len(reservation_ids)
+        counts['bike_info'] += len(bike_info_ids)
+        counts['bike_images'] += len(image_ids)
+        counts['work_history'] += len(history_ids)
+
+    _reset_sequences(Reservation, BikeInfo, BikeImage, WorkHistory)
+    rebuild_occupancy(batch_size=batch_size)
+    # 生の INSERT では signal が送られないため、売上集計の対象日はまとめて登録する
+    mark_days_dirty(today + timedelta(days=offset) for offset in dates)
+    bump_version_on_commit('reservations')
+    return counts
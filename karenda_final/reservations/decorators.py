@@ -0,0 +1,25 @@
+from functools import wraps
+
+from django.contrib.auth.views import redirect_to_login
+
+
+def async_user_passes_test(test_func):
+    """非同期ビュー用の user_passes_test（Django 5.0 の login_required などは非同期ビューに対応していない）
+
+    request.auser() で取得した利用者を request.user にも設定し、テンプレートの {{ user }} などで
+    同期の DB アクセスが起きないようにする。
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            request.user = user
+            if test_func(user):
+                return await view(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path())
+        return wrapper
+    return decorator
+
+
+def async_login_required(view):
+    return async_user_passes_test(lambda user: user.is_authenticated)(view)
@@ -1,18 +1,13 @@
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from datetime import datetime
 
 
-def send_reservation_confirmation_email(reservation):
-    """予約完了メールを送信"""
+def build_confirmation_message(reservation):
+    """予約完了メールを作成（送信先がなければ None）"""
     if not reservation.user or not reservation.user.email:
-        return False
-    
-    context = {
-        'reservation': reservation,
-        'site_name': 'renv',
-    }
+        return None
     
     subject = f'【renv】予約完了のお知らせ - {reservation.date.strftime("%Y年%m月%d日")}'
     
@@ -25,7 +20,7 @@ def send_reservation_confirmation_email(reservation):
 【ご予約内容】
 予約番号: #{reservation.id}
 来店日: {reservation.date.strftime("%Y年%m月%d日")}
-時間帯: {reservation.get_time_slot_display()}
+時間帯: {reservation.time_slot_label}
 メニュー: {reservation.service_menu.name if reservation.service_menu else "未選択"}
 
 ご不明な点がございましたら、お気軽にお問い合わせください。
@@ -33,29 +28,49 @@ def send_reservation_confirmation_email(reservation):
 renv
 """
     
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [reservation.user.email],
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        print(f"メール送信エラー: {e}")
-        return False
-
-
-def send_reminder_email(reservation):
-    """予約前日のリマインダーメールを送信"""
+    return EmailMessage(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [reservation.user.email],
+    )
+
+
+def build_waitlist_promotion_message(reservation):
+    """キャンセル待ちから予約に繰り上げたお知らせメールを作成（送信先がなければ None）"""
     if not reservation.user or not reservation.user.email:
-        return False
-    
-    context = {
-        'reservation': reservation,
-        'site_name': 'renv',
-    }
+        return None
+
+    subject = f'【renv】キャンセル待ちのご予約が確定しました - {reservation.date.strftime("%Y年%m月%d日")}'
+
+    message = f"""
+{reservation.name} 様
+
+キャンセル待ちにご登録いただいていた日時に空きが出たため、ご予約を確定いたしました。
+
+【ご予約内容】
+予約番号: #{reservation.id}
+来店日: {reservation.date.strftime("%Y年%m月%d日")}
+時間帯: {reservation.time_slot_label}
+メニュー: {reservation.service_menu.name if reservation.service_menu else "未選択"}
+
+ご都合が合わない場合は、マイページからキャンセルのお手続きをお願いいたします。
+
+renv
+"""
+
+    return EmailMessage(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [reservation.user.email],
+    )
+
+
+def build_reminder_message(reservation):
+    """予約前日のリマインダーメールを作成（送信先がなければ None）"""
+    if not reservation.user or not reservation.user.email:
+        return None
     
     subject = f'【renv】ご予約のリマインダー - {reservation.date.strftime("%Y年%m月%d日")}'
     
@@ -77,26 +92,20 @@ def send_reminder_email(reservation):
 renv
 """
     
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [reservation.user.email],
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        print(f"メール送信エラー: {e}")
-        return False
-
-
-def send_work_completion_email(work_history):
-    """作業完了メールを送信"""
+    return EmailMessage(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [reservation.user.email],
+    )
+
+
+def build_completion_message(work_history):
+    """作業完了メールを作成（送信先がなければ None）"""
     reservation = work_history.reservation
     
     if not reservation.user or not reservation.user.email:
-        return False
+        return None
     
     subject = f'【renv】作業完了のお知らせ - {reservation.date.strftime("%Y年%m月%d日")}'
     
@@ -119,15 +128,75 @@ def send_work_completion_email(work_history):
 renv
 """
     
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [reservation.user.email],
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        print(f"メール送信エラー: {e}")
-        return False
+    return EmailMessage(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [reservation.user.email],
+    )
+
+
+class MailDispatcher:
+    """SMTP接続を使い回してメールをまとめて送信する
+
+    concurrency 本の接続を開いたままにし、渡されたメールを接続ごとに振り分けて
+    並行に送信する。with 文で使用する（open() で先に接続してから with 文に渡してもよい）。
+    """
+
+    def __init__(self, concurrency=1):
+        self.concurrency = max(1, concurrency)
+        self.connections = []
+        self.executor = None
+
+    def open(self):
+        """接続を開く（1本でも開けなければ開いた分を閉じて例外を送出する）"""
+        self.connections = [get_connection(fail_silently=False) for _ in range(self.concurrency)]
+        try:
+            for connection in self.connections:
+                connection.open()
+        except Exception:
+            self.close()
+            raise
+        if self.concurrency > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for connection in self.connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        self.connections = []
+
+    def __enter__(self):
+        if not self.connections:
+            self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _send_on(self, connection, emails):
+        results = []
+        for email in emails:
+            try:
+                connection.send_messages([email])
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def send(self, emails):
+        """メールを送信し、各メールのエラー（成功時は None）をリストで返す"""
+        emails = list(emails)
+        if self.executor is None:
+            return self._send_on(self.connections[0], emails)
+
+        parts = [emails[i::self.concurrency] for i in range(self.concurrency)]
+        results = [None] * len(emails)
+        for i, part_results in enumerate(self.executor.map(self._send_on, self.connections, parts)):
+            results[i::self.concurrency] = part_results
+        return results
@@ -1,7 +1,23 @@
 from django import forms
-from .models import Reservation, BikeInfo, BikeImage, ServiceMenu
+from .config_cache import service_menus
+from .models import Reservation, BikeInfo, BikeImage, ServiceMenu, WaitlistEntry
+from .occupancy import is_slot_available, menu_span
+from .suggestions import next_available_slots
 from django.core.exceptions import ValidationError
 from datetime import date
+import uuid
+
+
+class ServiceMenuChoiceField(forms.ModelChoiceField):
+    """メニューの入力チェックに設定キャッシュを使う（DB を参照しない）"""
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        for menu in service_menus():
+            if str(menu.pk) == str(value):
+                return menu
+        raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
 
 
 class ReservationForm(forms.ModelForm):
@@ -19,9 +35,18 @@ class ReservationForm(forms.ModelForm):
         label='来店理由'
     )
 
+    # 表示ごとの冪等キー（二重送信・再送信で同じ予約を重ねて作らない）
+    submission_key = forms.CharField(
+        max_length=64,
+        required=False,
+        widget=forms.HiddenInput,
+        initial=lambda: uuid.uuid4().hex,
+    )
+
     class Meta:
         model = Reservation
         fields = ['name', 'date', 'time_slot', 'service_menu', 'visit_reason', 'note']
+        field_classes = {'service_menu': ServiceMenuChoiceField}
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -41,6 +66,16 @@ class ReservationForm(forms.ModelForm):
             }),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 選択した日時で予約できなかった場合の、近い空き日時の候補
+        self.suggestions = []
+        # 満席で予約できなかった場合は、その日時のキャンセル待ちに登録できる
+        self.slot_full = False
+        # 選択肢は設定キャッシュから作成（フォームを表示するたびにメニューを取得しない）
+        field = self.fields['service_menu']
+        field.choices = [('', field.empty_label)] + [(menu.pk, str(menu)) for menu in service_menus()]
+
     def clean_date(self):
         date_value = self.cleaned_data.get('date')
         if date_value and date_value < date.today():
@@ -58,13 +93,56 @@ class ReservationForm(forms.ModelForm):
             raise ValidationError('来店理由で「その他」を選択した場合は、備考欄への入力が必須です。')
 
         if date_value and time_slot:
-            if Reservation.objects.filter(
-                date=date_value,
-                time_slot=time_slot,
-                status='confirmed'
-            ).exists():
+            menu = cleaned_data.get('service_menu')
+            span = menu_span(menu, time_slot)
+            if span is None:
+                self.suggest(menu, date_value)
+                raise ValidationError(
+                    f'「{menu.name}」（作業時間 約{menu.estimated_duration}分）は、'
+                    'この時間帯からでは営業時間内に作業が終わらないため予約できません。'
+                )
+            if not is_slot_available(date_value, time_slot, span, exclude=self.instance):
+                self.slot_full = True
+                self.suggest(menu, date_value)
                 raise ValidationError('その日付・時間帯はすでに予約されています。')
+            # 変更前の時間帯は上の確認で使うため、確認後に設定する
+            self.instance.slot_span = span
+
+        return cleaned_data
+
+    def suggest(self, menu, date_value):
+        """date_value 以降で menu を予約できる日時を候補として保持"""
+        self.suggestions = next_available_slots(menu, date_value)
+
+
+class WaitlistForm(forms.ModelForm):
+    """予約画面で満席だった日付・時間帯のキャンセル待ち登録"""
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['name', 'date', 'time_slot', 'service_menu']
+        field_classes = {'service_menu': ServiceMenuChoiceField}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['service_menu'].choices = [('', '')] + [(menu.pk, str(menu)) for menu in service_menus()]
 
+    def clean_date(self):
+        date_value = self.cleaned_data.get('date')
+        if date_value and date_value < date.today():
+            raise ValidationError('過去の日付は選択できません。')
+        return date_value
+
+    def clean(self):
+        cleaned_data = super().clean()
+        menu = cleaned_data.get('service_menu')
+        time_slot = cleaned_data.get('time_slot')
+        # 作業が終わらない時間帯は空きが出ても繰り上げられないため、登録させない
+        if time_slot and menu_span(menu, time_slot) is None:
+            raise ValidationError(
+                f'「{menu.name}」（作業時間 約{menu.estimated_duration}分）は、'
+                'この時間帯からでは営業時間内に作業が終わらないため登録できません。'
+            )
         return cleaned_data
 
 
@@ -104,6 +182,14 @@ class BikeImageForm(forms.ModelForm):
         }
 
 
+class ReservationStatusForm(forms.ModelForm):
+    """管理画面の予約ステータス更新"""
+
+    class Meta:
+        model = Reservation
+        fields = ['status']
+
+
 class ServiceMenuForm(forms.ModelForm):
     class Meta:
         model = ServiceMenu
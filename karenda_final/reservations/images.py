@@ -0,0 +1,159 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import BikeImage, WorkHistory
+
+
+logger = logging.getLogger(__name__)
+
+# 一覧表示用のサムネイル（JPEG）と拡大表示用の画像（WebP）の最大サイズ
+THUMBNAIL_SIZE = (400, 400)
+WEBP_MAX_SIZE = (1600, 1600)
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# 元画像をそのままの形式で保存し直す形式（それ以外は JPEG に変換）
+KEEP_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def _load(field_file):
+    """画像を読み込み、EXIF の向き情報を反映した状態で返す"""
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image_format = image.format
+        image.load()
+    finally:
+        field_file.close()
+    return ImageOps.exif_transpose(image), image_format
+
+
+def _to_rgb(image):
+    """JPEG で保存できるよう RGB に変換（透過部分は白で塗る）"""
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def _resized(image, size):
+    resized = image.copy()
+    resized.thumbnail(size, Image.LANCZOS)
+    return resized
+
+
+def _base_name(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def render_derivatives(field_file):
+    """元画像から EXIF を除いた画像・サムネイル・WebP 画像を作成
+
+    EXIF（撮影位置などを含む）は書き出さない。向きは画素に反映してから除くため、
+    表示上の向きは変わらない。
+    """
+    image, image_format = _load(field_file)
+    base = _base_name(field_file.name)
+
+    if image_format in KEEP_FORMATS:
+        ext = KEEP_FORMATS[image_format]
+        original = image if image_format != 'JPEG' else _to_rgb(image)
+        options = {'quality': JPEG_QUALITY} if image_format == 'JPEG' else {}
+    else:
+        image_format, ext = 'JPEG', 'jpg'
+        original = _to_rgb(image)
+        options = {'quality': JPEG_QUALITY}
+
+    thumbnail = _to_rgb(_resized(image, THUMBNAIL_SIZE))
+    webp = _resized(image, WEBP_MAX_SIZE)
+    return {
+        'original': (f'{base}.{ext}', _encode(original, image_format, **options)),
+        'size': image.size,
+        'thumbnail': (f'{base}_thumb.jpg', _encode(thumbnail, 'JPEG', quality=JPEG_QUALITY, optimize=True)),
+        'thumbnail_size': thumbnail.size,
+        'webp': (f'{base}.webp', _encode(webp, 'WEBP', quality=WEBP_QUALITY)),
+    }
+
+
+def _replace_original(field_file, name, content):
+    """元画像を EXIF を除いた画像で置き換える"""
+    old_name = field_file.name
+    field_file.save(name, content, save=False)
+    if old_name != field_file.name:
+        field_file.storage.delete(old_name)
+
+
+def process_bike_image(bike_image):
+    """自転車画像1件の EXIF 除去・サムネイル・WebP 作成"""
+    derivatives = render_derivatives(bike_image.image)
+    _replace_original(bike_image.image, *derivatives['original'])
+    bike_image.width, bike_image.height = derivatives['size']
+    bike_image.thumbnail.save(*derivatives['thumbnail'], save=False)
+    bike_image.thumbnail_width, bike_image.thumbnail_height = derivatives['thumbnail_size']
+    bike_image.webp.save(*derivatives['webp'], save=False)
+
+
+def process_completion_photo(work_history):
+    """完了写真の EXIF 除去・サムネイル・WebP 作成"""
+    derivatives = render_derivatives(work_history.completion_photo)
+    _replace_original(work_history.completion_photo, *derivatives['original'])
+    work_history.completion_photo_width, work_history.completion_photo_height = derivatives['size']
+    work_history.completion_thumbnail.save(*derivatives['thumbnail'], save=False)
+    work_history.completion_thumbnail_width, work_history.completion_thumbnail_height = derivatives['thumbnail_size']
+    work_history.completion_webp.save(*derivatives['webp'], save=False)
+
+
+def _process_pending(queryset, process, processed_field, update_fields, batch_size):
+    processed = failed = 0
+    for obj in queryset.order_by('pk')[:batch_size]:
+        try:
+            process(obj)
+        except Exception:
+            # 壊れた画像・Pillow が扱えない画像（ValueError・SyntaxError なども出る）は元画像のまま表示し、
+            # 再処理しない。処理済みにしないと毎回先頭で失敗して後の画像が処理されなくなる
+            logger.warning('Failed to process image for %s #%s', obj._meta.model_name, obj.pk, exc_info=True)
+            failed += 1
+        else:
+            processed += 1
+        setattr(obj, processed_field, timezone.now())
+        obj.save(update_fields=update_fields + [processed_field])
+    return processed, failed
+
+
+def process_pending_images(batch_size=50):
+    """未処理の自転車画像・完了写真を batch_size 件ずつ処理し、(処理数, 失敗数) を返す"""
+    bike_processed, bike_failed = _process_pending(
+        BikeImage.objects.filter(processed_at__isnull=True).exclude(image=''),
+        process_bike_image,
+        'processed_at',
+        ['image', 'width', 'height', 'thumbnail', 'thumbnail_width', 'thumbnail_height', 'webp'],
+        batch_size,
+    )
+    photo_processed, photo_failed = _process_pending(
+        WorkHistory.objects.filter(completion_photo_processed_at__isnull=True)
+        .exclude(completion_photo='').exclude(completion_photo__isnull=True),
+        process_completion_photo,
+        'completion_photo_processed_at',
+        [
+            'completion_photo', 'completion_photo_width', 'completion_photo_height',
+            'completion_thumbnail', 'completion_thumbnail_width', 'completion_thumbnail_height',
+            'completion_webp',
+        ],
+        batch_size,
+    )
+    return bike_processed + photo_processed, bike_failed + photo_failed
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+from statistics import median, quantiles
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from reservations.datagen import create_reservations, create_users, use_database
+from reservations.models import Reservation
+
+
+class Command(BaseCommand):
+    help = (
+        '非同期化した読み込み系のURL（空き状況API・マイページ・予約詳細・管理画面ホーム）に同時にリクエストを送り、'
+        'WSGI（スレッド）と ASGI（イベントループ）の処理時間を比較します'
+        '（一時ファイルのデータベースを使うため、既存のデータは変更されません）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=20000, help='作成する予約件数')
+        parser.add_argument('--users', type=int, default=200, help='作成する利用者数')
+        parser.add_argument('--requests', type=int, default=200, help='1URLあたりのリクエスト回数')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI で同時に処理するスレッド数')
+        parser.add_argument('--concurrency', type=int, default=32, help='ASGI で同時に送るリクエスト数')
+        parser.add_argument('--modes', default='wsgi,asgi', help='計測する方式（wsgi, asgi をカンマ区切り）')
+        parser.add_argument('-o', '--output', help='JSON形式のレポートの出力先')
+
+    def handle(self, *args, **options):
+        original = deepcopy(connections.settings['default'])
+        workdir = Path(tempfile.mkdtemp())
+        modes = [mode.strip() for mode in options['modes'].split(',')]
+        report = {
+            'reservations': options['reservations'],
+            'requests': options['requests'],
+            'threads': options['threads'],
+            'concurrency': options['concurrency'],
+            'runs': [],
+        }
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False, QUERY_COUNT_ENABLED=False):
+                use_database(str(workdir / 'benchmark.sqlite3'), original)
+                targets = self._setup(options)
+                for mode in modes:
+                    cache.clear()
+                    for name, (path, cookie) in targets.items():
+                        run = getattr(self, f'_run_{mode}')(path, cookie, options)
+                        run.update(mode=mode, url=name)
+                        report['runs'].append(run)
+                        self._print_run(run)
+        finally:
+            use_database(original['NAME'], original)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"レポートを {options['output']} に出力しました"))
+
+    def _setup(self, options):
+        """一時データベースにデータを作成し、URL 名 → (パス, セッションの Cookie) を返す"""
+        call_command('migrate', verbosity=0, interactive=False)
+        customer = User.objects.create_user('benchmark_customer', password='unused')
+        staff = User.objects.create_user('benchmark_staff', password='unused', is_staff=True)
+        user_ids = create_users(options['users']) + [customer.pk]
+        create_reservations(options['reservations'], user_ids, seed=1)
+        own = Reservation.objects.filter(user=customer).order_by('-date').first()
+
+        cookies = {}
+        for user in (customer, staff):
+            client = Client()
+            client.force_login(user)
+            cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+            cookies[user.pk] = f'{cookie.key}={cookie.value}'
+        connections.close_all()
+
+        today = date.today()
+        targets = {
+            'availability': (f"{reverse('availability')}?month={today:%Y-%m}", cookies[customer.pk]),
+            'dashboard': (reverse('dashboard'), cookies[customer.pk]),
+            'dashboard:home': (reverse('dashboard:home'), cookies[staff.pk]),
+        }
+        if own is not None:
+            targets['reservation_detail'] = (reverse('reservation_detail', args=[own.pk]), cookies[customer.pk])
+        return targets
+
+    def _run_wsgi(self, path, cookie, options):
+        handler = WSGIHandler()
+        parts = urlsplit(path)
+
+        def request():
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'SCRIPT_NAME': '',
+                'PATH_INFO': parts.path,
+                'QUERY_STRING': parts.query,
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': 'testserver',
+                'HTTP_COOKIE': cookie,
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': BytesIO(),
+                'wsgi.url_scheme': 'http',
+            }
+            statuses = []
+            begin = time.perf_counter()
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return int(statuses[0].split()[0]), (time.perf_counter() - begin) * 1000
+
+        def worker(count):
+            try:
+                return [request() for _ in range(count)]
+            finally:
+                connections.close_all()
+
+        threads = options['threads']
+        shares = [options['requests'] // threads + (i < options['requests'] % threads) for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = [result for share in executor.map(worker, shares) for result in share]
+        return self._summary(results, time.perf_counter() - started)
+
+    def _run_asgi(self, path, cookie, options):
+        handler = ASGIHandler()
+        parts = urlsplit(path)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': parts.path,
+            'raw_path': parts.path.encode(),
+            'query_string': parts.query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+
+        async def request(semaphore):
+            async with semaphore:
+                done = asyncio.Event()
+                messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+                statuses = []
+
+                async def receive():
+                    if messages:
+                        return messages.pop()
+                    # 応答し終わるまで切断しない
+                    await done.wait()
+                    return {'type': 'http.disconnect'}
+
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        statuses.append(message['status'])
+                    elif not message.get('more_body'):
+                        done.set()
+
+                begin = time.perf_counter()
+                await handler(dict(scope), receive, send)
+                return statuses[0], (time.perf_counter() - begin) * 1000
+
+        async def run():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            return await asyncio.gather(*(request(semaphore) for _ in range(options['requests'])))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        return self._summary(results, elapsed)
+
+    def _summary(self, results, elapsed):
+        timings = [ms for _, ms in results]
+        errors = sum(1 for status, _ in results if status != 200)
+        return {
+            'requests': len(results),
+            'errors': errors,
+            'elapsed_s': round(elapsed, 3),
+            'requests_per_s': round(len(results) / elapsed, 1),
+            'median_ms': round(median(timings), 3),
+            'p95_ms': round(quantiles(timings, n=100)[94], 3) if len(timings) > 1 else round(timings[0], 3),
+            'max_ms': round(max(timings), 3),
+        }
+
+    def _print_run(self, run):
+        line = (
+            f"{run['mode']:<5} {run['url']:<20} {run['requests_per_s']:>8.1f} 件/秒 / "
+            f"中央値 {run['median_ms']:.2f} ms / p95 {run['p95_ms']:.2f} ms / 最大 {run['max_ms']:.2f} ms"
+        )
+        if run['errors']:
+            line += f" / 200 以外 {run['errors']} 件"
+        self.stdout.write(line)
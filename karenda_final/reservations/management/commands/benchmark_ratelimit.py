@@ -0,0 +1,76 @@
+import json
+import time
+from statistics import median
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from reservations.ratelimit import rate_limit
+
+
+# 計測中に制限に達しないよう十分大きくした回数
+UNLIMITED = (10 ** 9, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        '送信回数の制限（reservations.ratelimit）を付けたビューと付けていないビューの処理時間を比べ、'
+        '1リクエストあたりの追加時間をマイクロ秒単位で計測します'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='1回の計測でのリクエスト回数')
+        parser.add_argument('--rounds', type=int, default=5, help='計測の回数（中央値を報告する）')
+        parser.add_argument('--clients', type=int, default=100, help='リクエストを送る接続元 IP アドレスの数')
+        parser.add_argument('-o', '--output', help='JSON形式のレポートの出力先')
+
+    def handle(self, *args, **options):
+        def view(request):
+            return HttpResponse()
+
+        limited = rate_limit('reserve')(view)
+        factory = RequestFactory()
+        requests = []
+        for i in range(options['clients']):
+            request = factory.post('/', REMOTE_ADDR=f'10.0.{i // 256}.{i % 256}')
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        with override_settings(RATE_LIMITS={'reserve': UNLIMITED}):
+            plain = self._measure(view, requests, options)
+            wrapped = self._measure(limited, requests, options)
+        for request in requests:
+            cache.delete(f"ratelimit:reserve:ip:{request.META['REMOTE_ADDR']}")
+
+        report = {
+            'requests': options['requests'],
+            'rounds': options['rounds'],
+            'clients': options['clients'],
+            'plain_us': round(plain, 3),
+            'rate_limited_us': round(wrapped, 3),
+            'overhead_us': round(wrapped - plain, 3),
+        }
+        self.stdout.write(
+            f"制限なし {report['plain_us']:.2f} µs / 制限あり {report['rate_limited_us']:.2f} µs / "
+            f"追加 {report['overhead_us']:.2f} µs（1リクエストあたりの中央値）"
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"レポートを {options['output']} に出力しました"))
+
+    def _measure(self, view, requests, options):
+        """1リクエストあたりの処理時間（マイクロ秒）の中央値"""
+        count = options['requests']
+        clients = len(requests)
+        view(requests[0])  # ウォームアップ
+        rounds = []
+        for _ in range(options['rounds']):
+            started = time.perf_counter()
+            for i in range(count):
+                view(requests[i % clients])
+            rounds.append((time.perf_counter() - started) / count * 1_000_000)
+        return median(rounds)
@@ -0,0 +1,91 @@
+import time
+from datetime import timedelta
+from statistics import median
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from reservations.models import Reservation
+from reservations.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = '将来の予約件数ごとに予約画面の表示時間を計測します（データはロールバックされます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='100,10000,100000,1000000',
+            help='計測する将来の予約件数（カンマ区切り）',
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='1サイズあたりのリクエスト回数')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--legacy',
+            action='store_true',
+            help='従来の全件走査（将来の予約を全て読み込む処理）の時間も計測する',
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options['sizes'].split(','))
+
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            user = get_user_model().objects.create_user('benchmark_reserve_user')
+            client = Client()
+            client.force_login(user)
+            url = reverse('reserve')
+
+            created = 0
+            for size in sizes:
+                created = self._fill(user, created, size, options['batch_size'])
+                rebuild_occupancy()
+
+                client.get(url)  # ウォームアップ
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 200, response.status_code
+
+                row = {'size': size, 'median_ms': median(timings), 'max_ms': max(timings)}
+                if options['legacy']:
+                    row['legacy_ms'] = self._legacy_scan()
+                self._report(row)
+
+            transaction.set_rollback(True)
+
+    def _fill(self, user, created, size, batch_size):
+        """将来の予約を size 件になるまで追加（1日2枠ずつ埋める）"""
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        slots = [code for code, _ in Reservation.TIME_CHOICES]
+        while created < size:
+            count = min(batch_size, size - created)
+            Reservation.objects.bulk_create([
+                Reservation(
+                    user=user,
+                    name='ベンチマーク',
+                    date=tomorrow + timedelta(days=i // len(slots)),
+                    time_slot=slots[i % len(slots)],
+                )
+                for i in range(created, created + count)
+            ])
+            created += count
+        return created
+
+    def _legacy_scan(self):
+        started = time.perf_counter()
+        booked = {}
+        for r in Reservation.objects.filter(status='confirmed', date__gte=timezone.now().date()):
+            booked.setdefault(str(r.date), []).append(r.time_slot)
+        return (time.perf_counter() - started) * 1000
+
+    def _report(self, row):
+        line = f"{row['size']:>10,} 件: 中央値 {row['median_ms']:.2f} ms / 最大 {row['max_ms']:.2f} ms"
+        if 'legacy_ms' in row:
+            line += f" （従来方式の走査: {row['legacy_ms']:.2f} ms）"
+        self.stdout.write(line)
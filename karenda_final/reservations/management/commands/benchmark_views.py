@@ -0,0 +1,197 @@
+import json
+import platform
+import time
+from datetime import date, timedelta
+from io import StringIO
+from statistics import median, quantiles
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from dashboard import urls as dashboard_urls
+from reservations import urls as reservation_urls
+from reservations.datagen import create_reservations, create_users
+from reservations.models import EmailOutbox, Holiday, Reservation, ServiceMenu
+
+
+# URL 名 → パスの pk に使うデータ
+PK_SOURCES = {
+    'reserve_done': 'own_reservation',
+    'reservation_detail': 'own_reservation',
+    'cancel_reservation': 'own_reservation',
+    'dashboard:reservation_detail': 'reservation',
+    'dashboard:work_history_edit': 'reservation',
+    'dashboard:service_menu_edit': 'menu',
+    'dashboard:holiday_edit': 'holiday',
+}
+
+# ログインせずに表示する URL
+ANONYMOUS = {'signup'}
+
+# POST でしか呼べないため計測しない URL
+POST_ONLY = {'join_waitlist', 'dashboard:reservation_bulk_action'}
+
+
+def _percentile(timings, percent):
+    if len(timings) < 2:
+        return timings[0]
+    return quantiles(timings, n=100, method='inclusive')[percent - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'データ件数ごとに reservations・dashboard の全URLと send_reminders の処理時間を計測し、'
+        'JSON形式のレポートを出力します（データはロールバックされます）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='計測する予約件数（カンマ区切り）')
+        parser.add_argument('--users', type=int, default=1000, help='作成する利用者数')
+        parser.add_argument('--repeat', type=int, default=10, help='1URLあたりのリクエスト回数')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('-o', '--output', default='benchmark_report.json', help='レポートの出力先')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options['sizes'].split(','))
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'repeat': options['repeat'],
+            'runs': [],
+        }
+
+        with override_settings(
+            ALLOWED_HOSTS=['*'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ), transaction.atomic():
+            fixtures, clients = self._setup()
+            user_ids = create_users(options['users'], batch_size=options['batch_size'])
+            created = 0
+            for size in sizes:
+                create_reservations(
+                    size - created,
+                    user_ids,
+                    batch_size=options['batch_size'],
+                    seed=options['seed'] + size,
+                )
+                created = size
+                cache.clear()
+
+                run = {'reservations': size, 'users': options['users'], 'results': []}
+                for target in self._targets(fixtures):
+                    run['results'].append(self._measure(clients[target['client']], target, options['repeat']))
+                run['results'].append(self._measure_reminders(min(options['repeat'], 3)))
+                report['runs'].append(run)
+                self._print_run(run)
+
+            transaction.set_rollback(True)
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"レポートを {options['output']} に出力しました"))
+
+    def _setup(self):
+        """計測に使う利用者・予約・メニュー・休日を用意"""
+        customer = User.objects.create_user('benchmark_views_customer', 'customer@example.com')
+        staff = User.objects.create_user('benchmark_views_staff', 'staff@example.com', is_staff=True)
+        menu = ServiceMenu.objects.create(
+            name='ベンチマーク用メニュー', estimated_duration=60, price_estimate=3000, price_display='3,000円～',
+        )
+        holiday = Holiday.objects.create(date=date.today() + timedelta(days=400), name='ベンチマーク休業')
+        day = date.today() + timedelta(days=30)
+        Reservation.objects.bulk_create([
+            Reservation(user=customer, name='ベンチマーク', date=day + timedelta(days=i), time_slot='AM')
+            for i in range(-20, 10)
+        ])
+        own = Reservation.objects.filter(user=customer, date__gt=date.today()).order_by('date').first()
+        fixtures = {'own_reservation': own.pk, 'reservation': own.pk, 'menu': menu.pk, 'holiday': holiday.pk}
+
+        clients = {'anonymous': Client(), 'customer': Client(), 'staff': Client()}
+        clients['customer'].force_login(customer)
+        clients['staff'].force_login(staff)
+        return fixtures, clients
+
+    def _targets(self, fixtures):
+        """urls.py に登録された全URLと、使うクライアント・パラメーター"""
+        month = date.today().strftime('%Y-%m')
+        for module, namespace in ((reservation_urls, ''), (dashboard_urls, 'dashboard:')):
+            for pattern in module.urlpatterns:
+                name = namespace + pattern.name
+                if name in POST_ONLY:
+                    continue
+                kwargs = {}
+                if pattern.pattern.converters:
+                    # 新しいURLを追加したときは PK_SOURCES にも追加すること
+                    kwargs = {key: fixtures[PK_SOURCES[name]] for key in pattern.pattern.converters}
+                if name in ANONYMOUS:
+                    client = 'anonymous'
+                elif namespace:
+                    client = 'staff'
+                else:
+                    client = 'customer'
+                params = {'availability': {'month': month}, 'dashboard_more': {'section': 'past'}}.get(name, {})
+                yield {'name': name, 'url': reverse(name, kwargs=kwargs), 'client': client, 'params': params}
+
+    def _request(self, client, target):
+        response = client.get(target['url'], target['params'])
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def _measure(self, client, target, repeat):
+        # リクエスト開始時にクエリの記録が消されるため、先に空にしておく
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = self._request(client, target)  # ウォームアップ
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            self._request(client, target)
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'name': target['name'],
+            'url': target['url'],
+            'status': response.status_code,
+            'queries': len(queries),
+            'median_ms': round(median(timings), 3),
+            'p95_ms': round(_percentile(timings, 95), 3),
+            'max_ms': round(max(timings), 3),
+        }
+
+    def _measure_reminders(self, repeat):
+        timings = []
+        for _ in range(repeat):
+            # 登録済みのリマインダーは送信されないため、毎回送信待ちを空にする
+            EmailOutbox.objects.all().delete()
+            started = time.perf_counter()
+            call_command('send_reminders', stdout=StringIO())
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'name': 'send_reminders',
+            'url': None,
+            'status': None,
+            'queries': None,
+            'median_ms': round(median(timings), 3),
+            'p95_ms': round(_percentile(timings, 95), 3),
+            'max_ms': round(max(timings), 3),
+        }
+
+    def _print_run(self, run):
+        self.stdout.write(f"予約 {run['reservations']:,} 件")
+        for result in run['results']:
+            queries = '' if result['queries'] is None else f" / クエリ {result['queries']} 回"
+            self.stdout.write(
+                f"  {result['name']:<32} 中央値 {result['median_ms']:>9.2f} ms / "
+                f"p95 {result['p95_ms']:>9.2f} ms{queries}"
+            )
@@ -0,0 +1,207 @@
+import json
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+from copy import deepcopy
+from datetime import date, time as clock, timedelta
+from pathlib import Path
+from statistics import median, quantiles
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from reservations.booking import SlotUnavailable, book_reservation
+from reservations.datagen import use_database
+from reservations.models import Reservation, SlotOccupancy, TimeSlot
+
+
+# 計測する接続設定（'tuned' は settings.DATABASES の設定をそのまま使う）
+STOCK_DATABASE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'OPTIONS': {},
+    'CONN_MAX_AGE': 0,
+    'CONN_HEALTH_CHECKS': False,
+}
+
+# 満席で失敗しないよう、時間帯ごとの受付可能数を十分に大きくする
+SLOT_CAPACITY = 100000
+
+
+def _finish_request():
+    # リクエスト終了時と同じく、CONN_MAX_AGE を過ぎた接続は閉じる
+    connections['default'].close_if_unusable_or_obsolete()
+
+
+def _worker(name, config, bookings, days, seed, barrier, results):
+    use_database(name, config)
+    rng = random.Random(seed)
+    start = date.today() + timedelta(days=1)
+    latencies = []
+    errors = {}
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(bookings):
+        reservation = Reservation(
+            name=f'書き込み{seed}-{i}',
+            date=start + timedelta(days=rng.randrange(days)),
+            time_slot=rng.choice(['AM', 'PM']),
+        )
+        begin = time.perf_counter()
+        try:
+            book_reservation(reservation)
+            latencies.append((time.perf_counter() - begin) * 1000)
+        except (OperationalError, SlotUnavailable) as e:
+            errors[str(e)] = errors.get(str(e), 0) + 1
+        _finish_request()
+    results.put({'started': started, 'finished': time.perf_counter(), 'latencies': latencies, 'errors': errors})
+    connections.close_all()
+
+
+def _reader(name, config, days, stop, barrier, results):
+    """書き込み中に空き状況（占有状況の一覧）を読み続ける"""
+    use_database(name, config)
+    start = date.today() + timedelta(days=1)
+    latencies = []
+    errors = {}
+    barrier.wait()
+    while not stop.is_set():
+        begin = time.perf_counter()
+        try:
+            list(SlotOccupancy.objects.filter(date__gte=start, date__lt=start + timedelta(days=days)))
+            latencies.append((time.perf_counter() - begin) * 1000)
+        except OperationalError as e:
+            errors[str(e)] = errors.get(str(e), 0) + 1
+        _finish_request()
+    results.put({'latencies': latencies, 'errors': errors})
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        '複数プロセスから同時に予約を作成し、SQLite の標準設定とプロジェクトの接続設定'
+        '（WAL・busy_timeout・BEGIN IMMEDIATE・持続的接続）で書き込みのスループットを比較します'
+        '（一時ファイルのデータベースを使うため、既存のデータは変更されません）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='同時に予約するプロセス数')
+        parser.add_argument('--bookings', type=int, default=200, help='1プロセスあたりの予約件数')
+        parser.add_argument('--readers', type=int, default=2, help='書き込み中に空き状況を読み続けるプロセス数')
+        parser.add_argument('--days', type=int, default=30, help='予約を散らす日数')
+        parser.add_argument('--modes', default='stock,tuned', help='計測する設定（stock, tuned をカンマ区切り）')
+        parser.add_argument('-o', '--output', help='JSON形式のレポートの出力先')
+
+    def handle(self, *args, **options):
+        original = deepcopy(connections.settings['default'])
+        configs = {
+            'stock': STOCK_DATABASE,
+            'tuned': {key: original[key] for key in STOCK_DATABASE},
+        }
+        modes = [mode.strip() for mode in options['modes'].split(',')]
+        workdir = Path(tempfile.mkdtemp())
+        report = {'processes': options['processes'], 'bookings': options['bookings'], 'runs': []}
+        try:
+            template = workdir / 'template.sqlite3'
+            self._create_template(template)
+            for mode in modes:
+                target = workdir / f'{mode}.sqlite3'
+                shutil.copyfile(template, target)
+                run = self._run(mode, str(target), configs[mode], options)
+                run.update(self._verify(str(target), configs[mode]))
+                report['runs'].append(run)
+                self._print_run(run)
+        finally:
+            use_database(original['NAME'], original)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"レポートを {options['output']} に出力しました"))
+
+    def _create_template(self, path):
+        """マイグレーション済みで、時間枠の受付可能数が十分なデータベースを作成"""
+        use_database(str(path), STOCK_DATABASE)
+        call_command('migrate', verbosity=0, interactive=False)
+        TimeSlot.objects.create(start_time=clock(10), end_time=clock(12), capacity=SLOT_CAPACITY)
+        TimeSlot.objects.create(start_time=clock(13), end_time=clock(17), capacity=SLOT_CAPACITY)
+        connections.close_all()
+
+    def _run(self, mode, name, config, options):
+        # fork する前に接続を閉じ、子プロセスで同じ接続を共有しないようにする
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(options['processes'] + options['readers'])
+        stop = context.Event()
+        results = context.Queue()
+        read_results = context.Queue()
+        workers = [
+            context.Process(
+                target=_worker,
+                args=(name, config, options['bookings'], options['days'], seed, barrier, results),
+            )
+            for seed in range(options['processes'])
+        ]
+        readers = [
+            context.Process(target=_reader, args=(name, config, options['days'], stop, barrier, read_results))
+            for _ in range(options['readers'])
+        ]
+        for process in workers + readers:
+            process.start()
+        outcomes = [results.get() for _ in workers]
+        stop.set()
+        reads = [read_results.get() for _ in readers]
+        for process in workers + readers:
+            process.join()
+
+        read_latencies = [ms for outcome in reads for ms in outcome['latencies']]
+        read_errors = sum(sum(outcome['errors'].values()) for outcome in reads)
+        latencies = [ms for outcome in outcomes for ms in outcome['latencies']]
+        errors = {}
+        for outcome in outcomes:
+            for message, count in outcome['errors'].items():
+                errors[message] = errors.get(message, 0) + count
+        elapsed = max(o['finished'] for o in outcomes) - min(o['started'] for o in outcomes)
+        return {
+            'mode': mode,
+            'engine': config['ENGINE'],
+            'booked': len(latencies),
+            'failed': sum(errors.values()),
+            'errors': errors,
+            'elapsed_s': round(elapsed, 3),
+            'bookings_per_s': round(len(latencies) / elapsed, 1),
+            'median_ms': round(median(latencies), 3) if latencies else None,
+            'p95_ms': round(quantiles(latencies, n=100)[94], 3) if len(latencies) > 1 else None,
+            'max_ms': round(max(latencies), 3) if latencies else None,
+            'reads': len(read_latencies),
+            'read_failed': read_errors,
+            'read_median_ms': round(median(read_latencies), 3) if read_latencies else None,
+            'read_max_ms': round(max(read_latencies), 3) if read_latencies else None,
+        }
+
+    def _verify(self, name, config):
+        """予約件数と占有状況の予約数が一致しているか確認"""
+        use_database(name, config)
+        reservations = Reservation.objects.count()
+        occupied = sum(SlotOccupancy.objects.values_list('booked_count', flat=True))
+        connections.close_all()
+        return {'reservations': reservations, 'consistent': reservations == occupied}
+
+    def _print_run(self, run):
+        self.stdout.write(
+            f"{run['mode']:<6} 成功 {run['booked']:>6} 件 / 失敗 {run['failed']:>5} 件 / "
+            f"{run['bookings_per_s']:>8.1f} 件/秒 / 中央値 {run['median_ms'] or 0:.2f} ms / "
+            f"p95 {run['p95_ms'] or 0:.2f} ms / 最大 {run['max_ms'] or 0:.2f} ms"
+        )
+        if run['reads'] or run['read_failed']:
+            self.stdout.write(
+                f"       読み込み {run['reads']:>6} 回 / 失敗 {run['read_failed']:>5} 回 / "
+                f"中央値 {run['read_median_ms'] or 0:.2f} ms / 最大 {run['read_max_ms'] or 0:.2f} ms"
+            )
+        for message, count in run['errors'].items():
+            self.stdout.write(f'    {count} 件: {message}')
+        if not run['consistent']:
+            self.stdout.write(self.style.ERROR('    予約件数と占有状況の予約数が一致しません'))
@@ -0,0 +1,47 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations.datagen import create_reservations, create_users
+
+
+class Command(BaseCommand):
+    help = '負荷試験用の利用者・予約・自転車情報・画像・作業履歴をまとめて作成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='作成する利用者数（0 なら既存の利用者を使う）')
+        parser.add_argument('--reservations', type=int, default=10000, help='作成する予約数')
+        parser.add_argument('--bike-info-ratio', type=float, default=0.7, help='自転車情報を付ける予約の割合')
+        parser.add_argument('--images-per-bike', type=int, default=1, help='自転車情報1件あたりの画像数')
+        parser.add_argument('--work-history-ratio', type=float, default=0.5, help='作業履歴を付ける来店済み予約の割合')
+        parser.add_argument('--days', type=int, default=730, help='予約日を散らす日数（今日を中心とする）')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None, help='乱数の種（同じ値なら同じ内容になる）')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        batch_size = max(1, options['batch_size'])
+
+        user_ids = create_users(options['users'], batch_size=batch_size)
+        if not user_ids:
+            user_ids = list(User.objects.filter(is_staff=False).values_list('pk', flat=True))
+        if not user_ids and options['reservations']:
+            raise CommandError('予約を割り当てる利用者がいません。--users を指定してください。')
+
+        counts = create_reservations(
+            options['reservations'],
+            user_ids,
+            bike_info_ratio=options['bike_info_ratio'],
+            images_per_bike=options['images_per_bike'],
+            work_history_ratio=options['work_history_ratio'],
+            days=options['days'],
+            batch_size=batch_size,
+            seed=options['seed'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"利用者 {options['users']:,} 人 / 予約 {counts['reservations']:,} 件 / "
+            f"自転車情報 {counts['bike_info']:,} 件 / 画像 {counts['bike_images']:,} 件 / "
+            f"作業履歴 {counts['work_history']:,} 件を作成しました（{elapsed:.1f} 秒）"
+        ))
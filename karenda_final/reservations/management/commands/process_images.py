@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from reservations.images import process_pending_images
+
+
+class Command(BaseCommand):
+    help = 'アップロード画像の EXIF 除去とサムネイル・WebP 作成を行います（--once を指定しない場合は常駐して処理を続けます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='1回に処理する画像の件数')
+        parser.add_argument('--interval', type=float, default=10.0, help='未処理の画像がないときの待機秒数')
+        parser.add_argument('--once', action='store_true', help='未処理の画像がなくなるまで処理して終了する')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, failed = process_pending_images(batch_size=options['batch_size'])
+            if processed or failed:
+                self.stdout.write(f'処理 {processed} 件 / 失敗 {failed} 件')
+                continue
+            if options['once']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
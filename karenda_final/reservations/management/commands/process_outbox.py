@@ -0,0 +1,47 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from reservations.outbox import DEFAULT_MAX_ATTEMPTS, process_outbox
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = '送信待ちメールを送信します（--once を指定しない場合は常駐して処理を続けます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='1回に取得するメールの件数')
+        parser.add_argument('--concurrency', type=int, default=1, help='同時に使用するSMTP接続の数')
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=DEFAULT_MAX_ATTEMPTS,
+            help='この回数失敗したメールは送信不可にする',
+        )
+        parser.add_argument('--interval', type=float, default=5.0, help='送信待ちがないときの待機秒数')
+        parser.add_argument('--once', action='store_true', help='送信待ちを1回処理して終了する')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, failed = process_outbox(
+                    batch_size=options['batch_size'],
+                    concurrency=options['concurrency'],
+                    max_attempts=options['max_attempts'],
+                )
+            except Exception:
+                if options['once']:
+                    raise
+                # 常駐中はデータベースの一時的なエラーなどで終了せず、待機してからやり直す
+                logger.exception('Failed to process the email outbox')
+                sent = failed = 0
+            if sent or failed:
+                self.stdout.write(f'送信 {sent} 件 / 失敗 {failed} 件')
+            if options['once']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
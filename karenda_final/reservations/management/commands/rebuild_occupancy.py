@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from reservations.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = '予約テーブルから予約枠の占有状況を作り直します'
+
+    def handle(self, *args, **options):
+        total = rebuild_occupancy()
+        self.stdout.write(
+            self.style.SUCCESS(f'{total} 件の予約枠占有状況を再作成しました。')
+        )
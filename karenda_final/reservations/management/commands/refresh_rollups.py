@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from reservations.rollups import rebuild_rollups, refresh_dirty_days
+
+
+class Command(BaseCommand):
+    help = '前回の実行以降に予約・作業履歴が変更された日だけ、売上レポート用の日別メニュー集計を作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='予約テーブル全体から集計を作り直す')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['full']:
+            rows = rebuild_rollups(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'{rows} 件の集計を再作成しました。'))
+            return
+
+        days, rows = refresh_dirty_days(batch_size=options['batch_size'])
+        if days:
+            self.stdout.write(self.style.SUCCESS(f'{days} 日分（{rows} 件）の集計を更新しました。'))
+        else:
+            self.stdout.write('更新が必要な日はありません。')
@@ -1,38 +1,84 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
+from itertools import islice
 from reservations.models import Reservation
-from reservations.email_utils import send_reminder_email
+from reservations.email_utils import build_reminder_message
+from reservations.outbox import process_outbox, queue_messages
 
 
 class Command(BaseCommand):
-    help = '予約前日のリマインダーメールを送信します'
+    help = '予約前日のリマインダーメールを送信待ちに登録し、送信します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='1回にまとめて作成・送信するメールの件数',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='同時に使用するSMTP接続の数',
+        )
+        parser.add_argument(
+            '--enqueue-only',
+            action='store_true',
+            help='送信待ちへの登録のみ行い、送信は process_outbox に任せる',
+        )
 
     def handle(self, *args, **options):
         # 明日の予約を取得
         tomorrow = timezone.now().date() + timedelta(days=1)
+        chunk_size = max(1, options['chunk_size'])
         
         reservations = Reservation.objects.filter(
             date=tomorrow,
             status='confirmed'
-        )
+        ).select_related('user', 'service_menu').order_by('pk')
+        rows = reservations.iterator(chunk_size=chunk_size)
         
-        count = 0
-        for reservation in reservations:
-            if send_reminder_email(reservation):
-                count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'✓ リマインダーメール送信: {reservation.name} ({reservation.date})'
-                    )
-                )
-            else:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'✗ リマインダーメール送信失敗: {reservation.name} ({reservation.date})'
+        queued = 0
+        skipped = 0
+        chunk_no = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            chunk_no += 1
+
+            items = []
+            for reservation in chunk:
+                email = build_reminder_message(reservation)
+                if email is None:
+                    skipped += 1
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f'✗ メールアドレスがないため送信できません: {reservation.name} ({reservation.date})'
+                        )
                     )
-                )
+                else:
+                    # 同じ日に2回実行しても二重に送らないよう予約ID・来店日をキーにする
+                    items.append((f'reminder:{reservation.pk}:{reservation.date}', email))
+            queued += queue_messages(items)
+
+            self.stdout.write(
+                f'[{chunk_no}] {len(chunk)} 件処理（累計 登録 {queued} 件 / 対象外 {skipped} 件）'
+            )
         
+        if options['enqueue_only']:
+            self.stdout.write(
+                self.style.SUCCESS(f'\n合計 {queued} 件のリマインダーメールを送信待ちに登録しました。')
+            )
+            return
+
+        sent, failed = process_outbox(batch_size=chunk_size, concurrency=options['concurrency'])
+        if failed:
+            self.stdout.write(
+                self.style.ERROR(f'✗ {failed} 件の送信に失敗しました（process_outbox で再送されます）')
+            )
         self.stdout.write(
-            self.style.SUCCESS(f'\n合計 {count} 件のリマインダーメールを送信しました。')
+            self.style.SUCCESS(f'\n合計 {sent} 件のメールを送信しました。')
         )
@@ -0,0 +1,71 @@
+import logging
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .querycount import DEFAULT_REPEAT_THRESHOLD, collect_queries
+
+
+logger = logging.getLogger('reservations.queries')
+
+
+class QueryCountMiddleware:
+    """リクエストごとのクエリ数・SQL 合計時間・繰り返しクエリをヘッダーとログに出力する
+
+    QUERY_COUNT_ENABLED（既定は DEBUG）が True のときだけ記録する。
+    ストリーミングレスポンスの本文を返す間に実行されたクエリは含まれない。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # ASGI では非同期のまま次のミドルウェア・ビューを呼ぶ（同期に変換するとスレッドを占有する）
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._enabled():
+            return self.get_response(request)
+
+        with collect_queries() as stats:
+            response = self.get_response(request)
+        return self._report(request, response, stats)
+
+    async def __acall__(self, request):
+        if not self._enabled():
+            return await self.get_response(request)
+
+        # DB 接続はスレッドごとなので、ORM が実際に動くスレッド（sync_to_async の実行先）で記録を始める
+        stack = ExitStack()
+        stats = await sync_to_async(stack.enter_context)(collect_queries())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._report(request, response, stats)
+
+    def _enabled(self):
+        return getattr(settings, 'QUERY_COUNT_ENABLED', settings.DEBUG)
+
+    def _report(self, request, response, stats):
+        threshold = getattr(settings, 'QUERY_COUNT_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+        repeated = stats.repeated(threshold)
+        duration_ms = stats.duration * 1000
+
+        response['X-Query-Count'] = str(stats.count)
+        response['X-Query-Time-Ms'] = f'{duration_ms:.1f}'
+        response['X-Query-Repeated'] = str(len(repeated))
+
+        logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            '%s %s queries=%d time=%.1fms repeated=%d',
+            request.method, request.path, stats.count, duration_ms, len(repeated),
+        )
+        for sql, n in repeated:
+            logger.warning('  repeated %d times: %s', n, sql)
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.1 on 2026-02-09 10:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_occupancy(apps, schema_editor):
+    """既存の予約から占有状況を作成"""
+    Reservation = apps.get_model('reservations', 'Reservation')
+    SlotOccupancy = apps.get_model('reservations', 'SlotOccupancy')
+    rows = (
+        Reservation.objects.exclude(status='cancelled')
+        .values('date', 'time_slot')
+        .annotate(booked=Count('id'))
+    )
+    SlotOccupancy.objects.bulk_create(
+        [
+            SlotOccupancy(date=row['date'], time_slot=row['time_slot'], booked_count=row['booked'])
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0005_workhistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='来店日')),
+                ('time_slot', models.CharField(choices=[('AM', '午前'), ('PM', '午後')], max_length=2, verbose_name='時間帯')),
+                ('booked_count', models.PositiveIntegerField(default=0, verbose_name='予約数')),
+                ('capacity', models.PositiveIntegerField(default=1, verbose_name='受付可能数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '予約枠占有状況',
+                'verbose_name_plural': '予約枠占有状況',
+                'ordering': ['date', 'time_slot'],
+                'unique_together': {('date', 'time_slot')},
+            },
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
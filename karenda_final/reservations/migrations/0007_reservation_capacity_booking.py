@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-02-12 09:41
+
+from datetime import time
+
+from django.db import migrations, models
+
+
+def apply_timeslot_capacity(apps, schema_editor):
+    """TimeSlot の同時対応可能数を占有状況の受付可能数に反映"""
+    TimeSlot = apps.get_model('reservations', 'TimeSlot')
+    SlotOccupancy = apps.get_model('reservations', 'SlotOccupancy')
+    capacities = {'AM': 0, 'PM': 0}
+    for slot in TimeSlot.objects.filter(is_active=True):
+        capacities['AM' if slot.start_time < time(12, 0) else 'PM'] += slot.capacity
+    for time_slot, capacity in capacities.items():
+        SlotOccupancy.objects.filter(time_slot=time_slot).update(capacity=capacity or 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0006_slotoccupancy'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='reservation',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date', 'time_slot'], name='reservation_date_slot_idx'),
+        ),
+        migrations.RunPython(apply_timeslot_capacity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-02-16 11:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0007_reservation_capacity_booking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=200, unique=True, verbose_name='冪等キー')),
+                ('from_email', models.CharField(max_length=254, verbose_name='送信元')),
+                ('to', models.CharField(max_length=254, verbose_name='宛先')),
+                ('subject', models.CharField(max_length=255, verbose_name='件名')),
+                ('body', models.TextField(verbose_name='本文')),
+                ('status', models.CharField(choices=[('pending', '送信待ち'), ('sending', '送信中'), ('sent', '送信済み'), ('dead', '送信不可')], default='pending', max_length=20, verbose_name='ステータス')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='送信試行回数')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='次回送信日時')),
+                ('claim_token', models.CharField(blank=True, max_length=32, verbose_name='処理中ワーカー')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='処理期限')),
+                ('last_error', models.TextField(blank=True, verbose_name='最終エラー')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='送信日時')),
+            ],
+            options={
+                'verbose_name': '送信待ちメール',
+                'verbose_name_plural': '送信待ちメール',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-02-19 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0008_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['-date', 'time_slot', 'id'], name='reservation_list_order_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.0.1 on 2026-02-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0009_reservation_list_order_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bikeimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='高さ'),
+        ),
+        migrations.AddField(
+            model_name='bikeimage',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='画像処理日時'),
+        ),
+        migrations.AddField(
+            model_name='bikeimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='bike_images/thumbnails/%Y/%m/%d/', verbose_name='サムネイル'),
+        ),
+        migrations.AddField(
+            model_name='bikeimage',
+            name='thumbnail_height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='サムネイルの高さ'),
+        ),
+        migrations.AddField(
+            model_name='bikeimage',
+            name='thumbnail_width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='サムネイルの幅'),
+        ),
+        migrations.AddField(
+            model_name='bikeimage',
+            name='webp',
+            field=models.ImageField(blank=True, upload_to='bike_images/webp/%Y/%m/%d/', verbose_name='WebP画像'),
+        ),
+        migrations.AddField(
+            model_name='bikeimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='幅'),
+        ),
+        migrations.AddField(
+            model_name='workhistory',
+            name='completion_photo_height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='完了写真の高さ'),
+        ),
+        migrations.AddField(
+            model_name='workhistory',
+            name='completion_photo_processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='完了写真の処理日時'),
+        ),
+        migrations.AddField(
+            model_name='workhistory',
+            name='completion_photo_width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='完了写真の幅'),
+        ),
+        migrations.AddField(
+            model_name='workhistory',
+            name='completion_thumbnail',
+            field=models.ImageField(blank=True, upload_to='completion_photos/thumbnails/%Y/%m/%d/', verbose_name='完了写真（サムネイル）'),
+        ),
+        migrations.AddField(
+            model_name='workhistory',
+            name='completion_thumbnail_height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='完了写真サムネイルの高さ'),
+        ),
+        migrations.AddField(
+            model_name='workhistory',
+            name='completion_thumbnail_width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='完了写真サムネイルの幅'),
+        ),
+        migrations.AddField(
+            model_name='workhistory',
+            name='completion_webp',
+            field=models.ImageField(blank=True, upload_to='completion_photos/webp/%Y/%m/%d/', verbose_name='完了写真（WebP）'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-02-20 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0010_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['user', 'date', 'time_slot'], name='reservation_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status', 'confirmed')), fields=['date', 'time_slot'], name='reservation_confirmed_idx'),
+        ),
+    ]
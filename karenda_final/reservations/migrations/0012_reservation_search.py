@@ -0,0 +1,92 @@
+# Generated by Django 5.0.1 on 2026-02-21 11:40
+
+from django.db import migrations
+
+
+# 予約名・備考・管理者メモ・自転車情報の全文検索用テーブル（SQLite FTS5、rowid = 予約ID）
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE reservation_search USING fts5(
+        name, note, admin_memo, manufacturer, model_name, details,
+        tokenize = 'trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER reservation_search_insert AFTER INSERT ON reservations_reservation BEGIN
+        INSERT INTO reservation_search (rowid, name, note, admin_memo, manufacturer, model_name, details)
+        VALUES (new.id, new.name, new.note, new.admin_memo, '', '', '');
+    END
+    """,
+    """
+    CREATE TRIGGER reservation_search_update AFTER UPDATE OF name, note, admin_memo ON reservations_reservation BEGIN
+        UPDATE reservation_search SET name = new.name, note = new.note, admin_memo = new.admin_memo
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER reservation_search_delete AFTER DELETE ON reservations_reservation BEGIN
+        DELETE FROM reservation_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER reservation_search_bike_insert AFTER INSERT ON reservations_bikeinfo BEGIN
+        UPDATE reservation_search
+        SET manufacturer = new.manufacturer, model_name = new.model_name, details = new.details
+        WHERE rowid = new.reservation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER reservation_search_bike_update
+    AFTER UPDATE OF manufacturer, model_name, details, reservation_id ON reservations_bikeinfo BEGIN
+        UPDATE reservation_search SET manufacturer = '', model_name = '', details = ''
+        WHERE rowid = old.reservation_id;
+        UPDATE reservation_search
+        SET manufacturer = new.manufacturer, model_name = new.model_name, details = new.details
+        WHERE rowid = new.reservation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER reservation_search_bike_delete AFTER DELETE ON reservations_bikeinfo BEGIN
+        UPDATE reservation_search SET manufacturer = '', model_name = '', details = ''
+        WHERE rowid = old.reservation_id;
+    END
+    """,
+    """
+    INSERT INTO reservation_search (rowid, name, note, admin_memo, manufacturer, model_name, details)
+    SELECT r.id, r.name, r.note, r.admin_memo,
+           COALESCE(b.manufacturer, ''), COALESCE(b.model_name, ''), COALESCE(b.details, '')
+    FROM reservations_reservation r
+    LEFT JOIN reservations_bikeinfo b ON b.reservation_id = r.id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS reservation_search_insert',
+    'DROP TRIGGER IF EXISTS reservation_search_update',
+    'DROP TRIGGER IF EXISTS reservation_search_delete',
+    'DROP TRIGGER IF EXISTS reservation_search_bike_insert',
+    'DROP TRIGGER IF EXISTS reservation_search_bike_update',
+    'DROP TRIGGER IF EXISTS reservation_search_bike_delete',
+    'DROP TABLE IF EXISTS reservation_search',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 は SQLite のみ（他のデータベースでは LIKE 検索になる）
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0011_reservation_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
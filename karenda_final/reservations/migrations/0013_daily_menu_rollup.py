@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-02-22 09:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_existing_days(apps, schema_editor):
+    """既存の予約がある日をすべて未集計として登録（次回の refresh_rollups で集計される）"""
+    Reservation = apps.get_model('reservations', 'Reservation')
+    RollupDirtyDay = apps.get_model('reservations', 'RollupDirtyDay')
+    dates = Reservation.objects.order_by().values_list('date', flat=True).distinct()
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(date=value) for value in dates.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0012_reservation_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='来店日')),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='登録日時')),
+            ],
+            options={
+                'verbose_name': '未集計の日',
+                'verbose_name_plural': '未集計の日',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyMenuRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='来店日')),
+                ('status', models.CharField(choices=[('confirmed', '予約確定'), ('cancelled', 'キャンセル済み'), ('in_progress', '作業中'), ('completed', '来店済み')], max_length=20, verbose_name='ステータス')),
+                ('reservation_count', models.PositiveIntegerField(default=0, verbose_name='予約数')),
+                ('estimated_total', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='見積金額合計')),
+                ('actual_total', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='確定金額合計')),
+                ('estimate_count', models.PositiveIntegerField(default=0, verbose_name='見積・確定金額がある件数')),
+                ('estimate_error_total', models.DecimalField(decimal_places=0, default=0, help_text='見積・確定金額がある作業の |確定金額 - 見積金額| の合計', max_digits=14, verbose_name='見積誤差合計')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('service_menu', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='reservations.servicemenu', verbose_name='修理・整備メニュー')),
+            ],
+            options={
+                'verbose_name': '日別メニュー集計',
+                'verbose_name_plural': '日別メニュー集計',
+                'ordering': ['date', 'service_menu', 'status'],
+                'indexes': [models.Index(fields=['date'], name='rollup_date_idx')],
+            },
+        ),
+        migrations.RunPython(mark_existing_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-02-23 10:12
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+search = import_module('reservations.migrations.0012_reservation_search')
+
+# SQLite では列の追加（削除も SQLite のバージョンによって）でテーブルが作り直され、
+# 予約テーブルの全文検索用トリガーが消えるため作り直す
+RESERVATION_TRIGGERS = [
+    sql.replace('CREATE TRIGGER', 'CREATE TRIGGER IF NOT EXISTS')
+    for sql in search.CREATE_SQL
+    if 'ON reservations_reservation' in sql
+]
+
+
+def recreate_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in RESERVATION_TRIGGERS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0013_daily_menu_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_search_triggers),
+        migrations.AddField(
+            model_name='reservation',
+            name='slot_span',
+            field=models.PositiveSmallIntegerField(default=1, help_text='メニューの想定作業時間が1つの時間帯に収まらない場合、続く時間帯も占有する', verbose_name='占有する時間帯の数'),
+        ),
+        migrations.RunPython(recreate_search_triggers, migrations.RunPython.noop),
+    ]
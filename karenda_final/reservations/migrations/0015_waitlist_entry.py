@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-02-23 15:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0014_reservation_slot_span'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='お名前')),
+                ('date', models.DateField(verbose_name='来店日')),
+                ('time_slot', models.CharField(choices=[('AM', '午前'), ('PM', '午後')], max_length=2, verbose_name='時間帯')),
+                ('status', models.CharField(choices=[('waiting', 'キャンセル待ち'), ('promoted', '予約に繰り上げ'), ('withdrawn', '取り下げ')], default='waiting', max_length=20, verbose_name='ステータス')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='登録日時')),
+                ('promoted_at', models.DateTimeField(blank=True, null=True, verbose_name='繰り上げ日時')),
+                ('reservation', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='reservations.reservation', verbose_name='繰り上げた予約')),
+                ('service_menu', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entries', to='reservations.servicemenu', verbose_name='修理・整備メニュー')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'キャンセル待ち',
+                'verbose_name_plural': 'キャンセル待ち',
+                'ordering': ['date', 'time_slot', 'created_at', 'id'],
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['date', 'time_slot', 'created_at', 'id'], name='waitlist_fifo_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='waitlistentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'waiting')), fields=('user', 'date', 'time_slot'), name='waitlist_unique_waiting'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-02-23 18:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0015_waitlist_entry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, verbose_name='冪等キー')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='送信日時')),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='reservations.reservation', verbose_name='予約')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_submissions', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '予約フォームの送信',
+                'verbose_name_plural': '予約フォームの送信',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reservationsubmission',
+            constraint=models.UniqueConstraint(fields=('user', 'key'), name='reservation_submission_unique_key'),
+        ),
+    ]
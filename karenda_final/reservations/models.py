@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 class ServiceMenu(models.Model):
@@ -64,6 +65,11 @@ class Reservation(models.Model):
     name = models.CharField('お名前', max_length=100)
     date = models.DateField('来店日')
     time_slot = models.CharField('時間帯', max_length=2, choices=TIME_CHOICES)
+    slot_span = models.PositiveSmallIntegerField(
+        '占有する時間帯の数',
+        default=1,
+        help_text='メニューの想定作業時間が1つの時間帯に収まらない場合、続く時間帯も占有する',
+    )
     
     # 新規追加：サービスメニュー
     service_menu = models.ForeignKey(
@@ -98,11 +104,148 @@ class Reservation(models.Model):
 
     class Meta:
         ordering = ['-date', 'time_slot']
-        unique_together = ('date', 'time_slot')
+        indexes = [
+            models.Index(fields=['date', 'time_slot'], name='reservation_date_slot_idx'),
+            # 管理画面の予約一覧（-date, time_slot, id 順のカーソル方式ページ送り）
+            models.Index(fields=['-date', 'time_slot', 'id'], name='reservation_list_order_idx'),
+            # マイページ（ユーザーごとの今後・過去の予約）
+            models.Index(fields=['user', 'date', 'time_slot'], name='reservation_user_date_idx'),
+            # 確定済みの予約だけを日付で絞る処理（リマインダー送信・ダッシュボードの今後の予約）
+            models.Index(
+                fields=['date', 'time_slot'],
+                condition=models.Q(status='confirmed'),
+                name='reservation_confirmed_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.date} {self.get_time_slot_display()} - {self.name}"
 
+    @classmethod
+    def span_label(cls, time_slot, span):
+        """time_slot から span 個の時間帯の表示（複数の時間帯にまたがる場合は「午前〜午後」）"""
+        labels = dict(cls.TIME_CHOICES)
+        codes = [code for code, _ in cls.TIME_CHOICES]
+        index = codes.index(time_slot)
+        last = codes[min(index + span, len(codes)) - 1]
+        if last == time_slot:
+            return labels[time_slot]
+        return f'{labels[time_slot]}〜{labels[last]}'
+
+    @property
+    def time_slot_label(self):
+        """占有する時間帯の表示"""
+        return self.span_label(self.time_slot, self.slot_span)
+
+
+class WaitlistEntry(models.Model):
+    """満席の日付・時間帯のキャンセル待ち（登録順に繰り上げる）"""
+    STATUS_CHOICES = [
+        ('waiting', 'キャンセル待ち'),
+        ('promoted', '予約に繰り上げ'),
+        ('withdrawn', '取り下げ'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries',
+        verbose_name='ユーザー',
+    )
+    name = models.CharField('お名前', max_length=100)
+    date = models.DateField('来店日')
+    time_slot = models.CharField('時間帯', max_length=2, choices=Reservation.TIME_CHOICES)
+    service_menu = models.ForeignKey(
+        ServiceMenu,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='waitlist_entries',
+        verbose_name='修理・整備メニュー',
+    )
+    status = models.CharField('ステータス', max_length=20, choices=STATUS_CHOICES, default='waiting')
+    reservation = models.OneToOneField(
+        Reservation,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='waitlist_entry',
+        verbose_name='繰り上げた予約',
+    )
+    created_at = models.DateTimeField('登録日時', auto_now_add=True)
+    promoted_at = models.DateTimeField('繰り上げ日時', null=True, blank=True)
+
+    class Meta:
+        ordering = ['date', 'time_slot', 'created_at', 'id']
+        verbose_name = 'キャンセル待ち'
+        verbose_name_plural = 'キャンセル待ち'
+        indexes = [
+            # 日付・時間帯ごとの待ち順（キャンセル時に先頭の数件だけを読む）
+            models.Index(
+                fields=['date', 'time_slot', 'created_at', 'id'],
+                condition=models.Q(status='waiting'),
+                name='waitlist_fifo_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date', 'time_slot'],
+                condition=models.Q(status='waiting'),
+                name='waitlist_unique_waiting',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.get_time_slot_display()} - {self.name}（{self.get_status_display()}）"
+
+
+class ReservationSubmission(models.Model):
+    """予約フォームの送信ごとの冪等キー（同じフォームの再送信には最初の予約を返す。一定時間後に削除）"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='reservation_submissions',
+        verbose_name='ユーザー',
+    )
+    key = models.CharField('冪等キー', max_length=64)
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.CASCADE,
+        related_name='submissions',
+        verbose_name='予約',
+    )
+    created_at = models.DateTimeField('送信日時', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = '予約フォームの送信'
+        verbose_name_plural = '予約フォームの送信'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='reservation_submission_unique_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} → #{self.reservation_id}"
+
+
+class SlotOccupancy(models.Model):
+    """日付・時間帯ごとの予約占有状況（空き枠判定用の集計テーブル）"""
+    date = models.DateField('来店日')
+    time_slot = models.CharField('時間帯', max_length=2, choices=Reservation.TIME_CHOICES)
+    booked_count = models.PositiveIntegerField('予約数', default=0)
+    capacity = models.PositiveIntegerField('受付可能数', default=1)
+    updated_at = models.DateTimeField('更新日時', auto_now=True)
+
+    class Meta:
+        ordering = ['date', 'time_slot']
+        unique_together = ('date', 'time_slot')
+        verbose_name = '予約枠占有状況'
+        verbose_name_plural = '予約枠占有状況'
+
+    def __str__(self):
+        return f"{self.date} {self.get_time_slot_display()} ({self.booked_count}/{self.capacity})"
+
+    @property
+    def is_full(self):
+        return self.booked_count >= self.capacity
+
 
 class BikeInfo(models.Model):
     """自転車情報"""
@@ -139,6 +282,13 @@ class BikeImage(models.Model):
         verbose_name='自転車情報'
     )
     image = models.ImageField('画像', upload_to='bike_images/%Y/%m/%d/')
+    width = models.PositiveIntegerField('幅', null=True, blank=True)
+    height = models.PositiveIntegerField('高さ', null=True, blank=True)
+    thumbnail = models.ImageField('サムネイル', upload_to='bike_images/thumbnails/%Y/%m/%d/', blank=True)
+    thumbnail_width = models.PositiveIntegerField('サムネイルの幅', null=True, blank=True)
+    thumbnail_height = models.PositiveIntegerField('サムネイルの高さ', null=True, blank=True)
+    webp = models.ImageField('WebP画像', upload_to='bike_images/webp/%Y/%m/%d/', blank=True)
+    processed_at = models.DateTimeField('画像処理日時', null=True, blank=True)
     uploaded_at = models.DateTimeField('アップロード日時', auto_now_add=True)
 
     class Meta:
@@ -146,6 +296,16 @@ class BikeImage(models.Model):
         verbose_name = '自転車画像'
         verbose_name_plural = '自転車画像'
 
+    @property
+    def thumbnail_url(self):
+        """一覧表示用の画像URL（未処理なら元画像）"""
+        return self.thumbnail.url if self.thumbnail else self.image.url
+
+    @property
+    def display_url(self):
+        """拡大表示用の画像URL（未処理なら元画像）"""
+        return self.webp.url if self.webp else self.image.url
+
     def __str__(self):
         return f"Image for {self.bike_info}"
 
@@ -266,6 +426,21 @@ class WorkHistory(models.Model):
         upload_to='completion_photos/%Y/%m/%d/',
         null=True, blank=True
     )
+    completion_photo_width = models.PositiveIntegerField('完了写真の幅', null=True, blank=True)
+    completion_photo_height = models.PositiveIntegerField('完了写真の高さ', null=True, blank=True)
+    completion_thumbnail = models.ImageField(
+        '完了写真（サムネイル）',
+        upload_to='completion_photos/thumbnails/%Y/%m/%d/',
+        blank=True
+    )
+    completion_thumbnail_width = models.PositiveIntegerField('完了写真サムネイルの幅', null=True, blank=True)
+    completion_thumbnail_height = models.PositiveIntegerField('完了写真サムネイルの高さ', null=True, blank=True)
+    completion_webp = models.ImageField(
+        '完了写真（WebP）',
+        upload_to='completion_photos/webp/%Y/%m/%d/',
+        blank=True
+    )
+    completion_photo_processed_at = models.DateTimeField('完了写真の処理日時', null=True, blank=True)
     admin_comment = models.TextField(
         '管理者コメント',
         blank=True,
@@ -286,3 +461,112 @@ class WorkHistory(models.Model):
 
     def __str__(self):
         return f"{self.reservation} - {self.get_status_display()}"
+
+    @property
+    def completion_thumbnail_url(self):
+        """完了写真の一覧表示用URL（未処理なら元画像）"""
+        return self.completion_thumbnail.url if self.completion_thumbnail else self.completion_photo.url
+
+    @property
+    def completion_display_url(self):
+        """完了写真の拡大表示用URL（未処理なら元画像）"""
+        return self.completion_webp.url if self.completion_webp else self.completion_photo.url
+
+
+class EmailOutbox(models.Model):
+    """送信待ちメール（リクエスト内では登録のみ行い、送信はワーカーが行う）"""
+    STATUS_CHOICES = [
+        ('pending', '送信待ち'),
+        ('sending', '送信中'),
+        ('sent', '送信済み'),
+        ('dead', '送信不可'),
+    ]
+
+    idempotency_key = models.CharField('冪等キー', max_length=200, unique=True)
+    from_email = models.CharField('送信元', max_length=254)
+    to = models.CharField('宛先', max_length=254)
+    subject = models.CharField('件名', max_length=255)
+    body = models.TextField('本文')
+    status = models.CharField(
+        'ステータス',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.PositiveIntegerField('送信試行回数', default=0)
+    next_attempt_at = models.DateTimeField('次回送信日時', default=timezone.now)
+    claim_token = models.CharField('処理中ワーカー', max_length=32, blank=True)
+    locked_until = models.DateTimeField('処理期限', null=True, blank=True)
+    last_error = models.TextField('最終エラー', blank=True)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    sent_at = models.DateTimeField('送信日時', null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = '送信待ちメール'
+        verbose_name_plural = '送信待ちメール'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.to} ({self.get_status_display()})"
+
+
+class DailyMenuRollup(models.Model):
+    """日付・メニュー・ステータスごとの予約数と金額の集計（売上レポート用の集計テーブル）
+
+    平均などは月・年単位に再集計できるよう合計値で保持する。
+    """
+    date = models.DateField('来店日')
+    service_menu = models.ForeignKey(
+        ServiceMenu,
+        on_delete=models.CASCADE,
+        null=True, blank=True,
+        related_name='daily_rollups',
+        verbose_name='修理・整備メニュー'
+    )
+    status = models.CharField('ステータス', max_length=20, choices=Reservation.STATUS_CHOICES)
+    reservation_count = models.PositiveIntegerField('予約数', default=0)
+    estimated_total = models.DecimalField('見積金額合計', max_digits=14, decimal_places=0, default=0)
+    actual_total = models.DecimalField('確定金額合計', max_digits=14, decimal_places=0, default=0)
+    estimate_count = models.PositiveIntegerField('見積・確定金額がある件数', default=0)
+    estimate_error_total = models.DecimalField(
+        '見積誤差合計',
+        max_digits=14,
+        decimal_places=0,
+        default=0,
+        help_text='見積・確定金額がある作業の |確定金額 - 見積金額| の合計'
+    )
+    updated_at = models.DateTimeField('更新日時', auto_now=True)
+
+    class Meta:
+        ordering = ['date', 'service_menu', 'status']
+        verbose_name = '日別メニュー集計'
+        verbose_name_plural = '日別メニュー集計'
+        indexes = [
+            models.Index(fields=['date'], name='rollup_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.service_menu or '未選択'} {self.get_status_display()} ({self.reservation_count}件)"
+
+    @property
+    def average_estimate_error(self):
+        if not self.estimate_count:
+            return None
+        return self.estimate_error_total / self.estimate_count
+
+
+class RollupDirtyDay(models.Model):
+    """集計し直す必要がある日（予約・作業履歴の変更時に登録し、集計後に削除する）"""
+    date = models.DateField('来店日', unique=True)
+    marked_at = models.DateTimeField('登録日時', default=timezone.now)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name = '未集計の日'
+        verbose_name_plural = '未集計の日'
+
+    def __str__(self):
+        return str(self.date)
@@ -0,0 +1,195 @@
+from datetime import date, time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .config_cache import active_time_slots, cached_config
+from .models import Reservation, SlotOccupancy
+from .versioning import bump_version_on_commit
+
+
+# 枠を占有するステータス（キャンセル以外）
+OCCUPYING_STATUSES = ('confirmed', 'in_progress', 'completed')
+
+# この時刻より前に始まる時間枠を午前枠として扱う
+NOON = time(12, 0)
+
+# 予約の時間帯（1日の中での順番）
+TIME_CODES = [code for code, _ in Reservation.TIME_CHOICES]
+
+
+def booking_window_days():
+    """予約画面に表示する予約受付期間（日数）"""
+    return getattr(settings, 'RESERVATION_BOOKING_WINDOW_DAYS', 180)
+
+
+def slot_code(start_time):
+    """TimeSlot の開始時刻から予約の時間帯（AM/PM）を判定"""
+    return 'AM' if start_time < NOON else 'PM'
+
+
+def slot_capacities():
+    """時間帯ごとの受付可能数
+
+    有効な TimeSlot の同時対応可能数を午前・午後ごとに合計する。
+    TimeSlot が未設定の時間帯は1枠1予約とする。
+    """
+    capacities = {code: 0 for code, _ in Reservation.TIME_CHOICES}
+    for slot in active_time_slots():
+        capacities[slot_code(slot.start_time)] += slot.capacity
+    return {code: capacity or 1 for code, capacity in capacities.items()}
+
+
+def slot_capacity(time_slot):
+    return slot_capacities()[time_slot]
+
+
+def _clock_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _load_slot_minutes():
+    intervals = {code: [] for code in TIME_CODES}
+    for slot in active_time_slots():
+        intervals[slot_code(slot.start_time)].append((_clock_minutes(slot.start_time), _clock_minutes(slot.end_time)))
+
+    minutes = {}
+    for code, ranges in intervals.items():
+        if not ranges:
+            minutes[code] = None
+            continue
+        # 同じ時刻の枠が複数あっても（作業台ごとの枠など）作業できる時間は重ねて数えない
+        total = 0
+        covered_until = None
+        for start, end in sorted(ranges):
+            if covered_until is not None:
+                start = max(start, covered_until)
+            if end > start:
+                total += end - start
+                covered_until = end
+        minutes[code] = total
+    return minutes
+
+
+def slot_minutes():
+    """時間帯ごとの作業できる時間（分）
+
+    有効な TimeSlot の時間を合わせた長さで、TimeSlot が未設定の時間帯は None（長さを制限しない）。
+    """
+    return cached_config('slot_minutes', _load_slot_minutes)
+
+
+def slot_span(duration, time_slot):
+    """time_slot から始めて duration 分の作業に必要な時間帯の数（当日中に終わらなければ None）"""
+    minutes = slot_minutes()
+    remaining = duration or 0
+    for span, code in enumerate(TIME_CODES[TIME_CODES.index(time_slot):], start=1):
+        if minutes[code] is None or minutes[code] >= remaining:
+            return span
+        remaining -= minutes[code]
+    return None
+
+
+def menu_span(menu, time_slot):
+    """メニューの想定作業時間から、time_slot から始めたときに占有する時間帯の数（メニュー未選択なら1）"""
+    return slot_span(menu.estimated_duration if menu else 0, time_slot)
+
+
+def covered_slots(time_slot, span):
+    """time_slot から span 個の時間帯"""
+    index = TIME_CODES.index(time_slot)
+    return TIME_CODES[index:index + span]
+
+
+def _covering(time_slot):
+    """time_slot を占有する予約の条件（その時間帯から始まる予約と、前の時間帯から続く予約）"""
+    index = TIME_CODES.index(time_slot)
+    condition = Q()
+    for offset, code in enumerate(reversed(TIME_CODES[:index + 1])):
+        condition |= Q(time_slot=code, slot_span__gt=offset)
+    return condition
+
+
+def sync_capacities():
+    """TimeSlot 変更後、今日以降の占有状況の受付可能数を更新"""
+    for time_slot, capacity in slot_capacities().items():
+        SlotOccupancy.objects.filter(
+            date__gte=date.today(),
+            time_slot=time_slot,
+        ).exclude(capacity=capacity).update(capacity=capacity)
+
+
+def count_booked(date_value, time_slot):
+    """指定した日付・時間帯の占有中の予約数を数える"""
+    return Reservation.objects.filter(
+        _covering(time_slot),
+        date=date_value,
+        status__in=OCCUPYING_STATUSES,
+    ).count()
+
+
+def refresh_slots(slots):
+    """(日付, 時間帯) の組ごとに予約数を数え直して占有状況を更新"""
+    capacities = slot_capacities()
+    with transaction.atomic():
+        for date_value, time_slot in set(slots):
+            SlotOccupancy.objects.update_or_create(
+                date=date_value,
+                time_slot=time_slot,
+                defaults={
+                    'booked_count': count_booked(date_value, time_slot),
+                    'capacity': capacities[time_slot],
+                },
+            )
+
+
+def rebuild_occupancy(batch_size=1000):
+    """予約テーブル全体から占有状況を作り直す（bulk_create後などに使用）"""
+    rows = (
+        Reservation.objects.filter(status__in=OCCUPYING_STATUSES)
+        .order_by()
+        .values('date', 'time_slot', 'slot_span')
+        .annotate(booked=Count('id'))
+    )
+    # 複数の時間帯にまたがる予約は、占有するすべての時間帯に数える
+    booked = {}
+    for row in rows.iterator(chunk_size=batch_size):
+        for code in covered_slots(row['time_slot'], row['slot_span']):
+            key = (row['date'], code)
+            booked[key] = booked.get(key, 0) + row['booked']
+
+    capacities = slot_capacities()
+    with transaction.atomic():
+        SlotOccupancy.objects.all().delete()
+        batch = []
+        total = 0
+        for (date_value, time_slot), count in booked.items():
+            batch.append(SlotOccupancy(
+                date=date_value,
+                time_slot=time_slot,
+                booked_count=count,
+                capacity=capacities[time_slot],
+            ))
+            if len(batch) >= batch_size:
+                SlotOccupancy.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            SlotOccupancy.objects.bulk_create(batch)
+            total += len(batch)
+    bump_version_on_commit('availability')
+    return total
+
+
+def is_slot_available(date_value, time_slot, span=1, exclude=None):
+    """time_slot から span 個の時間帯すべてに空きがあるか（exclude: 編集中の予約自身）
+
+    (日付, 時間帯) の一意インデックスで占有状況を引くため、その日の予約件数によらず確認できる。
+    """
+    codes = covered_slots(time_slot, span)
+    occupancy = SlotOccupancy.objects.filter(date=date_value, time_slot__in=codes)
+    own = set()
+    if exclude is not None and exclude.pk and exclude.date == date_value and exclude.status in OCCUPYING_STATUSES:
+        own = set(covered_slots(exclude.time_slot, exclude.slot_span))
+    return all(row.booked_count - (row.time_slot in own) < row.capacity for row in occupancy)
@@ -0,0 +1,148 @@
+import uuid
+from datetime import timedelta
+
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .email_utils import MailDispatcher
+from .models import EmailOutbox
+
+
+# 再送までの待ち時間（秒）: 60, 120, 240, ... 最大6時間
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+DEFAULT_MAX_ATTEMPTS = 5
+
+# ワーカーが取得したメールを他のワーカーに渡さない時間
+LEASE_SECONDS = 300
+
+
+def _outbox_row(key, email):
+    return EmailOutbox(
+        idempotency_key=key,
+        from_email=email.from_email,
+        to=email.to[0],
+        subject=email.subject,
+        body=email.body,
+    )
+
+
+def queue_messages(items):
+    """(冪等キー, EmailMessage) の組を送信待ちに登録し、登録した件数を返す（登録済みのキーは無視）
+
+    呼び出し元のトランザクション内で実行されるため、予約などの保存が
+    ロールバックされた場合はメールも登録されない。
+    """
+    rows = {key: _outbox_row(key, email) for key, email in items if email is not None}
+    if not rows:
+        return 0
+    existing = set(EmailOutbox.objects.filter(idempotency_key__in=rows).values_list('idempotency_key', flat=True))
+    new_rows = [row for key, row in rows.items() if key not in existing]
+    # 確認の後に他のプロセスが登録したキーは一意制約で無視される（その分だけ件数が多くなることがある）
+    EmailOutbox.objects.bulk_create(new_rows, ignore_conflicts=True)
+    return len(new_rows)
+
+
+def queue_message(key, email):
+    return queue_messages([(key, email)])
+
+
+def backoff_delay(attempts):
+    """attempts 回失敗した後の再送までの待ち時間"""
+    seconds = BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, BACKOFF_MAX_SECONDS))
+
+
+def claim_batch(batch_size):
+    """送信時期を過ぎたメールを batch_size 件まで取得して処理中にする
+
+    1つの UPDATE 文で取得するため、複数のワーカーが同じメールを取得することはない。
+    期限切れの「送信中」はワーカーが異常終了したものとみなして再取得する。
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', locked_until__lt=now)
+    candidates = EmailOutbox.objects.filter(due).order_by('next_attempt_at', 'pk').values('pk')[:batch_size]
+
+    EmailOutbox.objects.filter(due, pk__in=candidates).update(
+        status='sending',
+        claim_token=token,
+        locked_until=now + timedelta(seconds=LEASE_SECONDS),
+    )
+    return list(EmailOutbox.objects.filter(claim_token=token, status='sending').order_by('pk'))
+
+
+def row_to_message(row):
+    return EmailMessage(row.subject, row.body, row.from_email, [row.to])
+
+
+def deliver(rows, dispatcher, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """取得したメールを送信して結果を記録し、(送信数, 失敗数) を返す"""
+    errors = dispatcher.send([row_to_message(row) for row in rows])
+    return record_results(rows, errors, max_attempts)
+
+
+def record_results(rows, errors, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """各メールの送信結果（成功時は None、失敗時は例外）を記録して取得を解除し、(送信数, 失敗数) を返す
+
+    失敗したメールは試行回数を増やして再送時期を延ばし、max_attempts に達したら送信不可にする。
+    """
+    now = timezone.now()
+
+    sent_ids = []
+    failed = 0
+    for row, error in zip(rows, errors):
+        if error is None:
+            sent_ids.append(row.pk)
+            continue
+        failed += 1
+        row.attempts += 1
+        row.last_error = str(error)
+        row.claim_token = ''
+        row.locked_until = None
+        if row.attempts >= max_attempts:
+            row.status = 'dead'
+        else:
+            row.status = 'pending'
+            row.next_attempt_at = now + backoff_delay(row.attempts)
+
+    with transaction.atomic():
+        EmailOutbox.objects.filter(pk__in=sent_ids).update(
+            status='sent',
+            sent_at=now,
+            claim_token='',
+            locked_until=None,
+        )
+        failed_rows = [row for row in rows if row.status != 'sending']
+        if failed_rows:
+            EmailOutbox.objects.bulk_update(
+                failed_rows,
+                ['status', 'attempts', 'next_attempt_at', 'last_error', 'claim_token', 'locked_until'],
+            )
+    return len(sent_ids), failed
+
+
+def process_outbox(batch_size=100, concurrency=1, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """送信時期を過ぎたメールがなくなるまで送信し、(送信数, 失敗数) を返す"""
+    rows = claim_batch(batch_size)
+    if not rows:
+        return 0, 0
+
+    dispatcher = MailDispatcher(concurrency=concurrency)
+    try:
+        dispatcher.open()
+    except Exception as e:
+        # SMTPサーバーに接続できない場合も、取得したメールごとに1回の失敗として記録する
+        # （記録しないと「送信中」のまま試行回数が増えず、再送の間隔も送信不可への移行も働かない）
+        return record_results(rows, [e] * len(rows), max_attempts)
+
+    sent = failed = 0
+    with dispatcher:
+        while rows:
+            batch_sent, batch_failed = deliver(rows, dispatcher, max_attempts)
+            sent += batch_sent
+            failed += batch_failed
+            rows = claim_batch(batch_size)
+    return sent, failed
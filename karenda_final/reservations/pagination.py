@@ -0,0 +1,108 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+
+class KeysetPage:
+    """キーセット（カーソル）方式の1ページ分の結果"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _field_name(order_field):
+    return order_field.lstrip('-')
+
+
+def encode_cursor(values):
+    data = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, ordering, cursor):
+    """カーソル文字列を並び順の各フィールドの値に戻す（不正なら None）"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(raw) != len(ordering):
+            return None
+        return [_to_python(model, _field_name(field), value) for field, value in zip(ordering, raw)]
+    except Exception:
+        return None
+
+
+def _to_python(model, name, value):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # 注釈（検索の関連度など）は JSON の値のまま比較する
+        return value
+    return field.to_python(value)
+
+
+def after_cursor(ordering, values):
+    """並び順で values より後ろの行を表す条件
+
+    例: ('-date', 'time_slot', 'id') なら
+    date < d OR (date = d AND time_slot > t) OR (date = d AND time_slot = t AND id > i)
+    """
+    # 先頭フィールドの範囲条件を加えて、インデックスの途中から読み始められるようにする
+    first = ordering[0]
+    bound = Q(**{f"{_field_name(first)}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+
+    condition = Q()
+    for i, field in enumerate(ordering):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        part = Q(**{f'{_field_name(field)}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            part &= Q(**{_field_name(prev_field): prev_value})
+        condition |= part
+    return bound & condition
+
+
+def _page_queryset(queryset, ordering, cursor, page_size):
+    values = decode_cursor(queryset.model, ordering, cursor)
+    queryset = queryset.order_by(*ordering)
+    if values is not None:
+        queryset = queryset.filter(after_cursor(ordering, values))
+    return queryset[:page_size + 1]
+
+
+def _page(rows, ordering, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, _field_name(field)) for field in ordering])
+    return KeysetPage(rows, next_cursor)
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=50):
+    """ordering の順で cursor の次から page_size 件を取得
+
+    OFFSET を使わないため、何ページ目でも同じインデックス範囲検索で取得できる。
+    ordering の最後は一意なフィールド（id など）にすること。
+    """
+    rows = list(_page_queryset(queryset, ordering, cursor, page_size))
+    return _page(rows, ordering, page_size)
+
+
+async def akeyset_page(queryset, ordering, cursor=None, page_size=50):
+    """keyset_page の非同期版"""
+    rows = [row async for row in _page_queryset(queryset, ordering, cursor, page_size)]
+    return _page(rows, ordering, page_size)
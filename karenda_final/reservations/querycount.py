@@ -0,0 +1,65 @@
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+# 同じ形のクエリがこの回数以上実行されたら N+1 の疑いとして報告する
+DEFAULT_REPEAT_THRESHOLD = 3
+
+
+class QueryStats:
+    """実行されたクエリの件数・合計時間・同じ形のクエリの回数を記録する
+
+    connection.execute_wrapper として使うため、DEBUG=False でも記録できる。
+    パラメーターを埋め込む前の SQL を比べるので、値だけが違うクエリは同じ形とみなす。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[sql] += 1
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """threshold 回以上実行された (SQL, 回数) を多い順に返す"""
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n >= threshold]
+
+
+@contextmanager
+def collect_queries():
+    """ブロック内で全データベースに発行されたクエリを QueryStats に記録する"""
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+class QueryBudgetMixin:
+    """TestCase 用: ビューのクエリ数の上限と N+1 を検査する
+
+        with self.assertQueryBudget(5):
+            self.client.get(url)
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget, repeat_threshold=DEFAULT_REPEAT_THRESHOLD):
+        with collect_queries() as stats:
+            yield stats
+        repeated = stats.repeated(repeat_threshold)
+        if repeated:
+            lines = '\n'.join(f'  {n}回: {sql}' for sql, n in repeated)
+            self.fail(f'同じ形のクエリが繰り返し実行されました（N+1 の疑い）:\n{lines}')
+        if stats.count > budget:
+            lines = '\n'.join(f'  {n}回: {sql}' for sql, n in stats.fingerprints.most_common())
+            self.fail(f'クエリ数 {stats.count} が上限 {budget} を超えました:\n{lines}')
@@ -0,0 +1,91 @@
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+
+# 種別 → (連続して受け付ける回数, 使い切った回数が全て回復するまでの秒数)
+DEFAULT_RATE_LIMITS = {
+    'reserve': (10, 600),
+    'cancel': (10, 600),
+    'signup': (5, 3600),
+}
+
+# 同じプロセス内の同時リクエストで残り回数を読み書きする間の排他
+_lock = threading.Lock()
+
+
+def _rate(scope):
+    return getattr(settings, 'RATE_LIMITS', {}).get(scope, DEFAULT_RATE_LIMITS[scope])
+
+
+def client_ip(request):
+    """接続元の IP アドレス
+
+    リバースプロキシの内側で動かす場合は RATE_LIMIT_IP_HEADER（例: 'HTTP_X_FORWARDED_FOR'）を設定すると、
+    そのヘッダーの右から RATE_LIMIT_TRUSTED_PROXIES 番目（信頼できるプロキシが付けたもの）を使う。
+    未設定なら REMOTE_ADDR（プロキシの内側では全員がプロキシのアドレスになる）。
+    """
+    header = getattr(settings, 'RATE_LIMIT_IP_HEADER', None)
+    if header:
+        addresses = [address.strip() for address in request.META.get(header, '').split(',') if address.strip()]
+        proxies = getattr(settings, 'RATE_LIMIT_TRUSTED_PROXIES', 1)
+        if len(addresses) >= proxies:
+            return addresses[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request):
+    """制限の単位（ログイン中は利用者、未ログインは接続元 IP アドレス）"""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+def take_token(scope, key, now=None):
+    """トークンバケットから1回分を取り出す（受け付けられれば 0、超過なら次に受け付けられるまでの秒数）
+
+    残り回数は Django キャッシュに (残り, 更新時刻) で保存し、全て回復する時間が過ぎたら消えるようにする。
+    読み書きの排他はプロセス内だけなので、CACHES を複数プロセスで共有すると同時リクエストで
+    わずかに多く受け付けることがある。
+    """
+    capacity, period = _rate(scope)
+    refill = capacity / period
+    now = time.time() if now is None else now
+    cache_key = f'ratelimit:{scope}:{key}'
+    with _lock:
+        tokens, updated = cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        if tokens < 1:
+            return (1 - tokens) / refill
+        cache.set(cache_key, (tokens - 1, now), timeout=period)
+    return 0
+
+
+def rate_limit(scope, methods=('POST',), exempt=None):
+    """methods のリクエストを scope ごとの回数に制限し、超えたら 429 と Retry-After を返すデコレーター
+
+    login_required より内側に付けると、ログイン中の利用者ごとに数えられる。
+    exempt(request) が真のリクエスト（二重送信の再送など、何も書き込まないもの）は数えない。
+    RATE_LIMIT_ENABLED を False にすると制限しない。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method in methods
+                and getattr(settings, 'RATE_LIMIT_ENABLED', True)
+                and not (exempt and exempt(request))
+            ):
+                wait = take_token(scope, client_key(request))
+                if wait:
+                    response = render(request, 'reservations/too_many_requests.html', status=429)
+                    response['Retry-After'] = str(math.ceil(wait))
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Abs
+from django.utils import timezone
+
+from .models import DailyMenuRollup, Reservation, RollupDirtyDay
+
+
+# 一度に集計し直す日数（IN 句の大きさとトランザクションの長さを抑える）
+REFRESH_CHUNK_DAYS = 200
+
+_HAS_ESTIMATE = Q(
+    work_history__estimated_amount__isnull=False,
+    work_history__actual_amount__isnull=False,
+)
+
+
+def mark_days_dirty(dates):
+    """dates の日を集計し直す対象として登録（登録済みなら登録日時を更新）"""
+    now = timezone.now()
+    days = {value for value in dates if value is not None}
+    if days:
+        RollupDirtyDay.objects.bulk_create(
+            [RollupDirtyDay(date=value, marked_at=now) for value in days],
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=['marked_at'],
+        )
+
+
+def _rollup_rows(reservations):
+    """予約を日付・メニュー・ステータスごとに集計（作業履歴とは1対1なので JOIN しても件数は増えない）"""
+    return (
+        reservations.order_by()
+        .values('date', 'service_menu_id', 'status')
+        .annotate(
+            reservation_count=Count('id'),
+            estimated_total=Sum('work_history__estimated_amount', default=0),
+            actual_total=Sum('work_history__actual_amount', default=0),
+            estimate_count=Count('id', filter=_HAS_ESTIMATE),
+            estimate_error_total=Sum(
+                Abs(F('work_history__actual_amount') - F('work_history__estimated_amount')),
+                filter=_HAS_ESTIMATE,
+                default=0,
+            ),
+        )
+    )
+
+
+def _write_rollups(reservations, batch_size):
+    total = 0
+    batch = []
+    for row in _rollup_rows(reservations).iterator(chunk_size=batch_size):
+        batch.append(DailyMenuRollup(**row))
+        if len(batch) >= batch_size:
+            DailyMenuRollup.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        DailyMenuRollup.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def refresh_dirty_days(batch_size=1000):
+    """未集計の日だけ集計し直し、(集計した日数, 作成した集計行数) を返す
+
+    集計中に同じ日が再び変更された場合は登録日時が新しくなるため、
+    未集計の登録は消さずに次回もう一度集計する。
+    """
+    started = timezone.now()
+    dirty = list(RollupDirtyDay.objects.filter(marked_at__lte=started).values_list('date', flat=True))
+    days = 0
+    rows = 0
+    for i in range(0, len(dirty), REFRESH_CHUNK_DAYS):
+        chunk = dirty[i:i + REFRESH_CHUNK_DAYS]
+        with transaction.atomic():
+            DailyMenuRollup.objects.filter(date__in=chunk).delete()
+            rows += _write_rollups(Reservation.objects.filter(date__in=chunk), batch_size)
+            RollupDirtyDay.objects.filter(date__in=chunk, marked_at__lte=started).delete()
+        days += len(chunk)
+    return days, rows
+
+
+def rebuild_rollups(batch_size=1000):
+    """予約テーブル全体から集計を作り直し、作成した集計行数を返す"""
+    started = timezone.now()
+    with transaction.atomic():
+        DailyMenuRollup.objects.all().delete()
+        total = _write_rollups(Reservation.objects.all(), batch_size)
+        RollupDirtyDay.objects.filter(marked_at__lte=started).delete()
+    return total
@@ -0,0 +1,84 @@
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+# 予約の全文検索用 FTS5 テーブル（rowid = 予約ID、トリガーで同期。マイグレーション 0012 参照）
+SEARCH_TABLE = 'reservation_search'
+SEARCH_COLUMNS = ('name', 'note', 'admin_memo', 'manufacturer', 'model_name', 'details')
+
+# trigram トークナイザーは3文字未満の語を MATCH で検索できない
+MIN_MATCH_LENGTH = 3
+
+# FTS5 が使えない場合に LIKE で検索するフィールド
+FALLBACK_FIELDS = (
+    'name', 'note', 'admin_memo',
+    'bike_info__manufacturer', 'bike_info__model_name', 'bike_info__details',
+)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def _terms(query):
+    return [term for term in (query or '').split() if term]
+
+
+def _where(terms):
+    """検索語（スペース区切りの AND 検索）から FTS テーブルの条件を作成
+
+    3文字以上の語は FTS5 の MATCH（索引を使用）、それより短い語は各列の部分一致で絞り込む。
+    """
+    conditions = []
+    params = []
+    long_terms = [term for term in terms if len(term) >= MIN_MATCH_LENGTH]
+    if long_terms:
+        conditions.append(f'{SEARCH_TABLE} MATCH %s')
+        params.append(' AND '.join('"{}"'.format(term.replace('"', '""')) for term in long_terms))
+    for term in terms:
+        if len(term) < MIN_MATCH_LENGTH:
+            conditions.append('(' + ' OR '.join(
+                f'instr(lower({column}), lower(%s)) > 0' for column in SEARCH_COLUMNS
+            ) + ')')
+            params.extend([term] * len(SEARCH_COLUMNS))
+    return ' AND '.join(conditions), params
+
+
+def search_reservations(queryset, query):
+    """キーワードに一致する予約に絞り込む（並び順は変えない）"""
+    terms = _terms(query)
+    if not terms:
+        return queryset
+    if not is_available():
+        for term in terms:
+            condition = Q()
+            for field in FALLBACK_FIELDS:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    where, params = _where(terms)
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {where}', params))
+
+
+def rank_reservations(queryset, query):
+    """キーワードに一致する予約に絞り込み、関連度 search_rank（小さいほど関連が高い）を付ける
+
+    呼び出し元の絞り込み条件と同じクエリで関連度を計算するため、並べ替えてそのままページ送りできる。
+    関連度を計算できない場合（短い語だけ・FTS5 が使えない）は全件 0 になる。
+    """
+    queryset = search_reservations(queryset, query)
+    terms = _terms(query)
+    long_terms = [term for term in terms if len(term) >= MIN_MATCH_LENGTH]
+    if not (is_available() and long_terms):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    where, params = _where(long_terms)
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    return queryset.annotate(search_rank=RawSQL(
+        f'SELECT rank FROM {SEARCH_TABLE} WHERE {where} AND rowid = {table}.id',
+        params,
+        output_field=FloatField(),
+    ))
+
@@ -0,0 +1,93 @@
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import BusinessDay, Holiday, Reservation, ServiceMenu, TimeSlot, WorkHistory
+from .occupancy import covered_slots, refresh_slots, sync_capacities
+from .rollups import mark_days_dirty
+from .versioning import bump_version_on_commit
+
+
+def _occupied_slots(date_value, time_slot, span):
+    return [(date_value, code) for code in covered_slots(time_slot, span)]
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_previous_slot(sender, instance, raw=False, **kwargs):
+    """変更前の日付・時間帯・占有する時間帯の数を保持（日付変更時に元の枠も更新するため）"""
+    instance._previous_slot = None
+    if raw or not instance.pk:
+        return
+    instance._previous_slot = (
+        Reservation.objects.filter(pk=instance.pk)
+        .values_list('date', 'time_slot', 'slot_span')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Reservation)
+def update_occupancy_on_save(sender, instance, raw=False, **kwargs):
+    """予約の作成・キャンセル・ステータス変更で占有状況を更新"""
+    if raw:
+        return
+    slots = _occupied_slots(instance.date, instance.time_slot, instance.slot_span)
+    previous = getattr(instance, '_previous_slot', None)
+    if previous:
+        slots += _occupied_slots(*previous)
+    refresh_slots(slots)
+    mark_days_dirty(date_value for date_value, _ in slots)
+    bump_version_on_commit('availability', 'reservations')
+
+
+@receiver(post_delete, sender=Reservation)
+def update_occupancy_on_delete(sender, instance, **kwargs):
+    refresh_slots(_occupied_slots(instance.date, instance.time_slot, instance.slot_span))
+    mark_days_dirty([instance.date])
+    bump_version_on_commit('availability', 'reservations')
+
+
+@receiver(post_save, sender=WorkHistory)
+@receiver(post_delete, sender=WorkHistory)
+def mark_rollup_on_work_history_change(sender, instance, raw=False, **kwargs):
+    """見積・確定金額やステータスの変更を売上集計の対象にする"""
+    if raw:
+        return
+    mark_days_dirty(Reservation.objects.filter(pk=instance.reservation_id).values_list('date', flat=True))
+
+
+@receiver(pre_delete, sender=ServiceMenu)
+def mark_rollup_on_menu_delete(sender, instance, **kwargs):
+    """メニューの削除で予約のメニューが未選択になるため、その予約がある日を集計し直す"""
+    mark_days_dirty(instance.reservations.order_by().values_list('date', flat=True).distinct())
+
+
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+@receiver(post_save, sender=BusinessDay)
+@receiver(post_delete, sender=BusinessDay)
+def invalidate_calendar(sender, **kwargs):
+    """休日・営業日の変更で営業日カレンダーと空き状況の版番号を進める"""
+    bump_version_on_commit('calendar', 'availability')
+
+
+def invalidate_config():
+    """メニュー・時間枠の設定キャッシュを無効にする（コミット前後に版番号を進める）"""
+    bump_version_on_commit('config')
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def update_capacity_on_timeslot_change(sender, raw=False, **kwargs):
+    """時間枠の変更を今後の受付可能数に反映"""
+    if raw:
+        return
+    invalidate_config()
+    sync_capacities()
+    bump_version_on_commit('availability')
+
+
+@receiver(post_save, sender=ServiceMenu)
+@receiver(post_delete, sender=ServiceMenu)
+def invalidate_menus(sender, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_config()
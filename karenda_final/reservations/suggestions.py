@@ -0,0 +1,57 @@
+from contextlib import closing
+from datetime import date, timedelta
+
+from .business_calendar import iter_days
+from .models import Reservation, SlotOccupancy
+from .occupancy import TIME_CODES, booking_window_days, covered_slots, menu_span, slot_capacities
+
+
+# 提案する空き枠の件数（既定・上限）
+DEFAULT_SUGGESTIONS = 3
+MAX_SUGGESTIONS = 10
+
+# 占有状況を一度に読む行数（1日2行なので約1か月分）
+SCAN_CHUNK_ROWS = 62
+
+
+def next_available_slots(menu, start, limit=DEFAULT_SUGGESTIONS, today=None):
+    """start 以降で menu を予約できる日時を近い順に limit 件返す
+
+    営業日と占有状況を (日付, 時間帯) のインデックス順に並べて読み進め、limit 件見つかった時点で
+    読むのをやめる。満席が続いても、読むのは見つかった日までの行だけになる。
+    """
+    today = today or date.today()
+    start = max(start, today)
+    end = today + timedelta(days=booking_window_days())
+    spans = {code: menu_span(menu, code) for code in TIME_CODES}
+    if start > end or not any(spans.values()):
+        return []
+
+    capacities = slot_capacities()
+    found = []
+    rows = (
+        SlotOccupancy.objects.filter(date__range=(start, end))
+        .order_by('date', 'time_slot')
+        .values_list('date', 'time_slot', 'booked_count', 'capacity')
+        .iterator(chunk_size=SCAN_CHUNK_ROWS)
+    )
+    with closing(rows):
+        row = next(rows, None)
+        for day, is_open in iter_days(start, end):
+            free = dict(capacities)
+            while row is not None and row[0] == day:
+                free[row[1]] = row[3] - row[2]
+                row = next(rows, None)
+            if not is_open:
+                continue
+            for code, span in spans.items():
+                if span and all(free[c] > 0 for c in covered_slots(code, span)):
+                    found.append({
+                        'date': day,
+                        'time_slot': code,
+                        'slot_span': span,
+                        'label': Reservation.span_label(code, span),
+                    })
+                    if len(found) >= limit:
+                        return found
+    return found
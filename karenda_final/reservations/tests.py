@@ -1,3 +1,1426 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import date, time, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from dashboard import urls as dashboard_urls
+from . import (
+    booking, business_calendar, config_cache, images, occupancy, outbox, ratelimit, urls as reservation_urls, views,
+)
+from .forms import ReservationForm, WaitlistForm
+from .management.commands.benchmark_views import POST_ONLY
+from .models import (
+    BikeImage, BikeInfo, BusinessDay, DailyMenuRollup, EmailOutbox, Holiday, Reservation, RollupDirtyDay,
+    ReservationSubmission, ServiceMenu, SlotOccupancy, TimeSlot, WaitlistEntry, WorkHistory,
+)
+from .availability import build_availability
+from .occupancy import rebuild_occupancy
+from .rollups import rebuild_rollups, refresh_dirty_days
+from .suggestions import MAX_SUGGESTIONS, next_available_slots
+from .querycount import QueryBudgetMixin
+from .versioning import get_version
+
+
+def clear_caches():
+    """計算結果と版番号（CACHES の versions）のキャッシュを空にする
+
+    ロールバックではシグナルが発火せず版番号が進まないため、前のテストの版番号を持ち越さない。
+    """
+    for backend in caches.all():
+        backend.clear()
+
+
+class SlotOccupancyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.day = date.today() + timedelta(days=3)
+
+    def make_reservation(self, **kwargs):
+        values = {'user': self.user, 'name': '山田 太郎', 'date': self.day, 'time_slot': 'AM'}
+        values.update(kwargs)
+        return Reservation.objects.create(**values)
+
+    def occupancy(self, day, time_slot):
+        return SlotOccupancy.objects.get(date=day, time_slot=time_slot)
+
+    def test_create_and_cancel_update_occupancy(self):
+        reservation = self.make_reservation()
+        self.assertEqual(self.occupancy(self.day, 'AM').booked_count, 1)
+
+        reservation.status = 'cancelled'
+        reservation.save()
+        self.assertEqual(self.occupancy(self.day, 'AM').booked_count, 0)
+
+    def test_moving_reservation_frees_previous_slot(self):
+        reservation = self.make_reservation()
+        reservation.time_slot = 'PM'
+        reservation.save()
+        self.assertEqual(self.occupancy(self.day, 'AM').booked_count, 0)
+        self.assertEqual(self.occupancy(self.day, 'PM').booked_count, 1)
+
+    def test_rebuild_matches_signal_maintained_rows(self):
+        self.make_reservation()
+        self.make_reservation(time_slot='PM', status='cancelled')
+        expected = set(SlotOccupancy.objects.values_list('date', 'time_slot', 'booked_count'))
+        rebuild_occupancy()
+        self.assertEqual(
+            set(SlotOccupancy.objects.filter(booked_count__gt=0).values_list('date', 'time_slot', 'booked_count')),
+            {row for row in expected if row[2] > 0},
+        )
+
+    def test_form_rejects_full_slot_but_allows_editing_own_reservation(self):
+        reservation = self.make_reservation()
+        data = {
+            'name': '佐藤 花子', 'date': self.day, 'time_slot': 'AM',
+            'visit_reason': 'repair', 'note': '',
+        }
+        self.assertFalse(ReservationForm(data).is_valid())
+        self.assertTrue(ReservationForm(data, instance=reservation).is_valid())
+
+
+
+class AvailabilityApiTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        self.day = date.today() + timedelta(days=3)
+        self.url = reverse('availability')
+        self.params = {'start': str(self.day), 'end': str(self.day + timedelta(days=6))}
+
+    def test_returns_slot_availability_for_range(self):
+        Reservation.objects.create(user=self.user, name='山田', date=self.day, time_slot='AM')
+        data = self.client.get(self.url, self.params).json()
+        self.assertEqual(len(data['days']), 7)
+        day = data['days'][str(self.day)]
+        self.assertEqual(day['slots']['AM']['available'], 0)
+        self.assertEqual(day['slots']['PM']['available'], 1)
+
+    def test_month_window(self):
+        data = self.client.get(self.url, {'month': '2026-02'}).json()
+        self.assertEqual((data['start'], data['end']), ('2026-02-01', '2026-02-28'))
+
+    def test_holidays_and_business_day_overrides(self):
+        Holiday.objects.create(date=date(2020, 1, 1), name='定休日', is_permanent=True, day_of_week=self.day.weekday())
+        BusinessDay.objects.create(date=self.day + timedelta(days=7), is_open=True)
+        data = self.client.get(self.url, {'start': str(self.day), 'end': str(self.day + timedelta(days=7))}).json()
+        self.assertFalse(data['days'][str(self.day)]['open'])
+        self.assertTrue(data['days'][str(self.day + timedelta(days=7))]['open'])
+
+    def test_conditional_get_returns_304_until_data_changes(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Reservation.objects.create(user=self.user, name='山田', date=self.day, time_slot='PM')
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invalid_range(self):
+        response = self.client.get(self.url, {'start': '2026-01-01', 'end': '2026-12-31'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.other = User.objects.create_user('hanako', 'hanako@example.com', 'pass12345')
+        self.day = date.today() + timedelta(days=3)
+        self.reservation = Reservation.objects.create(user=self.user, name='山田', date=self.day, time_slot='AM')
+
+    def test_read_views_are_async(self):
+        for view in (views.dashboard, views.dashboard_more, views.availability, views.reservation_detail):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+
+    async def test_availability_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse('availability'), {'start': str(self.day), 'end': str(self.day + timedelta(days=1))},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['days'][str(self.day)]['slots']['AM']['available'], 0)
+
+        response = await self.async_client.get(
+            reverse('availability'),
+            {'start': str(self.day), 'end': str(self.day + timedelta(days=1))},
+            headers={'If-None-Match': response['ETag']},
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_anonymous_requests_redirect_to_login(self):
+        for url in (reverse('dashboard'), reverse('availability'), reverse('reservation_detail', args=[1])):
+            response = await self.async_client.get(url)
+            self.assertRedirects(response, f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+
+    async def test_other_users_reservation_is_not_found(self):
+        await self.async_client.aforce_login(self.other)
+        response = await self.async_client.get(reverse('reservation_detail', args=[self.reservation.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(QUERY_COUNT_ENABLED=True)
+    async def test_middleware_counts_queries_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        with self.assertLogs('reservations.queries', 'INFO'):
+            response = await self.async_client.get(reverse('dashboard'))
+        self.assertContains(response, '山田')
+        self.assertEqual(response['X-Query-Count'], '4')
+
+
+class AsgiBenchmarkTests(TransactionTestCase):
+    def test_benchmark_asgi_compares_handlers(self):
+        output = Path(tempfile.mkdtemp()) / 'report.json'
+        self.addCleanup(shutil.rmtree, output.parent, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=str(output.parent)):
+            call_command(
+                'benchmark_asgi', reservations=50, users=5, requests=4, threads=2, concurrency=2,
+                output=str(output), stdout=StringIO(),
+            )
+        report = json.loads(output.read_text(encoding='utf-8'))
+        self.assertEqual({run['mode'] for run in report['runs']}, {'wsgi', 'asgi'})
+        self.assertTrue(all(run['requests'] == 4 and run['errors'] == 0 for run in report['runs']))
+        self.assertEqual(Reservation.objects.count(), 0)
+        self.assertEqual(connection.settings_dict['ENGINE'], 'reservation_project.sqlite_backend')
+
+
+class BookingServiceTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.day = date.today() + timedelta(days=3)
+
+    def book(self, time_slot='AM'):
+        reservation = Reservation(user=self.user, name='山田 太郎', date=self.day, time_slot=time_slot)
+        return booking.book_reservation(reservation)
+
+    def test_capacity_follows_timeslots(self):
+        TimeSlot.objects.create(start_time=time(10), end_time=time(12), capacity=2)
+        self.book()
+        self.book()
+        with self.assertRaises(booking.SlotUnavailable):
+            self.book()
+        self.assertEqual(Reservation.objects.filter(date=self.day).count(), 2)
+
+    def test_cancelled_slot_can_be_rebooked(self):
+        reservation = self.book()
+        self.assertTrue(booking.cancel_reservation(reservation))
+        self.assertFalse(booking.cancel_reservation(reservation))
+        self.book()
+        occupancy = SlotOccupancy.objects.get(date=self.day, time_slot='AM')
+        self.assertEqual(occupancy.booked_count, 1)
+
+    def test_versions_are_bumped_again_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.book()
+            versions = get_version('availability'), get_version('reservations')
+        self.assertTrue(callbacks)
+        # コミット前の版番号でキャッシュされた内容は、コミット後には使われない
+        self.assertNotEqual((get_version('availability'), get_version('reservations')), versions)
+
+    def test_reserve_view_reports_full_slot(self):
+        self.book()
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('reserve'), {
+            'name': '佐藤 花子', 'date': self.day, 'time_slot': 'AM', 'visit_reason': 'repair',
+            'manufacturer': 'トレック', 'model_name': 'Domane', 'details': 'ブレーキ調整',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 200
+    CAPACITY = 3
+
+    def test_simultaneous_bookings_never_exceed_capacity(self):
+        TimeSlot.objects.create(start_time=time(10), end_time=time(12), capacity=self.CAPACITY)
+        day = date.today() + timedelta(days=3)
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        lock = threading.Lock()
+
+        def attempt(i):
+            try:
+                barrier.wait()
+                reservation = Reservation(name=f'客{i}', date=day, time_slot='AM')
+                try:
+                    booking.book_reservation(reservation)
+                    outcome = 'booked'
+                except booking.SlotUnavailable:
+                    outcome = 'full'
+                with lock:
+                    results.append(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(i,)) for i in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(results), self.THREADS)
+        self.assertEqual(results.count('booked'), self.CAPACITY)
+        self.assertEqual(Reservation.objects.filter(date=day).count(), self.CAPACITY)
+        self.assertEqual(SlotOccupancy.objects.get(date=day, time_slot='AM').booked_count, self.CAPACITY)
+
+
+class SQLiteBackendTests(TransactionTestCase):
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            pragmas = {
+                name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('journal_mode', 'busy_timeout', 'synchronous', 'foreign_keys')
+            }
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'busy_timeout': 15000, 'synchronous': 1, 'foreign_keys': 1})
+
+    def test_atomic_begins_immediate_transaction(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                Reservation.objects.exists()
+        self.assertEqual(ctx.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    def test_benchmark_writes_compares_settings(self):
+        output = Path(tempfile.mkdtemp()) / 'report.json'
+        self.addCleanup(shutil.rmtree, output.parent, ignore_errors=True)
+        call_command(
+            'benchmark_writes', processes=2, bookings=5, readers=1, output=str(output), stdout=StringIO(),
+        )
+        report = json.loads(output.read_text(encoding='utf-8'))
+        self.assertEqual([run['mode'] for run in report['runs']], ['stock', 'tuned'])
+        for run in report['runs']:
+            self.assertEqual((run['booked'], run['reservations'], run['consistent']), (10, 10, True))
+        # 計測後はテスト用データベースに戻っている
+        self.assertEqual(Reservation.objects.count(), 0)
+        self.assertEqual(connection.settings_dict['ENGINE'], 'reservation_project.sqlite_backend')
+
+
+class DurationSchedulingTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.day = date.today() + timedelta(days=3)
+        TimeSlot.objects.create(start_time=time(10), end_time=time(12))
+        TimeSlot.objects.create(start_time=time(13), end_time=time(17))
+        self.paint = ServiceMenu.objects.create(
+            name='フレーム塗装', estimated_duration=240, price_estimate=15000, price_display='15,000円～',
+        )
+        self.fitting = ServiceMenu.objects.create(
+            name='フィッティング', estimated_duration=60, price_estimate=3000, price_display='3,000円～',
+        )
+        self.overhaul = ServiceMenu.objects.create(
+            name='オーバーホール', estimated_duration=420, price_estimate=40000, price_display='40,000円～',
+        )
+
+    def book(self, menu, time_slot):
+        reservation = Reservation(user=self.user, name='山田', date=self.day, time_slot=time_slot, service_menu=menu)
+        return booking.book_reservation(reservation)
+
+    def booked(self):
+        return dict(SlotOccupancy.objects.filter(date=self.day).values_list('time_slot', 'booked_count'))
+
+    def form_data(self, menu, time_slot):
+        return {
+            'name': '山田', 'date': self.day, 'time_slot': time_slot,
+            'service_menu': menu.pk, 'visit_reason': 'repair',
+        }
+
+    def test_span_follows_menu_duration(self):
+        self.assertEqual(occupancy.slot_minutes(), {'AM': 120, 'PM': 240})
+        self.assertEqual(occupancy.menu_span(self.fitting, 'AM'), 1)
+        self.assertEqual(occupancy.menu_span(self.paint, 'AM'), 2)
+        self.assertEqual(occupancy.menu_span(self.paint, 'PM'), 1)
+        self.assertIsNone(occupancy.menu_span(self.overhaul, 'AM'))
+        self.assertEqual(occupancy.menu_span(None, 'PM'), 1)
+
+    def test_overlapping_time_slots_are_not_counted_twice(self):
+        TimeSlot.objects.create(start_time=time(10), end_time=time(11), capacity=2)
+        self.assertEqual(occupancy.slot_minutes()['AM'], 120)
+
+    def test_without_time_slots_every_menu_takes_one_slot(self):
+        TimeSlot.objects.all().delete()
+        self.assertEqual(occupancy.menu_span(self.overhaul, 'AM'), 1)
+
+    def test_long_menu_claims_following_slot(self):
+        reservation = self.book(self.paint, 'AM')
+        self.assertEqual(reservation.slot_span, 2)
+        self.assertEqual(reservation.time_slot_label, '午前〜午後')
+        self.assertEqual(self.booked(), {'AM': 1, 'PM': 1})
+
+        with self.assertRaises(booking.SlotUnavailable):
+            self.book(self.fitting, 'PM')
+        self.assertEqual(self.booked(), {'AM': 1, 'PM': 1})
+
+        booking.cancel_reservation(reservation)
+        self.assertEqual(self.booked(), {'AM': 0, 'PM': 0})
+
+    def test_failed_claim_releases_earlier_slots(self):
+        self.book(self.fitting, 'PM')
+        with self.assertRaises(booking.SlotUnavailable):
+            self.book(self.paint, 'AM')
+        # 先に確保した午前の枠もトランザクションごと取り消される
+        self.assertEqual(self.booked(), {'PM': 1})
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_menu_that_cannot_finish_is_rejected(self):
+        with self.assertRaises(booking.SlotUnavailable):
+            self.book(self.overhaul, 'AM')
+        form = ReservationForm(data=self.form_data(self.overhaul, 'AM'))
+        self.assertFalse(form.is_valid())
+        self.assertIn('営業時間内に作業が終わらない', form.non_field_errors()[0])
+
+    def test_form_checks_every_covered_slot(self):
+        self.book(self.fitting, 'PM')
+        self.assertFalse(ReservationForm(data=self.form_data(self.paint, 'AM')).is_valid())
+        self.assertTrue(ReservationForm(data=self.form_data(self.fitting, 'AM')).is_valid())
+
+    def test_editing_reservation_moves_all_covered_slots(self):
+        reservation = self.book(self.paint, 'AM')
+        form = ReservationForm(data=self.form_data(self.fitting, 'PM'), instance=reservation)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(Reservation.objects.get().slot_span, 1)
+        self.assertEqual(self.booked(), {'AM': 0, 'PM': 1})
+
+    def test_rebuild_counts_covered_slots(self):
+        Reservation.objects.create(name='山田', date=self.day, time_slot='AM', slot_span=2)
+        Reservation.objects.create(name='佐藤', date=self.day, time_slot='PM')
+        self.assertEqual(self.booked(), {'AM': 1, 'PM': 2})
+        SlotOccupancy.objects.all().delete()
+        rebuild_occupancy()
+        self.assertEqual(self.booked(), {'AM': 1, 'PM': 2})
+
+    def test_availability_reports_free_minutes(self):
+        day = str(self.day)
+        slots = build_availability(self.day, self.day)['days'][day]['slots']
+        self.assertEqual((slots['AM']['free_minutes'], slots['PM']['free_minutes']), (360, 240))
+
+        self.book(self.fitting, 'PM')
+        slots = build_availability(self.day, self.day)['days'][day]['slots']
+        self.assertEqual((slots['AM']['free_minutes'], slots['PM']['free_minutes']), (120, 0))
+
+    def test_reserve_page_receives_menu_durations(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('reserve'))
+        self.assertEqual(response.context['menu_durations'][self.paint.pk], 240)
+        self.assertContains(response, 'id="menu-durations"')
+
+
+class NextAvailableTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        self.today = date.today()
+        TimeSlot.objects.create(start_time=time(10), end_time=time(12))
+        TimeSlot.objects.create(start_time=time(13), end_time=time(17))
+        self.paint = ServiceMenu.objects.create(
+            name='フレーム塗装', estimated_duration=240, price_estimate=15000, price_display='15,000円～',
+        )
+
+    def fill(self, days, time_slots=('AM', 'PM')):
+        SlotOccupancy.objects.bulk_create([
+            SlotOccupancy(date=self.today + timedelta(days=i), time_slot=code, booked_count=1, capacity=1)
+            for i in days for code in time_slots
+        ])
+
+    def slots(self, menu=None, start=None, limit=3):
+        return [
+            (slot['date'], slot['time_slot'])
+            for slot in next_available_slots(menu, start or self.today, limit, today=self.today)
+        ]
+
+    def test_skips_full_and_closed_days(self):
+        self.fill(range(10))
+        BusinessDay.objects.create(date=self.today + timedelta(days=10), is_open=False)
+        day = self.today + timedelta(days=11)
+        self.assertEqual(self.slots(), [(day, 'AM'), (day, 'PM'), (day + timedelta(days=1), 'AM')])
+
+    def test_long_menu_needs_every_covered_slot(self):
+        self.fill([0], time_slots=['PM'])
+        self.fill([1], time_slots=['AM'])
+        # 0日目は午後が満席で午前から始めても終わらず、1日目は午後からなら収まる
+        self.assertEqual(self.slots(self.paint, limit=2), [
+            (self.today + timedelta(days=1), 'PM'),
+            (self.today + timedelta(days=2), 'AM'),
+        ])
+
+    def test_scan_stops_early_in_one_query(self):
+        self.fill(range(120))
+        self.slots(limit=1)  # 時間枠・営業日カレンダーをキャッシュに載せる
+        with self.assertNumQueries(1):
+            slots = self.slots(limit=1)
+        self.assertEqual(slots, [(self.today + timedelta(days=120), 'AM')])
+
+    def test_nothing_inside_booking_window(self):
+        with self.settings(RESERVATION_BOOKING_WINDOW_DAYS=5):
+            self.fill(range(6))
+            self.assertEqual(self.slots(), [])
+
+    def test_api(self):
+        self.fill(range(3))
+        url = reverse('next_available')
+        data = self.client.get(url, {'menu': self.paint.pk, 'limit': 1}).json()
+        self.assertEqual(data['slots'], [{
+            'date': str(self.today + timedelta(days=3)), 'time_slot': 'AM', 'slot_span': 2, 'label': '午前〜午後',
+        }])
+        self.assertEqual(self.client.get(url, {'menu': 9999}).status_code, 400)
+        self.assertEqual(len(self.client.get(url, {'limit': 100}).json()['slots']), MAX_SUGGESTIONS)
+
+    def test_rejected_form_shows_suggestions(self):
+        self.fill([3])
+        response = self.client.post(reverse('reserve'), {
+            'name': '山田', 'date': self.today + timedelta(days=3), 'time_slot': 'AM', 'visit_reason': 'repair',
+            'manufacturer': 'トレック', 'model_name': 'Domane', 'details': '点検',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(s['date'], s['time_slot']) for s in response.context['form'].suggestions],
+            [(self.today + timedelta(days=4), 'AM'), (self.today + timedelta(days=4), 'PM'),
+             (self.today + timedelta(days=5), 'AM')],
+        )
+        self.assertContains(response, f'data-date="{self.today + timedelta(days=4)}"')
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.day = date.today() + timedelta(days=3)
+        TimeSlot.objects.create(start_time=time(10), end_time=time(12))
+        TimeSlot.objects.create(start_time=time(13), end_time=time(17))
+        self.paint = ServiceMenu.objects.create(
+            name='フレーム塗装', estimated_duration=240, price_estimate=15000, price_display='15,000円～',
+        )
+        self.users = [
+            User.objects.create_user(f'user{i}', f'user{i}@example.com', 'pass12345') for i in range(3)
+        ]
+        self.holder = booking.book_reservation(
+            Reservation(user=self.users[0], name='先約', date=self.day, time_slot='AM'),
+        )
+
+    def wait(self, user, time_slot='AM', menu=None):
+        return booking.join_waitlist(WaitlistEntry(
+            user=user, name=user.username, date=self.day, time_slot=time_slot, service_menu=menu,
+        ))
+
+    def test_join_only_when_full(self):
+        with self.assertRaises(booking.SlotAvailable):
+            self.wait(self.users[1], time_slot='PM')
+        self.wait(self.users[1])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.wait(self.users[1])
+
+    def test_cancel_promotes_first_waiter(self):
+        first = self.wait(self.users[1])
+        second = self.wait(self.users[2])
+        booking.cancel_reservation(self.holder)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ('promoted', 'waiting'))
+        self.assertEqual(first.reservation.user, self.users[1])
+        self.assertEqual(first.reservation.status, 'confirmed')
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time_slot='AM').booked_count, 1)
+        self.assertTrue(EmailOutbox.objects.filter(idempotency_key=f'waitlist:{first.pk}').exists())
+
+    def test_skips_waiter_whose_menu_does_not_fit(self):
+        booking.book_reservation(Reservation(user=self.users[0], name='午後', date=self.day, time_slot='PM'))
+        long_job = self.wait(self.users[1], menu=self.paint)
+        short_job = self.wait(self.users[2])
+        booking.cancel_reservation(self.holder)
+
+        long_job.refresh_from_db()
+        short_job.refresh_from_db()
+        self.assertEqual((long_job.status, short_job.status), ('waiting', 'promoted'))
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time_slot='PM').booked_count, 1)
+
+    def test_menu_that_never_fits_cannot_join(self):
+        overnight = ServiceMenu.objects.create(
+            name='オーバーホール', estimated_duration=600, price_estimate=30000, price_display='30,000円～',
+        )
+        with self.assertRaises(booking.SlotUnavailable):
+            self.wait(self.users[1], menu=overnight)
+        form = WaitlistForm({'name': '山田', 'date': self.day, 'time_slot': 'AM', 'service_menu': overnight.pk})
+        self.assertFalse(form.is_valid())
+
+    def test_entries_that_no_longer_fit_are_withdrawn(self):
+        # 登録後にメニューの作業時間が延びた登録が先頭に並んでいても、後ろの登録が繰り上がる
+        waiters = User.objects.bulk_create([User(username=f'waiter{i}') for i in range(booking.PROMOTION_PROBES)])
+        WaitlistEntry.objects.bulk_create([
+            WaitlistEntry(user=user, name='待ち', date=self.day, time_slot='AM', service_menu=self.paint)
+            for user in waiters
+        ])
+        eligible = self.wait(self.users[1])
+        self.paint.estimated_duration = 600
+        self.paint.save()
+        booking.cancel_reservation(self.holder)
+
+        eligible.refresh_from_db()
+        self.assertEqual(eligible.status, 'promoted')
+        self.assertEqual(
+            WaitlistEntry.objects.filter(service_menu=self.paint, status='withdrawn').count(), len(waiters),
+        )
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time_slot='AM').booked_count, 1)
+
+    def test_promotion_reads_a_bounded_prefix_of_the_queue(self):
+        waiters = User.objects.bulk_create([User(username=f'waiter{i}') for i in range(50)])
+        WaitlistEntry.objects.bulk_create([
+            WaitlistEntry(user=user, name='待ち', date=self.day, time_slot='AM', service_menu=self.paint)
+            for user in waiters
+        ])
+        booking.book_reservation(Reservation(user=self.users[0], name='午後', date=self.day, time_slot='PM'))
+        with CaptureQueriesContext(connection) as ctx:
+            booking.cancel_reservation(self.holder)
+        reads = [q['sql'] for q in ctx.captured_queries if 'FROM "reservations_waitlistentry"' in q['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertIn(f'LIMIT {booking.PROMOTION_PROBES}', reads[0])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + reads[0])
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('waitlist_fifo_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_reserve_page_offers_waitlist_when_full(self):
+        self.client.force_login(self.users[1])
+        data = {
+            'name': '山田', 'date': self.day, 'time_slot': 'AM', 'visit_reason': 'repair',
+            'manufacturer': 'トレック', 'model_name': 'Domane', 'details': '点検',
+        }
+        response = self.client.post(reverse('reserve'), data)
+        self.assertContains(response, reverse('join_waitlist'))
+
+        response = self.client.post(reverse('join_waitlist'), {
+            'name': '山田', 'date': self.day, 'time_slot': 'AM', 'service_menu': '',
+        })
+        self.assertRedirects(response, reverse('dashboard'))
+        self.assertEqual(WaitlistEntry.objects.get().user, self.users[1])
+
+
+class SubmissionKeyTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        TimeSlot.objects.create(start_time=time(10), end_time=time(12), capacity=2)
+        TimeSlot.objects.create(start_time=time(13), end_time=time(17), capacity=1)
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.day = date.today() + timedelta(days=3)
+
+    def reservation(self, time_slot='AM'):
+        return Reservation(user=self.user, name='山田 太郎', date=self.day, time_slot=time_slot)
+
+    def stored_files(self):
+        return sorted(str(path) for path in Path(self.media_root).rglob('*') if path.is_file())
+
+    def test_resubmitted_form_returns_first_reservation(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('reserve'))
+        key = response.context['form']['submission_key'].value()
+        self.assertContains(response, f'name="submission_key" value="{key}"')
+
+        data = {
+            'name': '山田 太郎', 'date': self.day, 'time_slot': 'AM', 'visit_reason': 'repair',
+            'manufacturer': 'トレック', 'model_name': 'Domane', 'details': 'ブレーキ調整',
+            'submission_key': key,
+        }
+        first = self.client.post(reverse('reserve'), {**data, 'images': [make_jpeg()]})
+        reservation = Reservation.objects.get()
+        self.assertRedirects(first, reverse('reserve_done', args=[reservation.pk]))
+        files = self.stored_files()
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.post(reverse('reserve'), {**data, 'images': [make_jpeg()]})
+        self.assertRedirects(second, reverse('reserve_done', args=[reservation.pk]), fetch_redirect_response=False)
+        self.assertTrue(all(q['sql'].startswith('SELECT') for q in ctx.captured_queries))
+        self.assertEqual(self.stored_files(), files)
+        self.assertEqual(BikeImage.objects.count(), 1)
+
+    def test_duplicate_key_rolls_back_the_second_booking(self):
+        first = booking.book_reservation(self.reservation(), submission_key='abc')
+        with self.assertRaises(booking.DuplicateSubmission) as raised:
+            booking.book_reservation(
+                self.reservation(), BikeInfo(manufacturer='トレック', model_name='Domane', details='点検'),
+                [make_jpeg()], submission_key='abc',
+            )
+        self.assertEqual(raised.exception.reservation_id, first.pk)
+        self.assertEqual(Reservation.objects.count(), 1)
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time_slot='AM').booked_count, 1)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_duplicate_key_for_a_slot_it_filled(self):
+        first = booking.book_reservation(self.reservation('PM'), submission_key='abc')
+        with self.assertRaises(booking.DuplicateSubmission) as raised:
+            booking.book_reservation(self.reservation('PM'), submission_key='abc')
+        self.assertEqual(raised.exception.reservation_id, first.pk)
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.book_reservation(self.reservation('PM'), submission_key='other')
+
+    def test_expired_keys_are_ignored_and_purged(self):
+        booking.book_reservation(self.reservation(), submission_key='old')
+        ReservationSubmission.objects.update(
+            created_at=timezone.now() - booking.SUBMISSION_KEY_TTL - timedelta(seconds=1),
+        )
+        self.assertIsNone(booking.find_submission(self.user, 'old'))
+        booking.book_reservation(self.reservation(), submission_key='new')
+        self.assertEqual(list(ReservationSubmission.objects.values_list('key', flat=True)), ['new'])
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.client.force_login(self.user)
+
+    @override_settings(RATE_LIMITS={'reserve': (2, 60)})
+    def test_bucket_refills_over_time(self):
+        self.assertEqual(ratelimit.take_token('reserve', 'user:1', now=100), 0)
+        self.assertEqual(ratelimit.take_token('reserve', 'user:1', now=100), 0)
+        self.assertEqual(ratelimit.take_token('reserve', 'user:1', now=100), 30)
+        self.assertEqual(ratelimit.take_token('reserve', 'user:2', now=100), 0)
+        self.assertEqual(ratelimit.take_token('reserve', 'user:1', now=130), 0)
+
+    @override_settings(RATE_LIMITS={'cancel': (2, 60)})
+    def test_post_over_limit_returns_429(self):
+        reservation = Reservation.objects.create(
+            user=self.user, name='田中', date=date.today() + timedelta(days=3), time_slot='AM',
+        )
+        url = reverse('cancel_reservation', args=[reservation.pk])
+        for _ in range(2):
+            self.assertEqual(self.client.post(url).status_code, 302)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        # 表示（GET）は数えない
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(RATE_LIMITS={'signup': (1, 3600)})
+    def test_signup_is_limited_per_ip_address(self):
+        self.client.logout()
+        data = {'username': 'hanako', 'password1': 'x', 'password2': 'y'}
+        self.assertEqual(self.client.post(reverse('signup'), data).status_code, 200)
+        self.assertEqual(self.client.post(reverse('signup'), data).status_code, 429)
+        self.assertEqual(self.client.post(reverse('signup'), data, REMOTE_ADDR='192.0.2.1').status_code, 200)
+        with self.settings(RATE_LIMIT_ENABLED=False):
+            self.assertEqual(self.client.post(reverse('signup'), data).status_code, 200)
+
+    @override_settings(
+        RATE_LIMITS={'signup': (1, 3600)}, RATE_LIMIT_IP_HEADER='HTTP_X_FORWARDED_FOR', RATE_LIMIT_TRUSTED_PROXIES=1,
+    )
+    def test_client_address_behind_proxy(self):
+        self.client.logout()
+        data = {'username': 'hanako', 'password1': 'x', 'password2': 'y'}
+
+        def signup(forwarded_for):
+            return self.client.post(reverse('signup'), data, HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        self.assertEqual(signup('203.0.113.5'), 200)
+        self.assertEqual(signup('203.0.113.6'), 200)
+        # 利用者が付けた左側のアドレスは使わず、プロキシが付けた右端で数える
+        self.assertEqual(signup('198.51.100.1, 203.0.113.5'), 429)
+
+    @override_settings(RATE_LIMITS={'reserve': (1, 600)})
+    def test_resubmitted_reservation_is_not_counted(self):
+        data = {
+            'name': '山田 太郎', 'date': date.today() + timedelta(days=3), 'time_slot': 'AM',
+            'visit_reason': 'repair', 'manufacturer': 'トレック', 'model_name': 'Domane', 'details': '点検',
+            'submission_key': 'abc',
+        }
+        first = self.client.post(reverse('reserve'), data)
+        self.assertEqual(first.status_code, 302)
+        second = self.client.post(reverse('reserve'), data)
+        self.assertRedirects(second, first['Location'])
+        self.assertEqual(self.client.post(reverse('reserve'), {**data, 'submission_key': 'new'}).status_code, 429)
+
+    def test_benchmark_reports_overhead(self):
+        out = StringIO()
+        call_command('benchmark_ratelimit', requests=200, rounds=1, clients=3, stdout=out)
+        self.assertIn('µs', out.getvalue())
+        self.assertIsNone(cache.get('ratelimit:reserve:ip:10.0.0.0'))
+
+
+class ConfigCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        self.menu = ServiceMenu.objects.create(
+            name='パンク修理', estimated_duration=30, price_estimate=1500, price_display='1,500円～',
+        )
+        TimeSlot.objects.create(start_time=time(10), end_time=time(12), capacity=2)
+
+    def _config_queries(self, ctx):
+        return [
+            q['sql'] for q in ctx.captured_queries
+            if 'reservations_servicemenu' in q['sql'] or 'reservations_timeslot' in q['sql']
+        ]
+
+    def test_reserve_page_does_not_query_config_when_warm(self):
+        self.client.get(reverse('reserve'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('reserve'))
+            self.client.get(reverse('availability'), {'month': date.today().strftime('%Y-%m')})
+        self.assertContains(response, 'パンク修理 (1,500円～)')
+        self.assertEqual(self._config_queries(ctx), [])
+
+    def test_post_validates_menu_from_cache(self):
+        self.client.get(reverse('reserve'))
+        data = {
+            'name': '山田 太郎', 'date': date.today() + timedelta(days=3), 'time_slot': 'AM',
+            'visit_reason': 'repair', 'service_menu': self.menu.pk,
+            'manufacturer': 'トレック', 'model_name': 'Domane', 'details': 'パンク',
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('reserve'), data)
+        self.assertEqual(response.status_code, 302)
+        # 一覧は取得せず、モデルの外部キー検証による存在確認だけが行われる
+        queries = self._config_queries(ctx)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0].startswith('SELECT 1 AS "a" FROM "reservations_servicemenu"'))
+        self.assertEqual(Reservation.objects.get().service_menu, self.menu)
+
+        form = ReservationForm({**data, 'service_menu': self.menu.pk + 100})
+        self.assertIn('service_menu', form.errors)
+
+    def test_saving_menu_or_timeslot_reloads_config(self):
+        self.assertEqual(len(config_cache.service_menus()), 1)
+        ServiceMenu.objects.create(name='オーバーホール', estimated_duration=120, price_estimate=20000, price_display='20,000円～')
+        self.assertEqual([m.name for m in config_cache.service_menus()], ['オーバーホール', 'パンク修理'])
+
+        self.assertEqual(config_cache.active_time_slots()[0].capacity, 2)
+        TimeSlot.objects.update(capacity=5)  # signal なし: 版番号が同じなら保持した値を使う
+        self.assertEqual(config_cache.active_time_slots()[0].capacity, 2)
+        TimeSlot.objects.get().save()
+        self.assertEqual(config_cache.active_time_slots()[0].capacity, 5)
+
+    def test_version_bumped_by_another_worker_drops_copy(self):
+        config_cache.service_menus()
+        ServiceMenu.objects.filter(pk=self.menu.pk).update(name='チューブ交換')
+        with self.assertNumQueries(0):
+            self.assertEqual(config_cache.service_menus()[0].name, 'パンク修理')
+        # 他のワーカー（別プロセス）で保存したときと同じく、版番号だけを別プロセスで進める
+        subprocess.run(
+            [
+                sys.executable, '-c',
+                'import django; django.setup(); '
+                'from reservations.versioning import bump_version; bump_version("config")',
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'reservation_project.settings'},
+            check=True,
+        )
+        self.assertEqual(config_cache.service_menus()[0].name, 'チューブ交換')
+
+    def test_copy_expires_without_a_version_bump(self):
+        config_cache.service_menus()
+        # 版番号を進めない更新（シグナルの発火しない update()）は保持時間を過ぎると反映される
+        ServiceMenu.objects.filter(pk=self.menu.pk).update(name='チューブ交換')
+        self.assertEqual(config_cache.service_menus()[0].name, 'パンク修理')
+        with override_settings(CONFIG_CACHE_MAX_AGE=0):
+            self.assertEqual(config_cache.service_menus()[0].name, 'チューブ交換')
+
+    def test_version_is_bumped_again_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.menu.save()
+            version = get_version('config')
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_version('config'), version)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for i in range(config_cache.MAX_ENTRIES + 1):
+            config_cache.cached_config(('test', i), lambda: i)
+        self.assertNotIn(('test', 0), config_cache._entries)
+        self.assertEqual(len(config_cache._entries), config_cache.MAX_ENTRIES)
+
+
+class BusinessCalendarTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.year = date.today().year + 1
+        self.new_year = date(self.year, 1, 1)
+
+    def test_compiles_holidays_and_business_day_overrides(self):
+        Holiday.objects.create(date=date(2020, 1, 6), name='定休日', is_permanent=True, day_of_week=0)
+        Holiday.objects.create(date=self.new_year, name='年始休業')
+        monday = self.new_year + timedelta(days=(7 - self.new_year.weekday()) % 7 or 7)
+        BusinessDay.objects.create(date=monday, is_open=True)
+
+        self.assertFalse(business_calendar.is_open(self.new_year))
+        self.assertTrue(business_calendar.is_open(monday))
+        self.assertFalse(business_calendar.is_open(monday + timedelta(days=7)))
+
+    def test_lookups_are_served_without_queries(self):
+        business_calendar.open_days(self.new_year, 180)
+        with self.assertNumQueries(0):
+            days = business_calendar.open_days(self.new_year, 180)
+        self.assertEqual(len(days), 180)
+
+    def test_saving_holiday_invalidates_compiled_calendar(self):
+        self.assertTrue(business_calendar.is_open(self.new_year))
+        holiday = Holiday.objects.create(date=self.new_year, name='年始休業')
+        self.assertFalse(business_calendar.is_open(self.new_year))
+        holiday.delete()
+        self.assertTrue(business_calendar.is_open(self.new_year))
+
+
+class CountingEmailBackend(EmailBackend):
+    """開いた接続の数を数えるテスト用バックエンド"""
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+
+@override_settings(EMAIL_BACKEND='reservations.tests.CountingEmailBackend')
+class SendRemindersTests(TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+        self.tomorrow = date.today() + timedelta(days=1)
+        menu = ServiceMenu.objects.create(
+            name='メンテナンス', estimated_duration=90, price_estimate=5000, price_display='5,000円～',
+        )
+        users = [User.objects.create_user(f'user{i}', f'user{i}@example.com') for i in range(30)]
+        Reservation.objects.bulk_create([
+            Reservation(user=user, name=user.username, date=self.tomorrow, time_slot='AM', service_menu=menu)
+            for user in users
+        ])
+
+    def test_sends_all_reminders_over_reused_connections(self):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('send_reminders', chunk_size=7, concurrency=3, stdout=out)
+        reservation_reads = [q for q in queries if q['sql'].startswith('SELECT') and 'reservations_reservation' in q['sql']]
+        self.assertEqual(len(reservation_reads), 1)
+        self.assertEqual(len(mail.outbox), 30)
+        self.assertEqual(CountingEmailBackend.opened, 3)
+        self.assertIn('[5] 2 件処理', out.getvalue())
+
+    def test_rerun_does_not_send_twice(self):
+        call_command('send_reminders', stdout=StringIO())
+        out = StringIO()
+        call_command('send_reminders', enqueue_only=True, stdout=out)
+        self.assertIn('合計 0 件のリマインダーメールを送信待ちに登録しました', out.getvalue())
+        call_command('send_reminders', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 30)
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP unavailable')
+
+
+class UnreachableEmailBackend(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError('SMTP server refused the connection')
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.day = date.today() + timedelta(days=3)
+
+    def book(self):
+        return booking.book_reservation(
+            Reservation(user=self.user, name='山田 太郎', date=self.day, time_slot='AM')
+        )
+
+    def test_booking_queues_confirmation_without_sending(self):
+        reservation = self.book()
+        self.assertEqual(len(mail.outbox), 0)
+        queued = EmailOutbox.objects.get()
+        self.assertEqual(queued.idempotency_key, f'confirmation:{reservation.pk}')
+
+        self.assertEqual(outbox.process_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'sent')
+
+    def test_full_slot_rolls_back_queued_mail(self):
+        self.book()
+        with self.assertRaises(booking.SlotUnavailable):
+            self.book()
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    @override_settings(EMAIL_BACKEND='reservations.tests.FailingEmailBackend')
+    def test_failures_back_off_then_dead_letter(self):
+        self.book()
+        self.assertEqual(outbox.process_outbox(max_attempts=2), (0, 1))
+        queued = EmailOutbox.objects.get()
+        self.assertEqual((queued.status, queued.attempts), ('pending', 1))
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+
+        # 再送時期になるまでは取得されない
+        self.assertEqual(outbox.process_outbox(max_attempts=2), (0, 0))
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        outbox.process_outbox(max_attempts=2)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('dead', 2))
+        self.assertIn('SMTP unavailable', queued.last_error)
+
+    @override_settings(EMAIL_BACKEND='reservations.tests.UnreachableEmailBackend')
+    def test_connection_failure_counts_as_attempt(self):
+        self.book()
+        self.assertEqual(outbox.process_outbox(max_attempts=2), (0, 1))
+        queued = EmailOutbox.objects.get()
+        self.assertEqual((queued.status, queued.attempts, queued.claim_token), ('pending', 1, ''))
+        self.assertIsNone(queued.locked_until)
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+        self.assertIn('refused', queued.last_error)
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.process_outbox(max_attempts=2), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('dead', 2))
+
+    @override_settings(EMAIL_BACKEND='reservations.tests.UnreachableEmailBackend')
+    def test_send_reminders_survives_unreachable_server(self):
+        Reservation.objects.create(user=self.user, name='山田 太郎', date=date.today() + timedelta(days=1), time_slot='AM')
+        out = StringIO()
+        call_command('send_reminders', stdout=out)
+        self.assertIn('1 件の送信に失敗しました', out.getvalue())
+        self.assertEqual(EmailOutbox.objects.filter(status='pending', attempts=1).count(), 1)
+
+    def test_worker_keeps_running_after_error(self):
+        command = 'reservations.management.commands.process_outbox'
+        with (
+            mock.patch(f'{command}.process_outbox', side_effect=[DatabaseError('database is locked'), (1, 0)]) as process,
+            mock.patch(f'{command}.time.sleep', side_effect=[None, KeyboardInterrupt]),
+            self.assertLogs(command, 'ERROR'),
+        ):
+            out = StringIO()
+            call_command('process_outbox', stdout=out)
+        self.assertEqual(process.call_count, 2)
+        self.assertIn('送信 1 件', out.getvalue())
+
+
+def make_jpeg(size=(2400, 1600)):
+    """向き（回転）と撮影位置の EXIF を含む JPEG"""
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 右に90度回転して表示
+    exif[0x8825] = {2: (35.0, 40.0, 0.0)}  # GPS 緯度
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, format='JPEG', exif=exif)
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageProcessingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.reservation = Reservation(user=self.user, name='山田 太郎', date=date.today() + timedelta(days=3), time_slot='AM')
+
+    def test_booking_stores_originals_without_processing(self):
+        bike_info = BikeInfo(manufacturer='トレック', model_name='Domane', details='ブレーキ調整')
+        booking.book_reservation(self.reservation, bike_info, [make_jpeg(), make_jpeg()])
+        bike_images = list(BikeImage.objects.all())
+        self.assertEqual(len(bike_images), 2)
+        self.assertTrue(all(img.processed_at is None and not img.thumbnail for img in bike_images))
+        self.assertEqual(bike_images[0].thumbnail_url, bike_images[0].image.url)
+
+    def test_process_images_strips_exif_and_builds_derivatives(self):
+        self.reservation.save()
+        bike_info = BikeInfo.objects.create(
+            reservation=self.reservation, manufacturer='トレック', model_name='Domane', details='ブレーキ調整',
+        )
+        BikeImage.objects.create(bike_info=bike_info, image=make_jpeg())
+        call_command('process_images', '--once', stdout=StringIO())
+
+        bike_image = BikeImage.objects.get()
+        self.assertIsNotNone(bike_image.processed_at)
+        # 向きを反映して縦長になる
+        self.assertEqual((bike_image.width, bike_image.height), (1600, 2400))
+        self.assertLessEqual(max(bike_image.thumbnail_width, bike_image.thumbnail_height), images.THUMBNAIL_SIZE[0])
+
+        with Image.open(bike_image.image.path) as original:
+            self.assertEqual(len(original.getexif()), 0)
+        with Image.open(bike_image.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (bike_image.thumbnail_width, bike_image.thumbnail_height))
+        with Image.open(bike_image.webp.path) as webp:
+            self.assertEqual(webp.format, 'WEBP')
+            self.assertLessEqual(max(webp.size), images.WEBP_MAX_SIZE[0])
+        self.assertLess(bike_image.thumbnail.size, bike_image.image.size)
+        self.assertEqual(bike_image.thumbnail_url, bike_image.thumbnail.url)
+
+    def test_completion_photo_and_broken_images(self):
+        self.reservation.save()
+        work_history = WorkHistory.objects.create(reservation=self.reservation, completion_photo=make_jpeg((800, 600)))
+        bike_info = BikeInfo.objects.create(
+            reservation=self.reservation, manufacturer='トレック', model_name='Domane', details='ブレーキ調整',
+        )
+        BikeImage.objects.create(bike_info=bike_info, image=SimpleUploadedFile('broken.jpg', b'not an image'))
+
+        with self.assertLogs('reservations.images', 'WARNING'):
+            self.assertEqual(images.process_pending_images(), (1, 1))
+        # 処理済み・失敗済みは再処理しない
+        self.assertEqual(images.process_pending_images(), (0, 0))
+
+        work_history.refresh_from_db()
+        self.assertEqual((work_history.completion_photo_width, work_history.completion_photo_height), (600, 800))
+        self.assertTrue(work_history.completion_webp)
+        broken = BikeImage.objects.get()
+        self.assertFalse(broken.thumbnail)
+        self.assertEqual(broken.thumbnail_url, broken.image.url)
+
+    def test_unexpected_error_does_not_block_queue(self):
+        self.reservation.save()
+        bike_info = BikeInfo.objects.create(
+            reservation=self.reservation, manufacturer='トレック', model_name='Domane', details='ブレーキ調整',
+        )
+        first = BikeImage.objects.create(bike_info=bike_info, image=make_jpeg((800, 600)))
+        second = BikeImage.objects.create(bike_info=bike_info, image=make_jpeg((800, 600)))
+        render = images.render_derivatives
+
+        def render_or_fail(field_file):
+            # Pillow は想定外の画像に ValueError や SyntaxError を出すことがある
+            if field_file.name == first.image.name:
+                raise ValueError('unsupported image mode')
+            return render(field_file)
+
+        with (
+            mock.patch.object(images, 'render_derivatives', render_or_fail),
+            self.assertLogs('reservations.images', 'WARNING'),
+        ):
+            self.assertEqual(images.process_pending_images(), (1, 1))
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertIsNotNone(first.processed_at)
+        self.assertFalse(first.thumbnail)
+        self.assertTrue(second.thumbnail)
+        self.assertEqual(images.process_pending_images(), (0, 0))
+
+
+class QueryPlanTests(TestCase):
+    """予約を扱う主要な画面・コマンドが予約テーブルを全件走査しないこと"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        users = [cls.user] + [User(username=f'user{i}') for i in range(200)]
+        User.objects.bulk_create(users[1:])
+        users = list(User.objects.filter(is_staff=False))
+        statuses = ['confirmed', 'confirmed', 'cancelled', 'completed', 'in_progress']
+        base = date.today() - timedelta(days=180)
+        Reservation.objects.bulk_create([
+            Reservation(
+                user=users[i % len(users)],
+                name=f'客{i}',
+                date=base + timedelta(days=i % 365),
+                time_slot='AM' if i % 2 else 'PM',
+                status=statuses[i % len(statuses)],
+            )
+            for i in range(8000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        clear_caches()
+
+    def assert_no_full_scan(self, queries, uses=None, table='reservations_reservation'):
+        reads = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and f'"{table}"' in q['sql']]
+        self.assertTrue(reads)
+        used = set()
+        for sql in reads:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+            scans = [step for step in plan if step.startswith(f'SCAN {table}')]
+            self.assertFalse(scans, f'{sql}\n' + '\n'.join(plan))
+            used.update(step.split(' INDEX ')[1].split()[0] for step in plan if ' INDEX ' in step)
+        if uses:
+            self.assertIn(uses, used)
+
+    def capture(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = func(*args, **kwargs)
+        if response is not None:
+            self.assertIn(response.status_code, (200, 302))
+        return queries
+
+    def test_user_dashboard(self):
+        self.client.force_login(self.user)
+        self.assert_no_full_scan(self.capture(self.client.get, reverse('dashboard')), uses='reservation_user_date_idx')
+
+    def test_reserve_post(self):
+        self.client.force_login(self.user)
+        queries = self.capture(self.client.post, reverse('reserve'), {
+            'name': '山田 太郎', 'date': date.today() + timedelta(days=200), 'time_slot': 'AM',
+            'visit_reason': 'repair', 'manufacturer': 'トレック', 'model_name': 'Domane', 'details': 'ブレーキ調整',
+        })
+        self.assertTrue(Reservation.objects.filter(date=date.today() + timedelta(days=200)).exists())
+        # 占有状況の数え直し（signal）は (日付, 時間帯) で始まるインデックスで予約を数える。
+        # どのインデックスを選ぶかは統計情報次第なので、全件走査しないことだけを確認する
+        self.assert_no_full_scan(queries)
+        self.assert_no_full_scan(queries, table='reservations_slotoccupancy')
+
+    def test_reservation_form_clean(self):
+        reservation = Reservation.objects.filter(user=self.user, status='confirmed').first()
+        form = ReservationForm(
+            data={'name': reservation.name, 'date': reservation.date, 'time_slot': 'PM', 'visit_reason': 'repair'},
+            instance=reservation,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(form.is_valid(), form.errors)
+        # 空き状況は予約テーブルではなく占有状況の行で確認する
+        self.assertFalse([q for q in queries if '"reservations_reservation"' in q['sql']])
+        self.assert_no_full_scan(queries, table='reservations_slotoccupancy')
+
+    def test_send_reminders(self):
+        queries = self.capture(call_command, 'send_reminders', enqueue_only=True, stdout=StringIO())
+        self.assert_no_full_scan(queries, uses='reservation_confirmed_idx')
+
+    def test_dashboard_home(self):
+        self.client.force_login(self.staff)
+        self.assert_no_full_scan(self.capture(self.client.get, reverse('dashboard:home')))
+
+
+class DataGeneratorTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_generate_data_creates_related_rows(self):
+        call_command('generate_data', users=20, reservations=500, batch_size=120, seed=3, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Reservation.objects.count(), 500)
+        self.assertEqual(BikeImage.objects.count(), BikeInfo.objects.count())
+        self.assertFalse(BikeImage.objects.filter(processed_at__isnull=True).exists())
+        self.assertFalse(WorkHistory.objects.exclude(reservation__status__in=['completed', 'in_progress']).exists())
+        self.assertEqual(
+            sum(SlotOccupancy.objects.values_list('booked_count', flat=True)),
+            Reservation.objects.filter(status__in=['confirmed', 'in_progress', 'completed']).count(),
+        )
+        # 自前で振った ID の後も通常どおり保存できる
+        reservation = Reservation.objects.create(name='追加', date=date.today(), time_slot='AM')
+        self.assertEqual(reservation.pk, 501)
+
+    def test_benchmark_views_reports_every_url(self):
+        output = Path(tempfile.mkdtemp()) / 'report.json'
+        self.addCleanup(shutil.rmtree, output.parent, ignore_errors=True)
+        call_command(
+            'benchmark_views', sizes='50,100', users=10, repeat=1, output=str(output), stdout=StringIO(),
+        )
+        report = json.loads(output.read_text(encoding='utf-8'))
+        self.assertEqual([run['reservations'] for run in report['runs']], [50, 100])
+
+        names = {result['name'] for result in report['runs'][0]['results']}
+        expected = {p.name for p in reservation_urls.urlpatterns}
+        expected |= {f'dashboard:{p.name}' for p in dashboard_urls.urlpatterns}
+        self.assertEqual(names, (expected - POST_ONLY) | {'send_reminders'})
+        self.assertTrue(all(r['status'] in (200, None) for r in report['runs'][0]['results']))
+        # 計測用のデータはロールバックされる
+        self.assertEqual(Reservation.objects.count(), 0)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.menu = ServiceMenu.objects.create(
+            name='パンク修理', estimated_duration=30, price_estimate=1500, price_display='1,500円～',
+        )
+        self.day = date.today() - timedelta(days=3)
+        self.other_day = date.today() - timedelta(days=2)
+        for i, (estimated, actual) in enumerate([(1000, 1500), (2000, 1000), (3000, None)]):
+            reservation = Reservation.objects.create(
+                name=f'完了{i}', date=self.day, time_slot='AM', status='completed', service_menu=self.menu,
+            )
+            WorkHistory.objects.create(
+                reservation=reservation, status='completed', estimated_amount=estimated, actual_amount=actual,
+            )
+        Reservation.objects.create(name='取消', date=self.day, time_slot='PM', status='cancelled')
+        Reservation.objects.create(name='別の日', date=self.other_day, time_slot='AM', service_menu=self.menu)
+
+    def _rollups(self):
+        return {
+            (r.date, r.service_menu_id, r.status): r
+            for r in DailyMenuRollup.objects.all()
+        }
+
+    def test_refresh_aggregates_dirty_days(self):
+        self.assertEqual(refresh_dirty_days(), (2, 3))
+        rollups = self._rollups()
+        completed = rollups[(self.day, self.menu.pk, 'completed')]
+        self.assertEqual(completed.reservation_count, 3)
+        self.assertEqual(completed.estimated_total, 6000)
+        self.assertEqual(completed.actual_total, 2500)
+        self.assertEqual(completed.estimate_count, 2)
+        self.assertEqual(completed.average_estimate_error, 750)
+        self.assertEqual(rollups[(self.day, None, 'cancelled')].reservation_count, 1)
+        self.assertEqual(rollups[(self.other_day, self.menu.pk, 'confirmed')].reservation_count, 1)
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+    def test_only_touched_days_are_refreshed(self):
+        refresh_dirty_days()
+        untouched = DailyMenuRollup.objects.get(date=self.other_day)
+
+        history = WorkHistory.objects.get(reservation__name='完了2')
+        history.actual_amount = 3500
+        history.save()
+        self.assertEqual(list(RollupDirtyDay.objects.values_list('date', flat=True)), [self.day])
+
+        self.assertEqual(refresh_dirty_days(), (1, 2))
+        self.assertEqual(DailyMenuRollup.objects.get(date=self.other_day).pk, untouched.pk)
+        completed = self._rollups()[(self.day, self.menu.pk, 'completed')]
+        self.assertEqual(completed.actual_total, 6000)
+        self.assertEqual(completed.estimate_count, 3)
+
+    def test_cancel_moves_counts_between_statuses(self):
+        refresh_dirty_days()
+        booking.cancel_reservation(Reservation.objects.get(name='別の日'))
+        refresh_dirty_days()
+        self.assertEqual(
+            list(DailyMenuRollup.objects.filter(date=self.other_day).values_list('status', 'reservation_count')),
+            [('cancelled', 1)],
+        )
+
+    def test_days_marked_during_refresh_are_kept(self):
+        RollupDirtyDay.objects.filter(date=self.other_day).update(marked_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(refresh_dirty_days(), (1, 2))
+        self.assertEqual(list(RollupDirtyDay.objects.values_list('date', flat=True)), [self.other_day])
+
+    def test_rebuild_matches_incremental_refresh(self):
+        refresh_dirty_days()
+        incremental = {key: (r.reservation_count, r.actual_total) for key, r in self._rollups().items()}
+        self.assertEqual(rebuild_rollups(), 3)
+        rebuilt = {key: (r.reservation_count, r.actual_total) for key, r in self._rollups().items()}
+        self.assertEqual(rebuilt, incremental)
+
+    def test_refresh_rollups_command(self):
+        out = StringIO()
+        call_command('refresh_rollups', stdout=out)
+        self.assertIn('2 日分', out.getvalue())
+        out = StringIO()
+        call_command('refresh_rollups', stdout=out)
+        self.assertIn('更新が必要な日はありません', out.getvalue())
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        today = date.today()
+        Reservation.objects.bulk_create([
+            Reservation(user=self.user, name='山田 太郎', date=today + timedelta(days=i - 15), time_slot='AM')
+            for i in range(30)
+        ])
+        self.reservation = Reservation.objects.filter(user=self.user, date__gt=today).first()
+        bike_info = BikeInfo.objects.create(
+            reservation=self.reservation, manufacturer='トレック', model_name='Domane', details='ブレーキ調整',
+        )
+        BikeImage.objects.bulk_create([BikeImage(bike_info=bike_info, image=f'bike_images/{i}.jpg') for i in range(4)])
+
+    def test_user_dashboard(self):
+        with self.assertQueryBudget(4):  # セッション・ユーザー・今後の予約・過去の予約
+            self.client.get(reverse('dashboard'))
+
+    def test_reservation_detail(self):
+        with self.assertQueryBudget(4):  # セッション・ユーザー・予約と自転車情報・画像
+            self.client.get(reverse('reservation_detail', args=[self.reservation.pk]))
+
+    def test_budget_reports_repeated_queries(self):
+        with self.assertRaisesMessage(AssertionError, 'N+1'):
+            with self.assertQueryBudget(100):
+                for reservation in Reservation.objects.all()[:5]:
+                    BikeInfo.objects.filter(reservation=reservation).exists()
+
+    @override_settings(QUERY_COUNT_ENABLED=True)
+    def test_middleware_reports_queries(self):
+        with self.assertLogs('reservations.queries', 'INFO') as logs:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response['X-Query-Count'], '4')
+        self.assertEqual(response['X-Query-Repeated'], '0')
+        self.assertIn('GET / queries=4', logs.output[0])
+
+    @override_settings(QUERY_COUNT_ENABLED=False)
+    def test_middleware_can_be_disabled(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('X-Query-Count', response)
+
+
+class CustomerDashboardTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('taro', 'taro@example.com', 'pass12345')
+        other = User.objects.create_user('hanako', 'hanako@example.com', 'pass12345')
+        self.client.force_login(self.user)
+        menu = ServiceMenu.objects.create(
+            name='メンテナンス', estimated_duration=90, price_estimate=5000, price_display='5,000円～',
+        )
+        today = date.today()
+        Reservation.objects.bulk_create([
+            Reservation(
+                user=self.user, name='山田 太郎', date=today + timedelta(days=i // 2), service_menu=menu,
+                time_slot='AM' if i % 2 else 'PM', status='cancelled' if i % 7 == 0 else 'confirmed',
+            )
+            for i in range(-70, 50)
+        ] + [Reservation(user=other, name='佐藤 花子', date=today - timedelta(days=1), time_slot='AM')])
+        recent = Reservation.objects.filter(user=self.user, date__gte=today - timedelta(days=5)).order_by('date')
+        for reservation in recent[:20]:
+            BikeInfo.objects.create(reservation=reservation, manufacturer='トレック', model_name='Domane', details='点検')
+            WorkHistory.objects.create(reservation=reservation, status='completed')
+
+    def test_initial_render_is_capped_and_uses_fixed_queries(self):
+        with self.assertQueryBudget(4):  # セッション・ユーザー・今後の予約・過去の予約
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['upcoming_reservations']), views.DASHBOARD_PAGE_SIZE)
+        self.assertEqual(len(response.context['past_reservations']), views.DASHBOARD_PAGE_SIZE)
+        self.assertContains(response, 'さらに表示', count=2)
+        self.assertContains(response, 'トレック')
+
+    def test_load_more_walks_past_reservations_in_order(self):
+        response = self.client.get(reverse('dashboard'))
+        cursor = response.context['past_reservations'].next_cursor
+        seen = [r.pk for r in response.context['past_reservations']]
+        while cursor:
+            with self.assertQueryBudget(3):  # セッション・ユーザー・予約
+                data = self.client.get(reverse('dashboard_more'), {'section': 'past', 'cursor': cursor}).json()
+            self.assertLessEqual(data['count'], views.DASHBOARD_PAGE_SIZE)
+            seen.extend(int(pk) for pk in re.findall(r'/reservation/(\d+)/', data['html']))
+            cursor = data['next_cursor']
+
+        expected = list(
+            Reservation.objects.filter(user=self.user, date__lt=date.today())
+            .order_by('-date', 'time_slot', 'id').values_list('pk', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_load_more_rejects_unknown_section(self):
+        response = self.client.get(reverse('dashboard_more'), {'section': 'all'})
+        self.assertEqual(response.status_code, 400)
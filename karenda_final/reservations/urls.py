@@ -3,9 +3,13 @@ from . import views
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('reservations/more/', views.dashboard_more, name='dashboard_more'),
     path('reserve/', views.reserve, name='reserve'),
     path('reserve/done/<int:pk>/', views.reserve_done, name='reserve_done'),
+    path('reserve/waitlist/', views.join_waitlist, name='join_waitlist'),
     path('reservation/<int:pk>/', views.reservation_detail, name='reservation_detail'),
     path('reservation/<int:pk>/cancel/', views.cancel_reservation, name='cancel_reservation'),
     path('signup/', views.signup, name='signup'),
+    path('api/availability/', views.availability, name='availability'),
+    path('api/next-available/', views.next_available, name='next_available'),
 ]
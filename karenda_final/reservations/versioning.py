@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# 版番号を保存するキャッシュの別名（全ワーカーから同じ値が見える必要がある）
+VERSION_CACHE = 'versions'
+
+
+def _cache():
+    return caches[VERSION_CACHE if VERSION_CACHE in settings.CACHES else 'default']
+
+
+def _key(name):
+    return f'data_version:{name}'
+
+
+def _initial_version():
+    # 再起動後に以前と同じ番号が振られないよう、時刻を初期値にする
+    return time.time_ns()
+
+
+def get_version(name):
+    """データ種別ごとの版番号を取得（ETagやキャッシュキーに使用）"""
+    cache = _cache()
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), _initial_version(), timeout=None)
+        version = cache.get(_key(name))
+    return version
+
+
+def bump_version(*names):
+    """データ変更時に版番号を進める
+
+    ファイルキャッシュの incr はプロセス間で不可分でないため、現在の時刻（以前の番号以下なら +1）を
+    書き込む。同時に進めても、それまでに読まれたどの番号とも異なる値になる。
+    """
+    cache = _cache()
+    for name in names:
+        version = _initial_version()
+        current = cache.get(_key(name))
+        if current is not None and version <= current:
+            version = current + 1
+        cache.set(_key(name), version, timeout=None)
+
+
+def bump_version_on_commit(*names):
+    """トランザクション内でのデータ変更時に版番号を進める
+
+    変更したリクエスト自身がすぐ新しい版番号で読み直せるよう直ちに進め、コミット後にもう一度進める
+    （コミット前に他のリクエストが変更前のデータを新しい版番号で ETag やキャッシュに保持するのを防ぐ）。
+    トランザクション外ではコミット後の分もその場で進める。
+    """
+    bump_version(*names)
+    transaction.on_commit(lambda: bump_version(*names))
+
+
+async def aget_version(name):
+    """get_version の非同期版"""
+    cache = _cache()
+    version = await cache.aget(_key(name))
+    if version is None:
+        await cache.aadd(_key(name), _initial_version(), timeout=None)
+        version = await cache.aget(_key(name))
+    return version
@@ -1,42 +1,95 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib import messages
+from django.db import IntegrityError, transaction
 from django.utils import timezone
-from datetime import date
-from .forms import ReservationForm, BikeInfoForm, BikeImageForm
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+from datetime import date, timedelta
+import hashlib
+from asgiref.sync import sync_to_async
+from . import booking
+from .forms import ReservationForm, BikeInfoForm, BikeImageForm, WaitlistForm
 from .models import Reservation, BikeInfo, BikeImage
-from collections import defaultdict
+from .availability import abuild_availability, parse_range
+from .config_cache import service_menus
+from .suggestions import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, next_available_slots
+from .occupancy import booking_window_days
+from .decorators import async_login_required
+from .pagination import akeyset_page
+from .ratelimit import rate_limit
+from .versioning import get_version
 from django.http import JsonResponse
 
-@login_required
-def dashboard(request):
-    """マイページ：ユーザーの予約一覧を表示"""
+# マイページの1回に表示する件数
+DASHBOARD_PAGE_SIZE = 10
+
+# マイページの一覧ごとの並び順（最後は一意なフィールド）
+DASHBOARD_SECTIONS = {
+    'upcoming': ('date', 'time_slot', 'id'),
+    'past': ('-date', 'time_slot', 'id'),
+}
+
+
+async def _dashboard_page(user, section, cursor=None):
+    """マイページの今後・過去の予約を1ページ分取得（関連データは同じクエリで取得）"""
     today = date.today()
-    
-    # 今後の予約（確定のみ）
-    upcoming_reservations = Reservation.objects.filter(
-        user=request.user,
-        date__gte=today,
-        status='confirmed'
-    ).order_by('date', 'time_slot')
-    
-    # 過去の予約
-    past_reservations = Reservation.objects.filter(
-        user=request.user,
-        date__lt=today
-    ).order_by('-date', 'time_slot')
-    
+    reservations = Reservation.objects.filter(user=user).select_related(
+        'service_menu', 'bike_info', 'work_history',
+    )
+    if section == 'upcoming':
+        reservations = reservations.filter(date__gte=today, status='confirmed')
+    else:
+        reservations = reservations.filter(date__lt=today)
+    return await akeyset_page(reservations, DASHBOARD_SECTIONS[section], cursor=cursor, page_size=DASHBOARD_PAGE_SIZE)
+
+
+@async_login_required
+async def dashboard(request):
+    """マイページ：ユーザーの予約一覧を表示（続きは dashboard_more で取得）"""
     context = {
-        'upcoming_reservations': upcoming_reservations,
-        'past_reservations': past_reservations,
+        'upcoming_reservations': await _dashboard_page(request.user, 'upcoming'),
+        'past_reservations': await _dashboard_page(request.user, 'past'),
     }
     return render(request, 'reservations/dashboard.html', context)
 
+
+@async_login_required
+@require_GET
+async def dashboard_more(request):
+    """マイページの「さらに表示」：続きの予約をHTML片とカーソルでJSONとして返す"""
+    section = request.GET.get('section')
+    if section not in DASHBOARD_SECTIONS:
+        return JsonResponse({'error': 'section=upcoming または section=past を指定してください'}, status=400)
+
+    page = await _dashboard_page(request.user, section, cursor=request.GET.get('cursor'))
+    html = render_to_string('reservations/_dashboard_rows.html', {
+        'reservations': page,
+        'section': section,
+    }, request=request)
+    return JsonResponse({'html': html, 'count': len(page), 'next_cursor': page.next_cursor})
+
+def _resubmitted_reservation(request):
+    """同じ予約フォームの再送信なら最初の予約の ID（送信回数の制限と予約画面で1回だけ確認する）"""
+    if not hasattr(request, '_resubmitted_reservation'):
+        request._resubmitted_reservation = booking.find_submission(
+            request.user, request.POST.get('submission_key'),
+        )
+    return request._resubmitted_reservation
+
+
 @login_required
+@rate_limit('reserve', exempt=lambda request: _resubmitted_reservation(request) is not None)
 def reserve(request):
     if request.method == 'POST':
+        # 同じフォームの再送信（二重クリックなど）は、入力チェックや画像の保存をせずに最初の予約の完了画面へ
+        original = _resubmitted_reservation(request)
+        if original is not None:
+            return redirect('reserve_done', pk=original)
+
         form = ReservationForm(request.POST)
         bike_form = BikeInfoForm(request.POST)
         # 複数枚の画像アップロードに対応
@@ -45,46 +98,144 @@ def reserve(request):
         if form.is_valid() and bike_form.is_valid():
             reservation = form.save(commit=False)
             reservation.user = request.user
-            reservation.save()
-            
             bike_info = bike_form.save(commit=False)
-            bike_info.reservation = reservation
-            bike_info.save()
-            
-            for f in files:
-                BikeImage.objects.create(bike_info=bike_info, image=f)
-                
-            messages.success(request, '予約が完了しました。')
-            return redirect('reserve_done', pk=reservation.pk)
+
+            try:
+                booking.book_reservation(
+                    reservation, bike_info, files, submission_key=form.cleaned_data['submission_key'],
+                )
+            except booking.DuplicateSubmission as duplicate:
+                return redirect('reserve_done', pk=duplicate.reservation_id)
+            except booking.SlotUnavailable:
+                # 入力チェック後に他の予約で満席になった場合
+                form.add_error(None, 'その日付・時間帯はすでに予約されています。')
+                form.slot_full = True
+                form.suggest(reservation.service_menu, reservation.date)
+            else:
+                messages.success(request, '予約が完了しました。')
+                return redirect('reserve_done', pk=reservation.pk)
     else:
         form = ReservationForm()
         bike_form = BikeInfoForm()
 
-    reservations = Reservation.objects.filter(
-        status='confirmed',
-        date__gte=date.today()
-    )
-
-    booked_slots = defaultdict(list)
-    for r in reservations:
-        booked_slots[str(r.date)].append(r.time_slot)
-
+    # 空き状況はカレンダーが月ごとに availability API から取得する
     return render(request, 'reservations/reserve.html', {
         'form': form,
         'bike_form': bike_form,
-        'booked_slots': dict(booked_slots),
+        'max_date': date.today() + timedelta(days=booking_window_days()),
+        # 選択したメニューが収まる時間帯だけを選べるよう、想定作業時間をカレンダーに渡す
+        'menu_durations': {menu.pk: menu.estimated_duration for menu in service_menus()},
     })
 
+
+def _availability_etag(request):
+    try:
+        start, end = parse_range(request.GET)
+    except ValueError:
+        return None
+    stamp = f"{get_version('availability')}:{date.today()}:{start}:{end}"
+    return hashlib.sha1(stamp.encode()).hexdigest()
+
+
+@async_login_required
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_availability_etag)
+async def availability(request):
+    """空き状況API：指定月（または期間）の日別・時間帯別の空き枠をJSONで返す"""
+    try:
+        start, end = parse_range(request.GET)
+    except ValueError:
+        return JsonResponse(
+            {'error': 'month=YYYY-MM または start/end=YYYY-MM-DD を指定してください'},
+            status=400,
+        )
+    return JsonResponse(await abuild_availability(start, end))
+
+@login_required
+@require_POST
+@rate_limit('reserve')
+def join_waitlist(request):
+    """予約画面で満席だった日付・時間帯のキャンセル待ちに登録"""
+    form = WaitlistForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, 'キャンセル待ちに登録できませんでした。日付・時間帯を選び直してください。')
+        return redirect('reserve')
+
+    entry = form.save(commit=False)
+    entry.user = request.user
+    try:
+        with transaction.atomic():
+            booking.join_waitlist(entry)
+    except booking.SlotAvailable:
+        messages.info(request, 'その日付・時間帯に空きが出たため、そのままご予約いただけます。')
+        return redirect('reserve')
+    except booking.SlotUnavailable:
+        messages.error(request, 'このメニューはその時間帯からでは営業時間内に作業が終わらないため、キャンセル待ちに登録できません。')
+        return redirect('reserve')
+    except IntegrityError:
+        messages.info(request, 'その日付・時間帯のキャンセル待ちにはすでに登録されています。')
+        return redirect('dashboard')
+
+    messages.success(
+        request,
+        f'{entry.date:%m月%d日} {entry.get_time_slot_display()}のキャンセル待ちに登録しました。'
+        '空きが出た場合は自動で予約を確定し、メールでお知らせします。',
+    )
+    return redirect('dashboard')
+
+
+def _suggestion_params(params):
+    """クエリ（menu・date・limit）から (メニュー, 日付, 件数) を取得"""
+    menu = None
+    if params.get('menu'):
+        menu = next((m for m in service_menus() if str(m.pk) == params['menu']), None)
+        if menu is None:
+            raise ValueError('unknown menu')
+    start = date.fromisoformat(params['date']) if params.get('date') else date.today()
+    limit = min(max(int(params.get('limit', DEFAULT_SUGGESTIONS)), 1), MAX_SUGGESTIONS)
+    return menu, start, limit
+
+
+def _next_available_etag(request):
+    versions = ':'.join(str(get_version(name)) for name in ('availability', 'calendar', 'config'))
+    stamp = f"{versions}:{date.today()}:{request.GET.urlencode()}"
+    return hashlib.sha1(stamp.encode()).hexdigest()
+
+
+@async_login_required
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_next_available_etag)
+async def next_available(request):
+    """空き日時の候補API：指定したメニューを指定日以降で予約できる日時を近い順に返す"""
+    try:
+        menu, start, limit = await sync_to_async(_suggestion_params)(request.GET)
+    except ValueError:
+        return JsonResponse(
+            {'error': 'menu=メニューID・date=YYYY-MM-DD・limit=件数 を指定してください'},
+            status=400,
+        )
+    slots = await sync_to_async(next_available_slots)(menu, start, limit)
+    return JsonResponse({
+        'slots': [{**slot, 'date': slot['date'].isoformat()} for slot in slots],
+    })
+
+
 @login_required
 def reserve_done(request, pk):
     """予約完了画面"""
     reservation = get_object_or_404(Reservation, pk=pk, user=request.user)
     return render(request, 'reservations/reserve_done.html', {'reservation': reservation})
 
-@login_required
-def reservation_detail(request, pk):
+@async_login_required
+async def reservation_detail(request, pk):
     """予約詳細画面"""
-    reservation = get_object_or_404(Reservation, pk=pk, user=request.user)
+    reservation = await aget_object_or_404(
+        Reservation.objects.select_related('service_menu', 'bike_info').prefetch_related('bike_info__images'),
+        pk=pk,
+        user=request.user,
+    )
     bike_info = getattr(reservation, 'bike_info', None)
     context = {
         'reservation': reservation,
@@ -93,19 +244,19 @@ def reservation_detail(request, pk):
     return render(request, 'reservations/reservation_detail.html', context)
 
 @login_required
+@rate_limit('cancel')
 def cancel_reservation(request, pk):
     """予約キャンセル"""
     reservation = get_object_or_404(Reservation, pk=pk, user=request.user)
     
     if request.method == 'POST':
-        if reservation.status == 'confirmed':
-            reservation.status = 'cancelled'
-            reservation.save()
+        if booking.cancel_reservation(reservation):
             messages.success(request, '予約をキャンセルしました。')
         return redirect('dashboard')
     
     return render(request, 'reservations/cancel_confirmation.html', {'reservation': reservation})
 
+@rate_limit('signup')
 def signup(request):
     """ユーザー登録"""
     if request.method == 'POST':